@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+# Load test for the daemon's control socket: N clients keep one connection
+# each open and send requests back to back for a fixed duration.
+#
+#   python benchmarks/control_server_load.py --clients 100 --duration 10
+
+import argparse
+import asyncio
+import json
+import time
+
+from rclone_bisync_manager.control_protocol import SOCKET_PATH, FRAME_HEADER, encode_frame
+
+
+async def run_client(socket_path, command, deadline, latencies, errors):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    request_id = 0
+    try:
+        while time.monotonic() < deadline:
+            request_id += 1
+            started = time.perf_counter()
+            writer.write(encode_frame(
+                {"id": request_id, "command": command, "args": {}}))
+            await writer.drain()
+            (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            response = json.loads(await reader.readexactly(length))
+            latencies.append(time.perf_counter() - started)
+            if response.get("id") != request_id or response.get("status") != "success":
+                errors.append(response)
+    finally:
+        writer.close()
+
+
+async def run_load_test(socket_path, clients, duration, command):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(run_client(socket_path, command, deadline, latencies, errors)
+                           for _ in range(clients)))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    print(f"{clients} clients, {command}, {elapsed:.1f}s")
+    print(f"requests: {len(latencies)}  errors: {len(errors)}")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    if latencies:
+        print(f"latency p50: {latencies[len(latencies) // 2] * 1000:.2f} ms  "
+              f"p99: {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the rclone-bisync-manager control socket')
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--command', default='STATUS',
+                        help='Read-only command to send (STATUS, PING, GET_CONFIG)')
+    args = parser.parse_args()
+    asyncio.run(run_load_test(args.socket, args.clients,
+                args.duration, args.command))
+
+
+if __name__ == "__main__":
+    main()
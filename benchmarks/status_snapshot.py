@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Status report latency with many sync jobs: a full rebuild (what happens
+# after every state change), a cached STATUS and a "not modified"
+# STATUS_IF_CHANGED reply. Runs in-process against a generated config.
+#
+#   python benchmarks/status_snapshot.py --jobs 10 1000 10000
+
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+
+def measure(func, min_time=0.5, max_runs=10000):
+    runs = 0
+    started = time.perf_counter()
+    while runs < max_runs and (runs < 3 or time.perf_counter() - started < min_time):
+        func()
+        runs += 1
+    return (time.perf_counter() - started) / runs
+
+
+def write_config(directory, jobs):
+    path = os.path.join(directory, 'config.yaml')
+    with open(path, 'w') as f:
+        f.write(f"local_base_path: {directory}\n")
+        f.write(f"log_file_path: {directory}/logs/manager.log\n")
+        f.write("sync_jobs:\n")
+        for i in range(jobs):
+            f.write(f"  job{i}:\n    local: job{i}\n    rclone_remote: remote\n"
+                    f"    remote: path/job{i}\n    schedule: '0 * * * *'\n")
+    return path
+
+
+def run_benchmark(jobs):
+    from rclone_bisync_manager.config import config
+    from rclone_bisync_manager.events import event_bus, QUEUE_CHANGED
+    from rclone_bisync_manager import status_server
+
+    directory = tempfile.mkdtemp()
+    config.set_config_file(write_config(directory, jobs))
+    config.load_and_validate_config(SimpleNamespace(
+        dry_run=False, console_log=False, command='daemon'))
+    config.in_limbo = False
+
+    def rebuild():
+        event_bus.publish(QUEUE_CHANGED)
+        status_server.get_status_snapshot()
+
+    def cached_status():
+        status_server.encode_response(
+            {"id": 1, "status": "success", "result": status_server.handle_status({})})
+
+    def not_modified():
+        status_server.encode_response({"id": 1, "status": "success",
+                                       "result": status_server.handle_status_if_changed({"version": event_bus.version})})
+
+    rebuild_time = measure(rebuild)
+    size = sum(map(len, status_server.get_status_snapshot()[1]))
+    cached_time = measure(cached_status)
+    not_modified_time = measure(not_modified)
+    print(f"{jobs:>6} jobs  snapshot {size / 1024:>8.0f} KiB  rebuild {rebuild_time * 1000:>9.3f} ms  "
+          f"cached STATUS {cached_time * 1000:>7.3f} ms  not modified {not_modified_time * 1000:.4f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark status snapshot latency')
+    parser.add_argument('--jobs', type=int, nargs='+',
+                        default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    # Keep sync state and logs of the benchmark out of the user's cache
+    os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp()
+    os.makedirs(os.path.join(
+        os.environ['XDG_CACHE_HOME'], 'rclone-bisync-manager'))
+    for jobs in args.jobs:
+        run_benchmark(jobs)
+
+
+if __name__ == "__main__":
+    main()
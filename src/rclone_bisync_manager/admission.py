@@ -0,0 +1,308 @@
+import os
+import time
+import signal
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import psutil
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.cpu_limit import active_processes
+from rclone_bisync_manager.events import event_bus, ADMISSION_CHANGED
+from rclone_bisync_manager.job_stats import job_stats
+
+# Admission control in front of the sync queue. A sampler thread measures
+# CPU usage, disk busy time and the battery state; while any of them is over
+# its threshold, scheduled jobs are deferred (manual syncs always run) and,
+# optionally, a running rclone is stopped with SIGSTOP until the pressure
+# clears. CPU used by the daemon and rclone themselves is not counted, and
+# disk samples are skipped while a sync runs, so a sync can't hold back or
+# suspend itself.
+#
+# Independently of that, with a memory budget a scheduled job is only
+# started when its predicted peak RSS fits into the budget and into the
+# memory that is currently available. Syncs run one at a time, so a job has
+# the whole budget to itself.
+
+SAMPLE_INTERVAL = 2
+MIN_SAMPLES = 2
+MB = 1024 * 1024
+
+
+def format_bytes(size):
+    if size >= 1024 * MB:
+        return f"{size / (1024 * MB):.1f} GiB"
+    return f"{size / MB:.0f} MiB"
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._samples = deque()
+        self._previous = None
+        self._battery = None
+        self.pressure = None
+        # Job key -> QueuedSync held back by admission control
+        self.deferred = {}
+        # rclone pid -> (job, suspended since)
+        self.suspended = {}
+        self._suspension_expired = set()
+
+    def settings(self):
+        return config._config.admission if config._config else None
+
+    def enabled(self):
+        settings = self.settings()
+        return settings is not None and settings.enabled
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='admission-control', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.resume_all()
+        with self._lock:
+            self.deferred.clear()
+
+    def _run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            try:
+                if self.enabled():
+                    self.sample()
+                    self._update_suspension()
+                elif self._samples or self.suspended or self.pressure:
+                    self._reset()
+            except Exception as e:
+                log_error(f"Admission control sampling failed: {str(e)}")
+
+    def _reset(self):
+        self.resume_all()
+        self._samples.clear()
+        self._previous = None
+        self._set_pressure(None)
+
+    def _own_cpu_seconds(self):
+        total = 0.0
+        for pid in [os.getpid()] + list(active_processes):
+            try:
+                times = psutil.Process(pid).cpu_times()
+                total += times.user + times.system
+            except psutil.Error:
+                continue
+        return total
+
+    def sample(self):
+        now = time.monotonic()
+        cpu_times = psutil.cpu_times()
+        cpu_total = sum(cpu_times)
+        cpu_idle = cpu_times.idle + getattr(cpu_times, 'iowait', 0)
+        own_cpu = self._own_cpu_seconds()
+        try:
+            disks = {name: counters.busy_time for name, counters in psutil.disk_io_counters(
+                perdisk=True).items() if hasattr(counters, 'busy_time')}
+        except (RuntimeError, OSError):
+            disks = {}
+        try:
+            self._battery = psutil.sensors_battery()
+        except (RuntimeError, OSError):
+            self._battery = None
+
+        if self._previous is not None:
+            prev_time, prev_total, prev_idle, prev_own, prev_disks = self._previous
+            elapsed = now - prev_time
+            total_delta = cpu_total - prev_total
+            if elapsed > 0 and total_delta > 0:
+                busy = (total_delta - (cpu_idle - prev_idle)) / total_delta
+                # cpu_times() covers all CPUs, so convert the process time
+                # to the same scale
+                own = (own_cpu - prev_own) / total_delta
+                cpu_percent = max(0.0, busy - own) * 100
+
+                disk_percent = None
+                if not active_processes and disks:
+                    disk_percent = max((busy_ms - prev_disks.get(name, busy_ms)) / (elapsed * 10)
+                                       for name, busy_ms in disks.items())
+                self._samples.append((now, cpu_percent, disk_percent))
+
+        self._previous = (now, cpu_total, cpu_idle, own_cpu, disks)
+        window = self.settings().window_seconds
+        while self._samples and now - self._samples[0][0] > window:
+            self._samples.popleft()
+        self._set_pressure(self._pressure_reason())
+
+    def averages(self):
+        samples = list(self._samples)
+        cpu = [s[1] for s in samples]
+        disk = [s[2] for s in samples if s[2] is not None]
+        return (sum(cpu) / len(cpu) if len(cpu) >= MIN_SAMPLES else None,
+                sum(disk) / len(disk) if len(disk) >= MIN_SAMPLES else None)
+
+    def _pressure_reason(self):
+        settings = self.settings()
+        battery = self._battery
+        if battery is not None and not battery.power_plugged:
+            if settings.defer_on_battery:
+                return f"on battery ({battery.percent:.0f}%)"
+            if settings.min_battery_percent is not None and battery.percent < settings.min_battery_percent:
+                return f"battery at {battery.percent:.0f}%, below {settings.min_battery_percent}%"
+
+        cpu, disk = self.averages()
+        if settings.max_cpu_percent is not None and cpu is not None and cpu > settings.max_cpu_percent:
+            return f"CPU usage {cpu:.0f}% above {settings.max_cpu_percent:g}%"
+        if settings.max_disk_busy_percent is not None and disk is not None and disk > settings.max_disk_busy_percent:
+            return f"disk busy {disk:.0f}% above {settings.max_disk_busy_percent:g}%"
+        return None
+
+    def _set_pressure(self, reason):
+        if reason == self.pressure:
+            return
+        previous, self.pressure = self.pressure, reason
+        if reason:
+            log_message(f"Admission control: deferring scheduled syncs, {reason}")
+        elif previous:
+            log_message("Admission control: pressure cleared")
+        event_bus.publish(ADMISSION_CHANGED, pressure=reason)
+
+    def _max_deferral(self):
+        minutes = self.settings().max_deferral_minutes
+        return timedelta(minutes=minutes) if minutes is not None else None
+
+    def check(self, item):
+        # Returns why the job has to wait, or None if it may start now
+        if item.manual:
+            return None
+        reason = self.pressure if self.enabled() else None
+        if reason is None:
+            reason = self.memory_reason(item.job_key)
+        if reason is None:
+            return None
+        max_deferral = self._max_deferral()
+        if item.deferred_since and max_deferral and datetime.now() - item.deferred_since >= max_deferral:
+            log_message(f"Admission control: starting {item.job_key} after the maximum deferral time ({reason})")
+            return None
+        return reason
+
+    def memory_reason(self, job_key):
+        budget_mb = config._config.memory_budget_mb
+        if budget_mb is None:
+            return None
+        # Jobs that never ran are assumed to need the conservative default
+        predicted = job_stats.predicted_peak_rss(job_key)
+        if predicted is None:
+            predicted = config._config.default_job_memory_mb * MB
+
+        # The reasons leave out the live memory figures, so they stay the same
+        # while the job waits and its deferral is only published once
+        if predicted > budget_mb * MB:
+            return f"predicted peak {format_bytes(predicted)} exceeds the memory budget of {format_bytes(budget_mb * MB)}"
+        if predicted > psutil.virtual_memory().available:
+            return f"predicted peak {format_bytes(predicted)} exceeds the available memory"
+        return None
+
+    def defer(self, item, reason):
+        # Returns whether the job's deferral is new or its reason changed
+        changed = reason != item.deferral_reason
+        if item.deferred_since is None:
+            item.deferred_since = datetime.now()
+            log_message(f"Deferring sync job {item.job_key}: {reason}")
+        item.deferral_reason = reason
+        with self._lock:
+            self.deferred[item.job_key] = item
+        return changed
+
+    def release_deferred(self):
+        # Deferred jobs go back into the queue once the pressure has cleared
+        # or they have waited for the maximum deferral time
+        with self._lock:
+            if not self.deferred:
+                return []
+            max_deferral = self._max_deferral() if self.enabled() else None
+            now = datetime.now()
+            released = [item for item in self.deferred.values()
+                        if not self.enabled() or self.pressure is None
+                        or (max_deferral and now - item.deferred_since >= max_deferral)]
+            for item in released:
+                del self.deferred[item.job_key]
+            return released
+
+    def take_deferred(self, job_key):
+        with self._lock:
+            return self.deferred.pop(job_key, None)
+
+    def _update_suspension(self):
+        settings = self.settings()
+        max_deferral = self._max_deferral()
+        now = datetime.now()
+        for pid, (job, since) in self.suspended_runs().items():
+            if pid not in active_processes:
+                with self._lock:
+                    self.suspended.pop(pid, None)
+            elif self.pressure is None or not settings.suspend_running:
+                self._resume(pid)
+            elif max_deferral and now - since >= max_deferral:
+                log_message(f"Admission control: resuming {job} after the maximum suspension time")
+                self._suspension_expired.add(pid)
+                self._resume(pid)
+
+        if self.pressure and settings.suspend_running:
+            for pid in list(active_processes):
+                if pid in self.suspended or pid in self._suspension_expired:
+                    continue
+                job = config.currently_syncing
+                if job is None or config.current_sync_manual:
+                    continue
+                try:
+                    os.kill(pid, signal.SIGSTOP)
+                except OSError:
+                    continue
+                with self._lock:
+                    self.suspended[pid] = (job, now)
+                log_message(f"Admission control: suspended rclone for {job} ({self.pressure})")
+                event_bus.publish(ADMISSION_CHANGED, suspended=job)
+        self._suspension_expired &= set(active_processes)
+
+    def _resume(self, pid):
+        with self._lock:
+            job, _ = self.suspended.pop(pid, (None, None))
+        try:
+            os.kill(pid, signal.SIGCONT)
+        except OSError:
+            return
+        log_message(f"Admission control: resumed rclone for {job}")
+        event_bus.publish(ADMISSION_CHANGED, resumed=job)
+
+    def resume_all(self):
+        for pid in self.suspended_runs():
+            self._resume(pid)
+
+    def suspended_runs(self):
+        # rclone pid -> (job, suspended since)
+        with self._lock:
+            return dict(self.suspended)
+
+    def status(self):
+        # Added fresh to every status response (VOLATILE_STATUS_FIELDS)
+        with self._lock:
+            deferred = {key: {"reason": item.deferral_reason, "since": item.deferred_since.isoformat()}
+                        for key, item in self.deferred.items()}
+            suspended = [job for job, _ in self.suspended.values()]
+        return {
+            "enabled": self.enabled(),
+            "pressure": self.pressure,
+            "deferred": deferred,
+            "suspended": suspended,
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,151 @@
+import re
+from datetime import datetime
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.job_stats import job_stats
+
+# Opt-in tuning of --transfers and --checkers per job (autotune). After each
+# rclone run, its throughput and the rate limit errors in its output feed an
+# AIMD controller: rate limiting halves both values, a run that moved enough
+# data to measure raises them by one step, and a raise that made the
+# throughput drop is taken back. After a decrease or a step back the values
+# are held for HOLD_RUNS measured runs, so they don't flip between n and n+1
+# forever. The values stay within the configured bounds. Values set in any
+# rclone_options section are never tuned.
+#
+# Throughput comes from rclone's final "Transferred:" stats line, which rclone
+# prints at log_level INFO; without it runs only count for rate limiting.
+
+TUNED_OPTIONS = ('transfers', 'checkers')
+# rclone's defaults, where tuning starts
+INITIAL_VALUES = {'transfers': 4, 'checkers': 8}
+STEP = {'transfers': 1, 'checkers': 2}
+HISTORY_LENGTH = 20
+# A raise is taken back if the throughput fell below this share of the last run
+THROUGHPUT_DROP = 0.9
+HOLD_RUNS = 5
+# Rate limiting is only looked for where rclone reports it: ERROR and NOTICE
+# lines and the pacer's retries. INFO lines name the transferred files, and
+# a file called "429.jpg" mustn't slow a job down.
+REPORT_LINE_PATTERN = re.compile(r'^[\d/]+ [\d:.]+ (?:ERROR|NOTICE)\s*:|\bpacer: ')
+RATE_LIMIT_PATTERN = re.compile(
+    r'\b(?:error|http|status(?: code)?)[ :=]*429\b|too many requests|rate ?limit(?:ed| ?exceeded)'
+    r'|quota exceeded|reduce your request rate|(?-i:\bSlowDown\b)|\bthrottl(?:ed|ing)\b', re.IGNORECASE)
+
+
+def count_rate_limit_errors(path, start_offset, end_offset):
+    count = 0
+    try:
+        with open(path, 'rb') as f:
+            f.seek(start_offset)
+            remaining = end_offset - start_offset
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                text = line.decode(errors='replace')
+                if REPORT_LINE_PATTERN.search(text) and RATE_LIMIT_PATTERN.search(text):
+                    count += 1
+    except OSError as e:
+        log_error(f"Error scanning {path} for rate limit errors: {str(e)}")
+    return count
+
+
+class AutoTuner:
+    def settings(self):
+        return config._config.autotune
+
+    def enabled(self, job_key):
+        job = config._config.sync_jobs.get(job_key)
+        if job is not None and job.autotune is not None:
+            return job.autotune
+        return self.settings().enabled
+
+    def hand_set(self, job_key):
+        sections = [config._config.rclone_options, config._config.bisync_options,
+                    config._config.resync_options, config._config.sync_jobs[job_key].rclone_options]
+        return {option for option in TUNED_OPTIONS if any(option in section for section in sections)}
+
+    def _bounds(self, option):
+        settings = self.settings()
+        return getattr(settings, f"min_{option}"), getattr(settings, f"max_{option}")
+
+    def _clamp(self, option, value):
+        low, high = self._bounds(option)
+        return max(low, min(high, value))
+
+    def current(self, job_key):
+        tuning = job_stats.tuning(job_key) or {}
+        return {option: self._clamp(option, tuning.get(option, INITIAL_VALUES[option]))
+                for option in TUNED_OPTIONS}
+
+    def apply(self, job_key, options):
+        # Adds the tuned values to the options of a run
+        if not self.enabled(job_key):
+            return options
+        hand_set = self.hand_set(job_key)
+        values = self.current(job_key)
+        return dict(options, **{option: value for option, value in values.items()
+                                if option not in hand_set and option not in options})
+
+    def record(self, job_key, transferred_bytes, seconds, rate_limit_errors):
+        if not self.enabled(job_key):
+            return
+        tuned = [option for option in TUNED_OPTIONS if option not in self.hand_set(job_key)]
+        if not tuned:
+            return
+        tuning = job_stats.tuning(job_key) or {}
+        values = self.current(job_key)
+        throughput = transferred_bytes / seconds if transferred_bytes is not None and seconds > 0 else None
+        measured = throughput is not None and \
+            transferred_bytes >= self.settings().min_transferred_mb * 1024 * 1024
+        last_throughput = tuning.get("last_throughput")
+        hold_runs = tuning.get("hold_runs", 0)
+
+        if rate_limit_errors:
+            new_values = {option: self._clamp(option, values[option] // 2) for option in tuned}
+            decision = "decrease"
+            hold_runs = HOLD_RUNS
+        elif not measured:
+            new_values = {}
+            decision = "hold"
+        elif tuning.get("last_decision") == "increase" and last_throughput \
+                and throughput < last_throughput * THROUGHPUT_DROP:
+            new_values = {option: self._clamp(option, values[option] - STEP[option]) for option in tuned}
+            decision = "step back"
+            hold_runs = HOLD_RUNS
+        elif hold_runs:
+            new_values = {}
+            decision = "hold"
+            hold_runs -= 1
+        else:
+            new_values = {option: self._clamp(option, values[option] + STEP[option]) for option in tuned}
+            decision = "increase"
+
+        entry = {"time": datetime.now().isoformat(), **{option: values[option] for option in tuned},
+                 "throughput_bps": round(throughput) if throughput is not None else None,
+                 "rate_limit_errors": rate_limit_errors, "decision": decision}
+        history = tuning.get("history", []) + [entry]
+        tuning.update(values, **new_values)
+        tuning.update({"last_decision": decision, "hold_runs": hold_runs, "history": history[-HISTORY_LENGTH:]})
+        if measured:
+            tuning["last_throughput"] = throughput
+        job_stats.set_tuning(job_key, tuning)
+
+        changes = ', '.join(f"{option} {values[option]} -> {new_values[option]}" for option in tuned
+                            if new_values.get(option, values[option]) != values[option])
+        if changes:
+            log_message(f"Autotune for {job_key}: {changes} ({decision}, "
+                        f"{rate_limit_errors} rate limit errors)")
+
+    def status(self, job_key):
+        if not self.enabled(job_key):
+            return None
+        tuning = job_stats.tuning(job_key) or {}
+        hand_set = self.hand_set(job_key)
+        return {**{option: value for option, value in self.current(job_key).items() if option not in hand_set},
+                "hand_set": sorted(hand_set),
+                "history": tuning.get("history", [])}
+
+
+autotuner = AutoTuner()
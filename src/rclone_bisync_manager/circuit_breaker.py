@@ -0,0 +1,128 @@
+import threading
+from datetime import datetime, timedelta
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.events import event_bus, BREAKER_CHANGED
+
+# Circuit breaker per rclone remote. The remote pre-flight check (rclone lsf)
+# and the rclone runs observe a remote: after failure_threshold failures in a
+# row (failed checks, or runs that exited with one of the breaker's exit
+# codes) the breaker opens and scheduled runs on that remote are skipped
+# before any rclone process is started. Once the cool-down has passed the
+# breaker is half-open and a single run is let through as a probe, while the
+# others are still skipped. Its pre-flight check closes the breaker again or
+# re-opens it with a doubled cool-down; a probe that never reached the remote
+# check (the local check failed) re-opens it for the next run to probe.
+# Manual syncs always go through and count as a probe.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RemoteBreaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        # Times the breaker opened since it was last closed
+        self.trips = 0
+        self.opened_at = None
+        self.probe_after = None
+        self.last_error = None
+
+
+class CircuitBreakers:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def settings(self):
+        return config._config.circuit_breaker if config._config else None
+
+    def enabled(self):
+        settings = self.settings()
+        return settings is not None and settings.enabled
+
+    def check(self, remote, manual=False):
+        # Returns why a run on the remote is skipped, or None if it may run
+        if not self.enabled() or manual:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(remote)
+            if breaker is None or breaker.state == CLOSED:
+                return None
+            if breaker.state == HALF_OPEN:
+                return f"circuit breaker for remote '{remote}' is half-open, waiting for its probe"
+            if datetime.now() < breaker.probe_after:
+                return (f"circuit breaker for remote '{remote}' is open until "
+                        f"{breaker.probe_after.strftime('%H:%M:%S')} ({breaker.last_error})")
+            breaker.state = HALF_OPEN
+        log_message(f"Circuit breaker for remote '{remote}' is half-open, probing")
+        event_bus.publish(BREAKER_CHANGED, remote=remote, state=HALF_OPEN)
+        return None
+
+    def end_probe(self, remote):
+        # Called once the pre-flight checks are done; a half-open breaker
+        # whose probe didn't get to check the remote is open again, with the
+        # next run as its probe
+        with self._lock:
+            breaker = self._breakers.get(remote)
+            if breaker is None or breaker.state != HALF_OPEN:
+                return
+            breaker.state = OPEN
+        event_bus.publish(BREAKER_CHANGED, remote=remote, state=OPEN)
+
+    def record_run(self, remote, exit_code):
+        # rclone runs count as well: a successful one closes the breaker, one
+        # that failed with a breaker exit code counts as a failure
+        if exit_code in (0, 9):
+            self.record_success(remote)
+        elif self.enabled() and exit_code in self.settings().exit_codes:
+            self.record_failure(remote, f"rclone exited with code {exit_code}")
+
+    def record_success(self, remote):
+        with self._lock:
+            breaker = self._breakers.get(remote)
+            if breaker is None or (breaker.state == CLOSED and breaker.failures == 0):
+                return
+            was_open = breaker.state != CLOSED
+            del self._breakers[remote]
+        if was_open:
+            log_message(f"Circuit breaker for remote '{remote}' closed")
+        event_bus.publish(BREAKER_CHANGED, remote=remote, state=CLOSED)
+
+    def record_failure(self, remote, error):
+        if not self.enabled():
+            return
+        settings = self.settings()
+        with self._lock:
+            breaker = self._breakers.setdefault(remote, RemoteBreaker())
+            breaker.failures += 1
+            breaker.last_error = error
+            if breaker.state == CLOSED and breaker.failures < settings.failure_threshold:
+                opened = False
+            else:
+                # A failed probe re-opens the breaker for longer
+                breaker.trips += 1
+                cooldown = min(settings.cooldown_minutes * 2 ** (breaker.trips - 1),
+                               settings.max_cooldown_minutes)
+                breaker.state = OPEN
+                breaker.opened_at = datetime.now()
+                breaker.probe_after = breaker.opened_at + timedelta(minutes=cooldown)
+                opened = True
+        if opened:
+            log_error(f"Circuit breaker for remote '{remote}' opened after {breaker.failures} "
+                      f"failures, skipping its runs for {cooldown} minutes: {error}")
+        event_bus.publish(BREAKER_CHANGED, remote=remote, state=breaker.state)
+
+    def status(self):
+        with self._lock:
+            return {remote: {"state": breaker.state,
+                             "failures": breaker.failures,
+                             "opened_at": breaker.opened_at.isoformat() if breaker.opened_at else None,
+                             "probe_after": breaker.probe_after.isoformat() if breaker.probe_after else None,
+                             "last_error": breaker.last_error}
+                    for remote, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakers()
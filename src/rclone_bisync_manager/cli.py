@@ -18,8 +18,30 @@ def parse_args():
     # Daemon command
     daemon_parser = subparsers.add_parser(
         'daemon', parents=[global_parser], help='Run in daemon mode')
-    daemon_parser.add_argument('action', choices=['start', 'stop', 'status', 'reload'],
+    daemon_parser.add_argument('action', choices=['start', 'stop', 'status', 'reload', 'profile'],
                                help='Action to perform on the daemon')
+    daemon_parser.add_argument('profile_action', nargs='?',
+                               choices=['start', 'stop', 'status',
+                                        'memsnapshot', 'memsnapshot-stop'],
+                               help='With profile: start/stop the CPU profiler, or take a memory snapshot')
+    daemon_parser.add_argument('--watch', action='store_true',
+                               help='With status: keep running and print changes as the daemon reports them')
+    daemon_parser.add_argument('--snapshot', action='store_true',
+                               help='With status: read the snapshot file the daemon publishes instead of asking the daemon')
+    daemon_parser.add_argument('--fields',
+                               help='With status: comma-separated fields to show (e.g. running,queue,errors,sync_jobs)')
+    daemon_parser.add_argument('--job', action='append', dest='status_jobs', metavar='JOB',
+                               help='With status: only show this sync job (repeatable)')
+    daemon_parser.add_argument('--job-fields',
+                               help='With status: comma-separated per-job fields (e.g. sync_status,next_run)')
+    daemon_parser.add_argument('--offset', type=int,
+                               help='With status: skip this many sync jobs')
+    daemon_parser.add_argument('--limit', type=int,
+                               help='With status: show at most this many sync jobs')
+    daemon_parser.add_argument('--interval', type=float, default=10,
+                               help='With profile start: sampling interval in milliseconds (default: 10)')
+    daemon_parser.add_argument('--top', type=int, default=20,
+                               help='With profile stop/memsnapshot: number of entries to show (default: 20)')
 
     # Sync command
     sync_parser = subparsers.add_parser(
@@ -36,6 +58,33 @@ def parse_args():
                                             help='Add a sync job for immediate execution')
     add_sync_parser.add_argument(
         'sync_jobs', nargs='+', help='Names of the sync jobs to add')
+    add_sync_parser.add_argument('--force-bisync', action='store_true',
+                                 help='Force the bisync operation for the added job(s)')
+    add_sync_parser.add_argument('--resync', action='store_true',
+                                 help='Resync the added job(s)')
+    add_sync_parser.add_argument('--priority', type=int,
+                                 help="Queue priority of the added job(s); higher runs first (default: the job's priority)")
+    add_sync_parser.add_argument('--wait', action='store_true',
+                                 help='Wait until the job(s) finish and report their results')
+    add_sync_parser.add_argument('--timeout', type=float,
+                                 help='With --wait, stop waiting after this many seconds (default: no limit)')
+
+    # Cancel command
+    cancel_parser = subparsers.add_parser('cancel', parents=[global_parser],
+                                          help='Cancel a running sync job or remove it from the queue')
+    cancel_parser.add_argument('job', help='Name of the sync job')
+
+    # Logs command
+    logs_parser = subparsers.add_parser('logs', parents=[global_parser],
+                                        help='Show the rclone output of a sync job run')
+    logs_parser.add_argument('job', help='Name of the sync job')
+    logs_selector = logs_parser.add_mutually_exclusive_group()
+    logs_selector.add_argument('--failed', action='store_true',
+                               help='Show the last failed run instead of the last run')
+    logs_selector.add_argument('--run-id', type=str,
+                               help='Show a specific run')
+    logs_selector.add_argument('--list', action='store_true',
+                               help='List the recorded runs of the job')
 
     args = parser.parse_args()
 
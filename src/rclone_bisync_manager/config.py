@@ -2,13 +2,19 @@ import yaml
 import os
 from datetime import datetime
 from threading import Lock
-from queue import Queue
+from collections import OrderedDict
 import hashlib
 from croniter import croniter
 import json
-from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, DirectoryPath
-from rclone_bisync_manager.logging_utils import log_message, log_error
+from typing import Dict, Any, Optional, List, Literal
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, ValidationError, ValidationInfo, field_validator, model_validator, DirectoryPath
+from rclone_bisync_manager.logging_utils import log_message, log_error, set_log_rotation
+from rclone_bisync_manager import metrics
+from rclone_bisync_manager.sync_queue import SyncQueue
+from rclone_bisync_manager.events import event_bus, CONFIG_CHANGED, SYNC_ERROR
+
+# The libyaml-backed loader is several times faster on large configs
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
 class OptionsValidatorMixin(BaseModel):
@@ -37,6 +43,19 @@ class SyncJobConfig(OptionsValidatorMixin):
     dry_run: bool = Field(default=False)
     force_resync: bool = Field(default=False)
     force_operation: bool = Field(default=False)
+    # Higher runs first among the queued scheduled jobs
+    priority: int = Field(default=0)
+    # Overrides the global deadline_tolerance_minutes for this job
+    deadline_tolerance_minutes: Optional[int] = Field(default=None, ge=0)
+    # Overrides retry.max_attempts for this job
+    max_attempts: Optional[int] = Field(default=None, ge=1)
+    # Override the watchdog's max_runtime_minutes and stall_minutes
+    max_runtime_minutes: Optional[int] = Field(default=None, ge=1)
+    stall_minutes: Optional[int] = Field(default=None, ge=1)
+    # Overrides autotune.enabled for this job
+    autotune: Optional[bool] = Field(default=None)
+    # Overrides the global max_cpu_usage_percent for this job
+    max_cpu_usage_percent: Optional[int] = Field(default=None, ge=1, le=100)
 
     @field_validator('schedule')
     @classmethod
@@ -48,6 +67,167 @@ class SyncJobConfig(OptionsValidatorMixin):
         return v
 
 
+class LogRotationConfig(BaseModel):
+    # Rotate the manager log once it reaches this size
+    max_size_mb: int = Field(default=10, ge=1)
+
+    # Rotate the manager log once its first entry is this old (optional)
+    max_age_days: Optional[int] = Field(default=None, ge=1)
+
+    # Gzip rotated segments in the background
+    compress: bool = True
+
+    # Upper bound for rotated segments and finished rclone run logs together
+    retention_mb: int = Field(default=200, ge=1)
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class MetricsConfig(BaseModel):
+    # Serve Prometheus metrics from the daemon
+    enabled: bool = False
+
+    # TCP address and port of the metrics endpoint
+    listen_address: str = "127.0.0.1"
+    port: int = Field(default=9469, ge=1, le=65535)
+
+    # Serve on this unix socket instead of TCP (optional)
+    unix_socket: Optional[str] = None
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class AdmissionConfig(BaseModel):
+    # Hold back scheduled syncs while the machine is busy or on battery
+    enabled: bool = False
+
+    # Defer while the average CPU usage of other processes is above this
+    max_cpu_percent: Optional[float] = Field(default=80, gt=0, le=100)
+
+    # Defer while a disk is busy (I/O in flight) for more than this share of time
+    max_disk_busy_percent: Optional[float] = Field(default=80, gt=0, le=100)
+
+    # Defer while running on battery
+    defer_on_battery: bool = True
+
+    # On battery, defer below this charge (when defer_on_battery is off)
+    min_battery_percent: Optional[int] = Field(default=None, ge=0, le=100)
+
+    # CPU and disk usage are averaged over this window
+    window_seconds: int = Field(default=30, ge=1)
+
+    # Start a deferred job (or resume a suspended one) after this long anyway
+    max_deferral_minutes: Optional[int] = Field(default=120, ge=1)
+
+    # Also suspend a running scheduled sync under pressure
+    suspend_running: bool = False
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class RetryConfig(BaseModel):
+    # Runs per failure, including the first; 1 turns retries off
+    max_attempts: int = Field(default=3, ge=1)
+
+    # rclone exit codes that are worth retrying
+    exit_codes: List[int] = Field(default_factory=lambda: [1, 5])
+
+    # Delay before the first retry; doubles with every attempt
+    initial_delay_seconds: int = Field(default=60, ge=1)
+
+    # Upper bound of the delay between attempts
+    max_delay_minutes: int = Field(default=60, ge=1)
+
+    model_config = ConfigDict(extra='forbid')
+
+    @field_validator('exit_codes')
+    @classmethod
+    def validate_exit_codes(cls, v):
+        # Critical errors need a human; retrying only repeats them
+        critical = sorted(set(v) & {2, 7})
+        if critical:
+            raise ValueError(f"Exit codes {critical} are critical errors and can't be retried")
+        return v
+
+
+class CircuitBreakerConfig(BaseModel):
+    # Skip runs on remotes whose pre-flight check keeps failing
+    enabled: bool = True
+
+    # Consecutive failed pre-flight checks that open the breaker
+    failure_threshold: int = Field(default=3, ge=1)
+
+    # Time until the first probe; doubles with every failed probe
+    cooldown_minutes: int = Field(default=5, ge=1)
+
+    # Upper bound of the cool-down
+    max_cooldown_minutes: int = Field(default=60, ge=1)
+
+    # rclone exit codes of a run that count as a failure of the remote
+    exit_codes: List[int] = Field(default_factory=lambda: [5])
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class WatchdogConfig(BaseModel):
+    # Cancel an rclone run after this long (optional)
+    max_runtime_minutes: Optional[int] = Field(default=None, ge=1)
+
+    # Cancel a run that read nothing and wrote no output for this long
+    stall_minutes: Optional[int] = Field(default=30, ge=1)
+
+    # Time between SIGINT and SIGKILL when cancelling a run
+    grace_seconds: int = Field(default=30, ge=1)
+
+    # Time limit of the local and remote pre-flight checks (rclone lsf)
+    preflight_timeout_seconds: int = Field(default=120, ge=1)
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class AutotuneConfig(BaseModel):
+    # Tune --transfers and --checkers per job from observed throughput
+    enabled: bool = False
+
+    # Bounds of the tuned --transfers
+    min_transfers: int = Field(default=1, ge=1)
+    max_transfers: int = Field(default=16, ge=1)
+
+    # Bounds of the tuned --checkers
+    min_checkers: int = Field(default=2, ge=1)
+    max_checkers: int = Field(default=32, ge=1)
+
+    # Runs that moved less than this don't change the values
+    min_transferred_mb: int = Field(default=100, ge=0)
+
+    model_config = ConfigDict(extra='forbid')
+
+    @model_validator(mode='after')
+    def check_bounds(self):
+        if self.min_transfers > self.max_transfers or self.min_checkers > self.max_checkers:
+            raise ValueError("autotune minimums must not exceed the maximums")
+        return self
+
+
+# Validated job models keyed by a hash of their YAML fragment, so that jobs
+# whose definition didn't change skip pydantic validation on reload. Entries
+# are handed out as copies because the daemon mutates job flags at runtime.
+# Holds the models of the active config only and is replaced in apply_config,
+# so a rejected reload leaves it alone.
+_job_model_cache: Dict[str, SyncJobConfig] = {}
+
+
+def _job_fragment_hash(job):
+    fragment = json.dumps(job, sort_keys=True, default=str)
+    return hashlib.sha256(fragment.encode()).hexdigest()
+
+
+def copy_config(config_model):
+    return config_model.model_copy(update={
+        'sync_jobs': {key: job.model_copy() for key, job in config_model.sync_jobs.items()}
+    })
+
+
 class SyncState:
     def __init__(self):
         self.sync_status = {}
@@ -87,6 +267,28 @@ class ConfigSchema(OptionsValidatorMixin):
     # CPU usage limit as a percentage
     max_cpu_usage_percent: int = Field(default=100, ge=0, le=100)
 
+    # A priority step in the sync queue is worth this much waiting time
+    queue_aging_minutes: int = Field(default=10, ge=1)
+
+    # Adjust compare and --fast-list to what each remote supports (opt-in,
+    # --fast-list can need a lot of memory on large remotes)
+    tune_remote_options: bool = False
+
+    # How long probed remote features are cached
+    remote_features_ttl_hours: int = Field(default=24, ge=1)
+
+    # Order of the scheduled lane: by priority or by deadline
+    queue_policy: Literal['priority', 'deadline'] = 'priority'
+
+    # A scheduled run's deadline is its scheduled time plus this
+    deadline_tolerance_minutes: int = Field(default=30, ge=0)
+
+    # Only start a scheduled job if its predicted peak RSS fits (optional)
+    memory_budget_mb: Optional[int] = Field(default=None, ge=1)
+
+    # Assumed peak RSS of a job that has not run yet
+    default_job_memory_mb: int = Field(default=1024, ge=1)
+
     # Whether to redirect rclone log output
     redirect_rclone_log_output: bool = False
 
@@ -96,8 +298,14 @@ class ConfigSchema(OptionsValidatorMixin):
     # Whether to run initial sync on startup
     run_initial_sync_on_startup: bool = True
 
+    # Whether to watch the config file and apply valid changes automatically
+    auto_reload: bool = False
+
+    # Directory of YAML files that each define one or more sync jobs (optional)
+    sync_jobs_dir: Optional[str] = None
+
     # Sync job configurations
-    sync_jobs: Dict[str, SyncJobConfig]
+    sync_jobs: Dict[str, SyncJobConfig] = Field(default_factory=dict)
 
     # Whether to run in dry-run mode
     dry_run: bool = False
@@ -110,8 +318,45 @@ class ConfigSchema(OptionsValidatorMixin):
         'rclone-bisync-manager.log'
     ))
 
+    # Size/age based rotation and retention of the log files
+    log_rotation: LogRotationConfig = Field(default_factory=LogRotationConfig)
+
+    # Prometheus metrics endpoint
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+
+    # Directory for per-day Chrome trace files of the sync phases (optional)
+    trace_export_dir: Optional[str] = None
+
+    # Load and power aware deferral of scheduled syncs
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig)
+
+    # Retries of runs that failed with a transient rclone exit code
+    retry: RetryConfig = Field(default_factory=RetryConfig)
+
+    # Per-remote circuit breaker for unreachable remotes
+    circuit_breaker: CircuitBreakerConfig = Field(default_factory=CircuitBreakerConfig)
+
+    # Timeouts, stall detection and cancellation of rclone runs
+    watchdog: WatchdogConfig = Field(default_factory=WatchdogConfig)
+
+    # Adaptive --transfers and --checkers per job (opt-in)
+    autotune: AutotuneConfig = Field(default_factory=AutotuneConfig)
+
     model_config = ConfigDict(extra='forbid')
 
+    # Errors from sync_jobs_dir files, keyed by file path
+    _job_file_errors: Dict[str, List[str]] = PrivateAttr(default_factory=dict)
+
+    # Validated sync_jobs models by fragment hash, for _job_model_cache
+    _job_models: Dict[str, SyncJobConfig] = PrivateAttr(default_factory=dict)
+
+    @model_validator(mode='after')
+    def check_has_sync_jobs(self):
+        if not self.sync_jobs and not self.sync_jobs_dir:
+            raise ValueError(
+                "No sync jobs defined. Please provide sync_jobs or sync_jobs_dir.")
+        return self
+
     @field_validator('max_cpu_usage_percent')
     @classmethod
     def check_cpu_usage(cls, v):
@@ -121,12 +366,16 @@ class ConfigSchema(OptionsValidatorMixin):
 
     @field_validator('sync_jobs', mode='before')
     @classmethod
-    def validate_sync_jobs(cls, v):
+    def validate_sync_jobs(cls, v, info: ValidationInfo):
+        has_jobs_dir = bool(info.data.get('sync_jobs_dir'))
         if v is None:
+            if has_jobs_dir:
+                return {}
             raise ValueError(
                 "sync_jobs cannot be None. Please provide at least one sync job.")
 
         validated_jobs = {}
+        used_models = {}
         errors = []
 
         for key, job in v.items():
@@ -135,41 +384,173 @@ class ConfigSchema(OptionsValidatorMixin):
                               key}. Job keys must be strings.")
                 continue
 
-            try:
-                # Check for required keys
-                required_keys = {
-                    'local', 'rclone_remote', 'remote', 'schedule'}
-                missing_keys = required_keys - set(job.keys())
-                if missing_keys:
-                    errors.append(f"Missing required keys in sync job '{
-                                  key}': {', '.join(missing_keys)}")
-
-                # Check for invalid keys
-                allowed_keys = set(SyncJobConfig.model_fields.keys())
-                invalid_keys = set(job.keys()) - allowed_keys
-                if invalid_keys:
-                    errors.append(f"Invalid keys found in sync job '{
-                                  key}': {', '.join(invalid_keys)}")
-
-                if not missing_keys and not invalid_keys:
-                    validated_jobs[key] = SyncJobConfig(**job)
-            except ValidationError as e:
-                for error in e.errors():
-                    field = '.'.join(str(loc) for loc in error['loc'])
-                    msg = error['msg']
-                    errors.append(f"Validation error for sync job '{
-                                  key}': {field} - {msg}")
+            if isinstance(job, dict):
+                fragment_hash = _job_fragment_hash(job)
+                cached = _job_model_cache.get(fragment_hash)
+                if cached is not None:
+                    validated_jobs[key] = cached.model_copy()
+                    used_models[fragment_hash] = cached
+                    continue
+
+            job_model, job_errors = validate_sync_job(key, job)
+            errors.extend(job_errors)
+            if job_model is not None:
+                validated_jobs[key] = job_model.model_copy()
+                used_models[fragment_hash] = job_model
 
         if errors:
             raise ValueError("\n".join(errors))
 
-        if not validated_jobs:
+        if not validated_jobs and not has_jobs_dir:
             raise ValueError(
                 "No valid sync jobs found. Please provide at least one valid sync job.")
 
+        # Handed to build_config; the cache only takes them once applied
+        if info.context is not None:
+            info.context["job_models"] = used_models
         return validated_jobs
 
 
+def validate_sync_job(key, job):
+    if not isinstance(job, dict):
+        return None, [f"Invalid sync job '{key}': expected a mapping of options."]
+
+    errors = []
+    try:
+        # Check for required keys
+        required_keys = {
+            'local', 'rclone_remote', 'remote', 'schedule'}
+        missing_keys = required_keys - set(job.keys())
+        if missing_keys:
+            errors.append(f"Missing required keys in sync job '{
+                          key}': {', '.join(missing_keys)}")
+
+        # Check for invalid keys
+        allowed_keys = set(SyncJobConfig.model_fields.keys())
+        invalid_keys = set(job.keys()) - allowed_keys
+        if invalid_keys:
+            errors.append(f"Invalid keys found in sync job '{
+                          key}': {', '.join(invalid_keys)}")
+
+        if not missing_keys and not invalid_keys:
+            return SyncJobConfig(**job), errors
+    except ValidationError as e:
+        for error in e.errors():
+            field = '.'.join(str(loc) for loc in error['loc'])
+            msg = error['msg']
+            errors.append(f"Validation error for sync job '{
+                          key}': {field} - {msg}")
+    return None, errors
+
+
+class JobFragment:
+    def __init__(self, signature, content_hash, overrides_key, jobs, errors):
+        self.signature = signature
+        self.content_hash = content_hash
+        self.overrides_key = overrides_key
+        self.jobs = jobs
+        self.errors = errors
+
+
+class JobFragmentLoader:
+    # Loads sync jobs from the YAML files in sync_jobs_dir. Every file is
+    # validated on its own and cached by (mtime, size) and content hash, so
+    # editing one job only re-parses that file, and a broken file only
+    # disables the jobs it defines.
+    def __init__(self):
+        self._fragments: Dict[str, JobFragment] = {}
+        self._lock = Lock()
+
+    def list_fragment_files(self, directory):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            return []
+        return [entry.path for entry in entries
+                if entry.is_file() and not entry.name.startswith('.')
+                and entry.name.endswith(('.yaml', '.yml'))]
+
+    def changed(self, directory, overrides_key):
+        paths = self.list_fragment_files(directory)
+        with self._lock:
+            if set(paths) != set(self._fragments):
+                return True
+            for path in paths:
+                fragment = self._fragments[path]
+                if fragment.overrides_key != overrides_key or fragment.signature != _file_signature(path):
+                    return True
+        return False
+
+    def load(self, directory, overrides_key, apply_overrides):
+        jobs = {}
+        errors = {}
+        with self._lock:
+            fragments = {}
+            for path in self.list_fragment_files(directory):
+                fragment = self._load_fragment(
+                    path, self._fragments.get(path), overrides_key, apply_overrides)
+                fragments[path] = fragment
+                if fragment.errors:
+                    errors[path] = list(fragment.errors)
+                for key, job in fragment.jobs.items():
+                    if key in jobs:
+                        errors.setdefault(path, []).append(
+                            f"Duplicate sync job '{key}' ignored; it is already defined in another file.")
+                        continue
+                    jobs[key] = job
+            self._fragments = fragments
+        return jobs, errors
+
+    def _load_fragment(self, path, cached, overrides_key, apply_overrides):
+        signature = _file_signature(path)
+        if cached is not None and cached.signature == signature and cached.overrides_key == overrides_key:
+            return cached
+
+        try:
+            with open(path, 'rb') as f:
+                raw_fragment = f.read()
+        except OSError as e:
+            return JobFragment(signature, None, overrides_key, {}, [f"Error reading job file: {str(e)}"])
+
+        content_hash = hashlib.sha256(raw_fragment).hexdigest()
+        if cached is not None and cached.content_hash == content_hash and cached.overrides_key == overrides_key:
+            cached.signature = signature
+            return cached
+
+        try:
+            data = yaml.load(raw_fragment, Loader=YamlLoader)
+        except yaml.YAMLError as e:
+            return JobFragment(signature, content_hash, overrides_key, {}, [f"Error parsing YAML in job file: {str(e)}"])
+
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return JobFragment(signature, content_hash, overrides_key, {}, ["Job file must contain a mapping of sync job names to job options."])
+
+        jobs = {}
+        errors = []
+        for key, job in data.items():
+            if not isinstance(key, str):
+                errors.append(f"Invalid job key: {
+                              key}. Job keys must be strings.")
+                continue
+            if isinstance(job, dict):
+                apply_overrides(key, job)
+            job_model, job_errors = validate_sync_job(key, job)
+            errors.extend(job_errors)
+            if job_model is not None:
+                jobs[key] = job_model
+        return JobFragment(signature, content_hash, overrides_key, jobs, errors)
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
 class Config:
     def __init__(self):
         self.default_config_file = os.path.join(os.environ.get(
@@ -182,11 +563,11 @@ class Config:
         self.LOCK_FILE_PATH = '/tmp/rclone_bisync_manager.lock'
         self._init_file_paths()
         self._init_logging_paths()
-        self.sync_queue = Queue()
-        self.queued_paths = set()
+        self.sync_queue = SyncQueue()
         self.sync_lock = Lock()
         self.currently_syncing = None
         self.current_sync_start_time = None
+        self.current_sync_manual = False
         self.running = True
         self.shutting_down = False
         self.shutdown_complete = False
@@ -201,8 +582,16 @@ class Config:
             self.cache_dir, 'sync_errors.json')
         self.last_config_status = None
         self.config_changed_on_disk = False
-        self.last_config_mtime = None
+        self.last_config_signature = None
+        self.pending_config = None
+        self.auto_reload_error = None
         self.in_limbo = True
+        self.active_config_key = None
+        self.job_files = JobFragmentLoader()
+        self.job_file_errors = {}
+        self._parse_cache = OrderedDict()
+        self._parse_cache_lock = Lock()
+        self.parse_cache_size = 4
         self.load_sync_state()  # Call load_sync_state only once during initialization
 
     def _init_file_paths(self):
@@ -229,38 +618,135 @@ class Config:
 
     def load_and_validate_config(self, args):
         self.args = args
+        try:
+            source = self.read_config_source(args)
+            if self.is_active_source(source, args):
+                # Same bytes and overrides as the active config: nothing to do
+                self.config_invalid = False
+                self.config_error_message = None
+                self._update_internal_fields(args)
+                return
+            new_config = self.build_config(args, source)
+        except ValueError as e:
+            log_error(f"Configuration on disk is invalid: {str(e)}")
+            self.config_invalid = True
+            self.config_error_message = str(e)
+            raise
+
+        self.apply_config(new_config, args, source[1])
+
+    def read_config_source(self, args):
         if not os.path.exists(self.config_file):
             raise FileNotFoundError(
                 f"Configuration file not found: {self.config_file}")
 
+        with open(self.config_file, 'rb') as f:
+            raw_config = f.read()
+
+        cache_key = (hashlib.sha256(raw_config).hexdigest(),
+                     self._cli_overrides_key(args))
+        return raw_config, cache_key
+
+    def build_config(self, args, source=None):
+        # Parses and validates the config file without touching the active
+        # configuration, so a broken file can be rejected safely
+        raw_config, cache_key = source or self.read_config_source(args)
+
+        # Identical bytes plus identical CLI overrides always validate to the
+        # same model, so skip YAML parsing and validation entirely
+        with self._parse_cache_lock:
+            cached = self._parse_cache.get(cache_key)
+            if cached is not None:
+                self._parse_cache.move_to_end(cache_key)
+                return self._merge_job_files(copy_config(cached), args)
+
         try:
-            with open(self.config_file, 'r') as f:
-                config_data = yaml.safe_load(f)
+            config_data = yaml.load(raw_config, Loader=YamlLoader)
         except yaml.YAMLError as e:
-            error_message = f"Error parsing YAML in configuration file: {
-                str(e)}"
-            log_error(error_message)
-            self.config_invalid = True
-            self.config_error_message = error_message
-            raise ValueError(error_message)
+            raise ValueError(
+                f"Error parsing YAML in configuration file: {str(e)}")
+
+        if not isinstance(config_data, dict):
+            raise ValueError(
+                "Configuration file is empty or not a mapping of options.")
 
         # Merge CLI arguments into config_data
         self._merge_cli_args(config_data, args)
 
+        validation_context = {}
         try:
-            new_config = ConfigSchema(**config_data)
-
-            if self._config != new_config:
-                self._config = new_config
-                log_message("Configuration loaded and validated successfully.")
-            self.config_invalid = False
-            self.config_error_message = None
+            new_config = ConfigSchema.model_validate(
+                config_data, context=validation_context)
         except ValidationError as e:
-            error_message = self._format_validation_errors(e)
-            log_error(f"Configuration on disk is invalid: {error_message}")
-            self.config_invalid = True
-            self.config_error_message = error_message
-            raise ValueError(error_message)
+            raise ValueError(self._format_validation_errors(e))
+        new_config._job_models = validation_context.get("job_models", {})
+
+        with self._parse_cache_lock:
+            self._parse_cache[cache_key] = new_config
+            while len(self._parse_cache) > self.parse_cache_size:
+                self._parse_cache.popitem(last=False)
+        return self._merge_job_files(copy_config(new_config), args)
+
+    def is_active_source(self, source, args):
+        # True if the file bytes, CLI overrides and job files all match the
+        # configuration that is currently active
+        return (self._config is not None and source[1] == self.active_config_key
+                and not self._job_files_changed(self._config, args))
+
+    def resolve_sync_jobs_dir(self, config_model):
+        if not config_model.sync_jobs_dir:
+            return None
+        jobs_dir = os.path.expanduser(config_model.sync_jobs_dir)
+        return os.path.join(os.path.dirname(self.config_file), jobs_dir)
+
+    def _job_files_changed(self, config_model, args):
+        jobs_dir = self.resolve_sync_jobs_dir(config_model)
+        if jobs_dir is None:
+            return False
+        return self.job_files.changed(jobs_dir, self._cli_overrides_key(args))
+
+    def _merge_job_files(self, config_model, args):
+        jobs_dir = self.resolve_sync_jobs_dir(config_model)
+        if jobs_dir is None:
+            return config_model
+
+        jobs, errors = self.job_files.load(
+            jobs_dir, self._cli_overrides_key(args),
+            lambda key, job: self._apply_job_overrides(key, job, args))
+        for key, job in jobs.items():
+            if key in config_model.sync_jobs:
+                errors.setdefault(jobs_dir, []).append(
+                    f"Sync job '{key}' is already defined in {self.config_file}; the job file definition is ignored.")
+                continue
+            config_model.sync_jobs[key] = job.model_copy()
+        config_model._job_file_errors = errors
+        return config_model
+
+    def _cli_overrides_key(self, args):
+        return (
+            getattr(args, 'dry_run', False),
+            tuple(getattr(args, 'specific_sync_jobs', None) or ()),
+            getattr(args, 'force_resync', False),
+            tuple(getattr(args, 'resync', None) or ()),
+            getattr(args, 'force_operation', False),
+        )
+
+    def apply_config(self, new_config, args, config_key=None):
+        global _job_model_cache
+        _job_model_cache = new_config._job_models
+        self.active_config_key = config_key
+        if self._config != new_config:
+            self._config = new_config
+            log_message("Configuration loaded and validated successfully.")
+        self.config_invalid = False
+        self.config_error_message = None
+        self.auto_reload_error = None
+        self.job_file_errors = new_config._job_file_errors
+        set_log_rotation(new_config.log_rotation)
+        for path, errors in self.job_file_errors.items():
+            error_lines = "\n".join(errors)
+            log_error(
+                f"Invalid sync job file {path}, affected jobs are disabled:\n{error_lines}")
 
         self._populate_status_file_paths()
         self._update_internal_fields(args)
@@ -270,19 +756,23 @@ class Config:
         config_data['dry_run'] = args.dry_run
 
         # Override sync job options
+        sync_jobs = config_data.get('sync_jobs')
+        if isinstance(sync_jobs, dict):
+            for job_key, job in sync_jobs.items():
+                if isinstance(job, dict):
+                    self._apply_job_overrides(job_key, job, args)
+
+    def _apply_job_overrides(self, job_key, job, args):
         if hasattr(args, 'specific_sync_jobs') and args.specific_sync_jobs:
-            for job_key in args.specific_sync_jobs:
-                if job_key in config_data['sync_jobs']:
-                    config_data['sync_jobs'][job_key]['active'] = True
+            if job_key in args.specific_sync_jobs:
+                job['active'] = True
 
         if hasattr(args, 'force_resync') and args.force_resync:
-            for job_key in (args.resync or []):
-                if job_key in config_data['sync_jobs']:
-                    config_data['sync_jobs'][job_key]['force_resync'] = True
+            if job_key in (args.resync or []):
+                job['force_resync'] = True
 
         if hasattr(args, 'force_operation') and args.force_operation:
-            for job_key in config_data['sync_jobs']:
-                config_data['sync_jobs'][job_key]['force_operation'] = True
+            job['force_operation'] = True
 
     def _update_internal_fields(self, args):
         self.console_log = args.console_log
@@ -320,6 +810,7 @@ class Config:
 
     def save_sync_state(self):
         state_file = os.path.join(self.cache_dir, 'sync_state.json')
+        metrics.state_file_writes.inc(file='sync_state')
         with open(state_file, 'w') as f:
             json.dump({
                 "sync_status": sync_state.sync_status,
@@ -357,19 +848,38 @@ class Config:
         sync_state.last_sync_times = {}
         sync_state.next_run_times = {}
 
+    def _config_file_signature(self):
+        # Editors that save via rename replace the inode and may preserve or
+        # even roll back the mtime, so compare the whole stat signature
+        try:
+            st = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
     def check_config_changed(self):
-        current_mtime = os.path.getmtime(self.config_file)
-        if self.last_config_mtime is None:
-            self.last_config_mtime = current_mtime
-        elif current_mtime > self.last_config_mtime:
+        current_signature = self._config_file_signature()
+        if self.last_config_signature is None:
+            self.last_config_signature = current_signature
+        elif current_signature != self.last_config_signature:
             self.config_changed_on_disk = True
-            self.last_config_mtime = current_mtime
+            self.last_config_signature = current_signature
+            event_bus.publish(CONFIG_CHANGED, changed_on_disk=True)
 
     def reset_config_changed_flag(self):
         self.config_changed_on_disk = False
-        self.last_config_mtime = os.path.getmtime(self.config_file)
+        self.last_config_signature = self._config_file_signature()
+
+    def get_watched_config_paths(self):
+        paths = [self.config_file]
+        if self._config is not None:
+            jobs_dir = self.resolve_sync_jobs_dir(self._config)
+            if jobs_dir is not None and os.path.isdir(jobs_dir):
+                paths.append(jobs_dir)
+        return paths
 
     def save_sync_errors(self):
+        metrics.state_file_writes.inc(file='sync_errors')
         with open(self.sync_errors_file, 'w') as f:
             json.dump(self.sync_errors, f, default=str)
 
@@ -388,6 +898,8 @@ class Config:
             "timestamp": datetime.now().isoformat()
         }
         self.save_sync_errors()
+        event_bus.publish(SYNC_ERROR, job=local_path, sync_type=sync_type,
+                          error_code=error_code, message=message)
 
     def remove_sync_error(self, local_path):
         if local_path in self.sync_errors:
@@ -399,12 +911,12 @@ config = Config()
 
 
 def signal_handler(signum, frame):
-    if config._config is not None:
-        config.running = False
-        config.shutting_down = True
-        log_message('SIGINT or SIGTERM received. Initiating graceful shutdown.')
-        if hasattr(config, 'lock_fd'):
-            config.lock_fd.close()
+    # Also in limbo, where there may be no config at all
+    config.running = False
+    config.shutting_down = True
+    log_message('SIGINT or SIGTERM received. Initiating graceful shutdown.')
+    if hasattr(config, 'lock_fd'):
+        config.lock_fd.close()
 
 
 def get_config_schema():
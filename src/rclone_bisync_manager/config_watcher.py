@@ -0,0 +1,184 @@
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import time
+from rclone_bisync_manager.logging_utils import log_message, log_error
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+# Editors tend to write a file in several steps (truncate, write, rename), so
+# we wait for the burst to settle before reloading
+DEBOUNCE_SECONDS = 1.0
+POLL_INTERVAL_SECONDS = 1.0
+
+
+class Inotify:
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(),
+                          f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(
+                errors='replace')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    def __init__(self):
+        self.on_change = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._paths = []
+        self.backend = None
+
+    @property
+    def watched_paths(self):
+        return list(self._paths)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, paths, on_change):
+        self.stop()
+        self._paths = list(paths)
+        self.on_change = on_change
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        try:
+            self._run_inotify()
+        except OSError as e:
+            log_error(f"inotify unavailable ({
+                      str(e)}), falling back to polling the config file")
+            self._run_polling()
+
+    def _watch_targets(self):
+        # Watch the containing directories rather than the files themselves,
+        # so that editors which save by renaming a temp file over the original
+        # don't leave us watching a deleted inode
+        targets = {}
+        for path in self._paths:
+            if os.path.isdir(path):
+                targets.setdefault(path, set()).add(None)
+            else:
+                targets.setdefault(os.path.dirname(path), set()).add(
+                    os.path.basename(path))
+        return targets
+
+    def _run_inotify(self):
+        inotify = Inotify()
+        self.backend = 'inotify'
+        try:
+            watches = {}
+            for directory, names in self._watch_targets().items():
+                watches[inotify.add_watch(directory)] = names
+            log_message(f"Watching config for changes: {
+                        ', '.join(self._paths)}")
+
+            pending_since = None
+            while not self._stop_event.is_set():
+                timeout = POLL_INTERVAL_SECONDS if pending_since is None else DEBOUNCE_SECONDS
+                readable, _, _ = select.select([inotify.fd], [], [], timeout)
+                if readable:
+                    for wd, mask, name in inotify.read_events():
+                        names = watches.get(wd, set())
+                        if None in names or name in names:
+                            pending_since = time.monotonic()
+                    continue
+                if pending_since is not None and time.monotonic() - pending_since >= DEBOUNCE_SECONDS:
+                    pending_since = None
+                    self._fire()
+        finally:
+            inotify.close()
+
+    def _signature(self):
+        signature = []
+        for path in self._paths:
+            try:
+                if os.path.isdir(path):
+                    for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                        st = entry.stat()
+                        signature.append(
+                            (entry.path, st.st_ino, st.st_mtime_ns, st.st_size))
+                else:
+                    st = os.stat(path)
+                    signature.append(
+                        (path, st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None, None))
+        return signature
+
+    def _run_polling(self):
+        self.backend = 'polling'
+        last_signature = self._signature()
+        pending_since = None
+        while not self._stop_event.wait(POLL_INTERVAL_SECONDS):
+            signature = self._signature()
+            if signature != last_signature:
+                last_signature = signature
+                pending_since = time.monotonic()
+            elif pending_since is not None and time.monotonic() - pending_since >= DEBOUNCE_SECONDS:
+                pending_since = None
+                self._fire()
+
+    def _fire(self):
+        try:
+            self.on_change()
+        except Exception as e:
+            log_error(f"Error handling config change: {str(e)}")
+
+
+config_watcher = ConfigWatcher()
@@ -0,0 +1,154 @@
+import json
+import socket
+import struct
+import itertools
+import time
+
+# Shared by the daemon and its clients (CLI, tray). Keep this module free of
+# daemon imports so clients can use it without loading the configuration.
+
+SOCKET_PATH = '/tmp/rclone_bisync_manager_status.sock'
+
+# Every message is a 4-byte big-endian length followed by a UTF-8 JSON
+# object. Requests look like {"id": 1, "command": "STATUS", "args": {}},
+# responses echo the id: {"id": 1, "status": "success", "result": ...} or
+# {"id": 1, "status": "error", "message": "..."}.
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class ControlError(Exception):
+    pass
+
+
+def encode_frame(message, default=None):
+    body = json.dumps(message, default=default,
+                      ensure_ascii=False).encode()
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def is_legacy_request(header):
+    # Old clients send a bare command such as b"STATUS" without framing; its
+    # first four bytes decode to an absurd frame length made of letters
+    return len(header) == FRAME_HEADER.size and header.isascii() and header.decode().replace('_', '').isalpha()
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed by daemon")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+class ControlClient:
+    # A persistent connection to the daemon's control socket. Several
+    # requests can be sent over the same connection.
+    def __init__(self, socket_path=SOCKET_PATH, timeout=5):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._ids = itertools.count(1)
+
+    def connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def send(self, command, **args):
+        self.connect()
+        request_id = next(self._ids)
+        self._sock.sendall(encode_frame(
+            {"id": request_id, "command": command, "args": args}))
+        return request_id
+
+    def receive(self):
+        header = _recv_exactly(self._sock, FRAME_HEADER.size)
+        (length,) = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_SIZE:
+            raise ControlError(f"Response frame too large: {length} bytes")
+        return json.loads(_recv_exactly(self._sock, length))
+
+    def request(self, command, **args):
+        request_id = self.send(command, **args)
+        while True:
+            response = self.receive()
+            if response.get("id") == request_id:
+                break
+        if response.get("status") == "error":
+            raise ControlError(response.get("message", "Unknown error"))
+        return response.get("result")
+
+    def stream(self, command, end_event=None, timeout=None, **args):
+        # For commands that answer with several frames (SUBSCRIBE, ADD_SYNC
+        # with wait): yields every frame for the request, up to and
+        # including the end_event frame. Frames may be minutes apart, so no
+        # read timeout applies; timeout limits the whole stream instead and
+        # raises TimeoutError once it has passed.
+        request_id = self.send(command, **args)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No end of stream within {timeout}s")
+                self._sock.settimeout(remaining)
+            else:
+                self._sock.settimeout(None)
+            message = self.receive()
+            if message.get("id") != request_id:
+                continue
+            if message.get("status") == "error":
+                raise ControlError(message.get("message", "Unknown error"))
+            yield message
+            if end_event is not None and message.get("event") == end_event:
+                return
+
+    def subscribe(self):
+        # Yields the daemon's full status first and then an updated copy
+        # after every pushed event, as (event, status) pairs
+        status = None
+        for message in self.stream("SUBSCRIBE"):
+            if "event" not in message:
+                status = message.get("result")
+                yield None, status
+                continue
+            status = apply_status_event(status, message)
+            yield message, status
+
+
+def apply_status_event(status, message):
+    if message.get("full") or status is None:
+        return message["changes"]
+    updated = dict(status)
+    changes = dict(message["changes"])
+    job_changes = changes.pop("sync_jobs", None)
+    updated.update(changes)
+    if job_changes:
+        updated["sync_jobs"] = {**status.get("sync_jobs", {}), **job_changes}
+    return updated
+
+
+def send_command(command, socket_path=SOCKET_PATH, timeout=5, **args):
+    with ControlClient(socket_path, timeout) as client:
+        return client.request(command, **args)
@@ -0,0 +1,247 @@
+import os
+import time
+import itertools
+import threading
+import subprocess
+from dataclasses import dataclass, field
+
+import psutil
+from rclone_bisync_manager.logging_utils import log_message, log_error
+
+# Native replacement for wrapping rclone in cpulimit. When the daemon runs in
+# a delegated cgroup v2 subtree (e.g. a systemd user service with
+# Delegate=cpu) every rclone run gets its own child cgroup with a cpu.max
+# quota, which the kernel enforces for all of Go's threads. Otherwise rclone
+# is reniced, put in the lowest best-effort I/O class and pinned to a share
+# of the CPUs. Limits are a percentage of the whole machine.
+#
+# The limit is applied in the child between fork and exec, so rclone runs
+# limited from its first instruction and every thread and process it starts
+# inherits the cgroup or the scheduling attributes.
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+CPU_MAX_PERIOD = 100000
+RUN_CGROUP_PREFIX = 'rclone-'
+FALLBACK_NICE = 10
+FALLBACK_IONICE_LEVEL = 7
+RSS_SAMPLE_INTERVAL = 0.5
+
+# Pids of the rclone processes that are currently running
+active_processes = set()
+
+
+@dataclass
+class AppliedLimit:
+    kind: str
+    percent: int
+    cgroup: str = None
+
+
+@dataclass
+class LimitedRunResult:
+    args: list
+    returncode: int
+    usage: dict = field(default_factory=dict)
+    # Set by the caller when the run watchdog cancelled the run
+    cancelled: str = None
+
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+
+def _write(path, value):
+    with open(path, 'w') as f:
+        f.write(value)
+
+
+def available_cpus():
+    return len(os.sched_getaffinity(0))
+
+
+class CpuLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probed = False
+        self._cgroup_base = None
+        # Run cgroups are created before the pid is known
+        self._run_ids = itertools.count(1)
+
+    def _probe(self):
+        # The unified (v2) hierarchy is the "0::" line
+        try:
+            lines = _read('/proc/self/cgroup').splitlines()
+        except OSError:
+            return None
+        path = next((line[3:] for line in lines if line.startswith('0::')), None)
+        if path is None:
+            return None
+        base = os.path.join(CGROUP_ROOT, path.lstrip('/'))
+
+        try:
+            if not os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers')):
+                raise OSError(f"no cgroup v2 hierarchy at {CGROUP_ROOT}")
+            if 'cpu' not in _read(os.path.join(base, 'cgroup.controllers')).split():
+                raise OSError("cpu controller not delegated")
+            if 'cpu' not in _read(os.path.join(base, 'cgroup.subtree_control')).split():
+                # A cgroup that has processes can't enable controllers for
+                # its children, so the daemon moves itself into a leaf first
+                if path != '/':
+                    leaf = os.path.join(base, 'manager')
+                    os.makedirs(leaf, exist_ok=True)
+                    _write(os.path.join(leaf, 'cgroup.procs'), str(os.getpid()))
+                _write(os.path.join(base, 'cgroup.subtree_control'), '+cpu')
+        except OSError as e:
+            log_message(
+                f"cgroup v2 CPU limits unavailable ({e}), using nice/ionice/CPU affinity instead")
+            return None
+
+        # Run cgroups left behind by a crashed daemon
+        for name in os.listdir(base):
+            if name.startswith(RUN_CGROUP_PREFIX):
+                try:
+                    os.rmdir(os.path.join(base, name))
+                except OSError:
+                    pass
+        log_message(f"Limiting rclone CPU usage with cgroup v2 under {base}")
+        return base
+
+    def cgroup_base(self):
+        with self._lock:
+            if not self._probed:
+                self._cgroup_base = self._probe()
+                self._probed = True
+            return self._cgroup_base
+
+    def prepare(self, percent):
+        # Returns the limit of a run that is about to start and the function
+        # that puts the child under it before exec (None without a limit)
+        if not percent or percent >= 100:
+            return AppliedLimit('none', 100), None
+
+        base = self.cgroup_base()
+        if base is not None:
+            cgroup = os.path.join(base, f"{RUN_CGROUP_PREFIX}{os.getpid()}-{next(self._run_ids)}")
+            try:
+                os.makedirs(cgroup, exist_ok=True)
+                quota = max(1000, int(CPU_MAX_PERIOD *
+                            available_cpus() * percent / 100))
+                _write(os.path.join(cgroup, 'cpu.max'),
+                       f"{quota} {CPU_MAX_PERIOD}")
+            except OSError as e:
+                log_error(f"Failed to create a cgroup for rclone: {str(e)}")
+                self._remove_cgroup(cgroup)
+            else:
+                procs = os.path.join(cgroup, 'cgroup.procs')
+                return AppliedLimit('cgroup', percent, cgroup), lambda: _write(procs, str(os.getpid()))
+
+        return self.prepare_fallback(percent)
+
+    def prepare_fallback(self, percent):
+        cpus = sorted(os.sched_getaffinity(0))
+        pinned = cpus[:max(1, len(cpus) * percent // 100)]
+
+        def limit_child():
+            # Runs in the child of a threaded process before exec, so it is
+            # kept to a few system calls; failures leave rclone unlimited
+            # rather than failing the run
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, FALLBACK_NICE)
+                os.sched_setaffinity(0, pinned)
+                psutil.Process().ionice(psutil.IOPRIO_CLASS_BE, FALLBACK_IONICE_LEVEL)
+            except (OSError, psutil.Error):
+                pass
+
+        return AppliedLimit('nice', percent), limit_child
+
+    def release(self, limit):
+        if limit.cgroup:
+            self._remove_cgroup(limit.cgroup)
+
+    def _remove_cgroup(self, cgroup):
+        try:
+            os.rmdir(cgroup)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log_error(f"Failed to remove cgroup {cgroup}: {str(e)}")
+
+
+class PeakRssSampler(threading.Thread):
+    # ru_maxrss of a forked child also counts the daemon's own pages from
+    # before exec, so rclone's peak RSS (with its children) is sampled instead
+    def __init__(self, pid):
+        super().__init__(name=f'rss-sampler-{pid}', daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            process = psutil.Process(self.pid)
+        except psutil.Error:
+            return
+        while True:
+            try:
+                rss = process.memory_info().rss + sum(
+                    child.memory_info().rss for child in process.children(recursive=True))
+                self.peak = max(self.peak, rss)
+            except psutil.Error:
+                return
+            if self._stop_event.wait(RSS_SAMPLE_INTERVAL):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_limited(command, max_cpu_usage_percent, on_start=None, **popen_args):
+    # Like subprocess.run, but reaps the child with wait4 to get its resource
+    # usage (including any children it waited for); on_start gets the pid
+    started = time.monotonic()
+    limit, limit_child = cpu_limiter.prepare(max_cpu_usage_percent)
+    try:
+        process = subprocess.Popen(command, preexec_fn=limit_child, **popen_args)
+    except subprocess.SubprocessError as e:
+        # Moving the child into its cgroup failed, before rclone was started
+        log_error(f"Failed to place rclone in a cgroup ({str(e)}), using nice instead")
+        cpu_limiter.release(limit)
+        limit, limit_child = cpu_limiter.prepare_fallback(max_cpu_usage_percent)
+        process = subprocess.Popen(command, preexec_fn=limit_child, **popen_args)
+    except BaseException:
+        cpu_limiter.release(limit)
+        raise
+    active_processes.add(process.pid)
+    if on_start is not None:
+        on_start(process.pid)
+    rss_sampler = PeakRssSampler(process.pid)
+    rss_sampler.start()
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        rss_sampler.stop()
+        active_processes.discard(process.pid)
+        cpu_limiter.release(limit)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    elapsed = time.monotonic() - started
+    cpu_seconds = rusage.ru_utime + rusage.ru_stime
+    usage = {
+        "limiter": limit.kind,
+        "limit_percent": limit.percent,
+        "wall_seconds": round(elapsed, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        # Same scale as the limit: a share of all available CPUs
+        "cpu_percent": round(100 * cpu_seconds / (elapsed * available_cpus()), 1) if elapsed > 0 else 0.0,
+        "peak_rss_bytes": rss_sampler.peak,
+    }
+    return LimitedRunResult(command, process.returncode, usage)
+
+
+cpu_limiter = CpuLimiter()
@@ -2,11 +2,22 @@ import json
 import socket
 import traceback
 from rclone_bisync_manager.status_server import start_status_server
-from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.status_snapshot import read_status_file
+from rclone_bisync_manager.control_protocol import SOCKET_PATH, ControlClient, ControlError, send_command
+from rclone_bisync_manager.logging_utils import log_message, log_error, shutdown_logging
 from rclone_bisync_manager.utils import check_and_create_lock_file
-from rclone_bisync_manager.scheduler import scheduler
+from rclone_bisync_manager.scheduler import scheduler, QueuedSync
+from rclone_bisync_manager.run_logs import run_log_index
+from rclone_bisync_manager import metrics
+from rclone_bisync_manager.tracing import tracer
+from rclone_bisync_manager.admission import admission
+from rclone_bisync_manager.watchdog import run_watchdog, STALLED
+from rclone_bisync_manager.job_stats import job_stats
+from rclone_bisync_manager.deadlines import dispatch_policy, deadline_for
 from rclone_bisync_manager.sync import perform_sync_operations
 from rclone_bisync_manager.config import config, signal_handler
+from rclone_bisync_manager.config_watcher import config_watcher
+from rclone_bisync_manager.events import event_bus, JOB_STARTED, JOB_FINISHED, QUEUE_CHANGED, CONFIG_CHANGED, CONFIG_RELOADED, SCHEDULE_CHANGED, DAEMON_STATE
 import os
 import signal
 import time
@@ -38,11 +49,6 @@ def daemon_main():
             target=start_status_server, daemon=True)
         status_thread.start()
 
-        print("Starting add-sync request handler thread")
-        add_sync_thread = threading.Thread(
-            target=handle_add_sync_request, daemon=True)
-        add_sync_thread.start()
-
         print("Attempting to load and validate config")
         try:
             config.load_and_validate_config(config.args)
@@ -52,6 +58,8 @@ def daemon_main():
             config.in_limbo = False
             print("Scheduling tasks")
             scheduler.schedule_tasks()
+            update_config_watcher()
+            event_bus.publish(CONFIG_RELOADED, success=True)
         except Exception as e:
             error_trace = traceback.format_exc()
             print(f"Configuration error: {str(e)}")
@@ -60,7 +68,14 @@ def daemon_main():
             config.in_limbo = True
             config.config_invalid = True
             config.config_error_message = str(e)
-            return  # Exit the daemon_main function if there's a config error
+            # Stay up in limbo and watch the config file, so that fixing it
+            # (or a RELOAD) brings the daemon out of limbo
+            log_message("Daemon staying in limbo until the configuration is fixed")
+            update_config_watcher()
+            event_bus.publish(CONFIG_RELOADED, success=False, error=str(e))
+
+        admission.start()
+        run_watchdog.start()
 
         print("Entering main daemon loop")
         last_config_check = time.time()
@@ -69,12 +84,18 @@ def daemon_main():
         while config.running:
             current_time = time.time()
             if current_time - last_config_check >= config_check_interval:
-                config.check_config_changed()
+                with tracer.span("check_config_changed"):
+                    config.check_config_changed()
                 last_config_check = current_time
 
+            if config.pending_config is not None:
+                with tracer.span("apply_pending_config"):
+                    apply_pending_config()
+
             if not config.in_limbo and not config.config_invalid:
                 process_sync_queue()
-                check_scheduled_tasks()
+                with tracer.span("check_scheduled_tasks"):
+                    check_scheduled_tasks()
 
             time.sleep(1)
             if config.shutting_down:
@@ -84,28 +105,26 @@ def daemon_main():
                 break
 
         print("Exiting main daemon loop")
+        config_watcher.stop()
+        # Let a suspended rclone finish instead of waiting out the timeout
+        admission.stop()
+        event_bus.publish(DAEMON_STATE, shutting_down=True)
 
         # Graceful shutdown
         log_message('Daemon shutting down...')
 
-        # Wait for current sync to finish with a timeout
-        shutdown_start = time.time()
-        while config.currently_syncing and time.time() - shutdown_start < 60:  # 60 seconds timeout
-            log_message(f"Waiting for current sync to finish: {
-                        config.currently_syncing}")
-            time.sleep(5)
-
-        if config.currently_syncing:
-            log_message(f"Sync operation {
-                        config.currently_syncing} did not finish within timeout. Forcing shutdown.")
+        # A running rclone got SIGINT from the watchdog (and SIGKILL after
+        # the grace period), which ended the sync; don't leave anything behind
+        run_watchdog.stop()
+        run_watchdog.kill_all()
 
         # Clear remaining queue
-        while not config.sync_queue.empty():
-            config.sync_queue.get_nowait()
-        config.queued_paths.clear()
+        config.sync_queue.clear()
+        metrics.jobs_queued.set(0)
 
         config.shutdown_complete = True
         log_message('Daemon shutdown complete.')
+        event_bus.publish(DAEMON_STATE, shutdown_complete=True)
         status_thread.join(timeout=5)
 
     except Exception as e:
@@ -124,6 +143,8 @@ def daemon_main():
                 os.unlink(config.LOCK_FILE_PATH)
             except OSError:
                 pass  # Ignore if the file is already gone
+        # Make sure every queued log record reaches the disk, also after a crash
+        shutdown_logging()
 
 
 def write_crash_log(error_message):
@@ -132,23 +153,98 @@ def write_crash_log(error_message):
         f.write(error_message)
 
 
+def queue_aging_seconds():
+    return config._config.queue_aging_minutes * 60
+
+
+def count_queued():
+    return len(config.sync_queue) + len(admission.deferred)
+
+
 def process_sync_queue():
+    for item in admission.release_deferred():
+        config.sync_queue.put(item, queue_aging_seconds())
+
     while not config.sync_queue.empty() and not config.shutting_down:
         with config.sync_lock:
             if config.currently_syncing is None:
-                key, force_bisync, force_resync = config.sync_queue.get_nowait()
+                item = config.sync_queue.pop(dispatch_policy())
+                if item is None:
+                    break
+                key = item.job_key
+                reason = admission.check(item)
+                if reason is not None:
+                    if admission.defer(item, reason):
+                        event_bus.publish(
+                            QUEUE_CHANGED, job=key, deferred=reason)
+                    continue
                 config.currently_syncing = key
-                config.queued_paths.remove(key)
+                config.current_sync_manual = item.manual
                 config.current_sync_start_time = datetime.now()
+                metrics.jobs_running.set(1)
+                metrics.jobs_queued.set(count_queued())
+                metrics.queue_wait.observe(max(0.0, (config.current_sync_start_time - (
+                    item.scheduled_time or item.requested_at)).total_seconds()), job=key)
+                lateness = (config.current_sync_start_time - item.deadline).total_seconds() \
+                    if item.deadline else None
+                if lateness is not None and lateness > 0:
+                    metrics.deadline_misses.inc(job=key)
             else:
                 break
 
-        if key in config._config.sync_jobs and not config.shutting_down:
-            perform_sync_operations(key, force_bisync, force_resync)
-
-        with config.sync_lock:
-            config.currently_syncing = None
-            config.current_sync_start_time = None
+        event_bus.publish(JOB_STARTED, job=key)
+        started = config.current_sync_start_time
+        result = "FAILED"
+        try:
+            if key in config._config.sync_jobs and not config.shutting_down:
+                with tracer.trace(key) as trace:
+                    queued_at = item.scheduled_time or item.requested_at
+                    trace.add_span("queue_wait", queued_at.timestamp(),
+                                   max(0.0, (started - queued_at).total_seconds()))
+                    try:
+                        result = perform_sync_operations(
+                            key, item.force_bisync, item.resync)
+                    finally:
+                        trace.result = result
+            else:
+                result = "SKIPPED"
+        finally:
+            with config.sync_lock:
+                config.currently_syncing = None
+                config.current_sync_start_time = None
+            metrics.jobs_running.set(0)
+            if result != "SKIPPED":
+                job_stats.record_sync(
+                    key, (datetime.now() - started).total_seconds() if result == "COMPLETED" else None, lateness)
+            # The exit code of the job's last rclone run, if it ran at all
+            run = run_log_index.find_run(key)
+            if run is not None and datetime.fromisoformat(run.started) < started:
+                run = None
+            if result != "SKIPPED" and key in config._config.sync_jobs and not config.shutting_down:
+                handle_retry(key, item.attempt, result, run.exit_code if run else None,
+                             run.extra.get("cancelled") if run else None)
+            run_watchdog.end_job(key)
+            event_bus.publish(JOB_FINISHED, job=key, result=result,
+                              exit_code=run.exit_code if run else None,
+                              run_id=run.run_id if run else None)
+
+
+def handle_retry(key, attempt, result, exit_code, cancelled=None):
+    # Runs that failed with a transient exit code or were cancelled because
+    # they stalled are retried through the scheduler; anything else ends the
+    # job's retries
+    transient = cancelled == STALLED if cancelled else exit_code in config._config.retry.exit_codes
+    if result == "FAILED" and transient:
+        retry_time = scheduler.schedule_retry(key, attempt, exit_code)
+        state = scheduler.retries[key]
+        if retry_time is not None:
+            log_message(f"Retrying sync job {key} at {retry_time.strftime('%H:%M:%S')} "
+                        f"(attempt {attempt + 1} of {state['max_attempts']}, exit code {exit_code})")
+        elif attempt >= state["max_attempts"]:
+            log_error(f"Sync job {key} failed with exit code {exit_code} after {attempt} attempts")
+        event_bus.publish(SCHEDULE_CHANGED, job=key)
+    elif scheduler.clear_retry(key):
+        event_bus.publish(SCHEDULE_CHANGED, job=key)
 
 
 def check_scheduled_tasks():
@@ -158,24 +254,83 @@ def check_scheduled_tasks():
             now = datetime.now()
             if now >= next_task.scheduled_time:
                 task = scheduler.pop_next_task()
-                add_to_sync_queue(task.path_key)
+                add_to_sync_queue(task.path_key,
+                                  scheduled_time=task.scheduled_time, attempt=task.attempt)
                 # Reschedule the task
                 job_config = config._config.sync_jobs[task.path_key]
                 cron = croniter(job_config.schedule, now)
                 next_run = cron.get_next(datetime)
                 scheduler.schedule_task(task.path_key, next_run)
+                event_bus.publish(SCHEDULE_CHANGED, job=task.path_key)
             else:
                 break
         else:
             break
 
 
-def add_to_sync_queue(key, force_bisync=False, resync=False):
-    if not config.shutting_down and key not in config.queued_paths and key != config.currently_syncing:
-        config._config.sync_jobs[key].force_operation = force_bisync
-        config._config.sync_jobs[key].force_resync = resync
-        config.sync_queue.put_nowait((key, force_bisync, resync))
-        config.queued_paths.add(key)
+def add_to_sync_queue(key, force_bisync=False, resync=False, priority=None, scheduled_time=None, manual=False,
+                      attempt=1):
+    if config.shutting_down or key == config.currently_syncing:
+        return False
+    if priority is None:
+        priority = config._config.sync_jobs[key].priority
+
+    # A manual request for a job deferred by admission control queues it
+    # again right away, bypassing the deferral
+    if manual:
+        admission.take_deferred(key)
+    if key in admission.deferred:
+        return False
+
+    queued = config.sync_queue.get(key)
+    if queued is not None:
+        # Already queued: a manual request moves it to the interactive lane
+        # and a higher priority raises it
+        if (manual and not queued.manual) or priority > queued.priority:
+            config.sync_queue.reprioritize(key, max(priority, queued.priority), manual or queued.manual,
+                                           queue_aging_seconds())
+            event_bus.publish(QUEUE_CHANGED, job=key)
+        return False
+
+    config._config.sync_jobs[key].force_operation = force_bisync
+    config._config.sync_jobs[key].force_resync = resync
+    item = QueuedSync(key, force_bisync, resync, priority, scheduled_time=scheduled_time, manual=manual,
+                      attempt=attempt)
+    if not manual:
+        item.deadline = deadline_for(key, scheduled_time or item.requested_at)
+    config.sync_queue.put(item, queue_aging_seconds())
+    metrics.jobs_queued.set(count_queued())
+    event_bus.publish(QUEUE_CHANGED, job=key)
+    return True
+
+
+def cancel_sync(key):
+    # Cancels the job if it is running, otherwise takes it out of the queue
+    if run_watchdog.cancel(key):
+        return True, f"Cancelling running sync job '{key}'"
+    if remove_from_sync_queue(key, result="CANCELLED"):
+        return True, f"Sync job '{key}' removed from queue"
+    return False, f"Sync job '{key}' is neither running nor queued"
+
+
+def remove_from_sync_queue(key, result="REMOVED"):
+    item = config.sync_queue.remove(key) or admission.take_deferred(key)
+    if item is None:
+        return False
+    log_message(f"Removed sync job '{key}' from the queue")
+    metrics.jobs_queued.set(count_queued())
+    event_bus.publish(QUEUE_CHANGED, job=key, removed=True)
+    # The job won't run, so whoever waits for it (add-sync --wait) is done
+    event_bus.publish(JOB_FINISHED, job=key, result=result,
+                      exit_code=None, run_id=None)
+    return True
+
+
+def set_sync_priority(key, priority):
+    if not config.sync_queue.reprioritize(key, priority, aging_seconds=queue_aging_seconds()):
+        return False
+    event_bus.publish(QUEUE_CHANGED, job=key, priority=priority)
+    return True
 
 
 def stop_daemon():
@@ -184,94 +339,86 @@ def stop_daemon():
         return
 
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect('/tmp/rclone_bisync_manager_status.sock')
-        client.sendall(b"STOP")
-        response = client.recv(1024).decode()
-        client.close()
+        send_command("STOP")
         print("Daemon is shutting down. Use 'daemon status' to check progress.")
     except Exception as e:
         print(f"Error stopping daemon: {e}")
 
 
-def print_daemon_status():
-    socket_path = '/tmp/rclone_bisync_manager_status.sock'
-    if not os.path.exists(socket_path):
-        print("Daemon is not running.")
+def print_daemon_status(watch=False, query=None, snapshot=False):
+    if snapshot:
+        print_status_snapshot()
         return
 
-    try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.settimeout(5)  # Set a 5-second timeout
-        client.connect(socket_path)
-        client.sendall(b"STATUS")
-
-        chunks = []
-        while True:
-            chunk = client.recv(4096)
-            if not chunk:
-                break
-            chunks.append(chunk)
-        response = b''.join(chunks).decode()
-        client.close()
+    if not os.path.exists(SOCKET_PATH):
+        print("Daemon is not running.")
+        return
 
-        if not response:
-            print("Error: No response received from daemon.")
-            return
+    if watch:
+        watch_daemon_status()
+        return
 
-        try:
-            status_dict = json.loads(response)
-            if status_dict.get("shutting_down", False):
-                print("Daemon is shutting down. Current status:")
-            print(json.dumps(status_dict, ensure_ascii=False, indent=2))
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            print("Raw status data:")
-            print(response)
+    try:
+        status_dict = send_command("STATUS", **(query or {}))
+        if status_dict.get("shutting_down", False):
+            print("Daemon is shutting down. Current status:")
+        print(json.dumps(status_dict, ensure_ascii=False, indent=2))
+    except ControlError as e:
+        print(f"Error from daemon: {e}")
+    except (socket.timeout, ConnectionError) as e:
+        # A busy or wedged daemon still leaves its last published snapshot
+        print(f"Daemon is not responding ({e}).")
+        print_status_snapshot()
     except Exception as e:
         print(f"Error communicating with daemon: {e}")
         print("Traceback:")
         print(traceback.format_exc())
 
 
-def handle_add_sync_request():
-    socket_path = '/tmp/rclone_bisync_manager_add_sync.sock'
-    if os.path.exists(socket_path):
-        os.unlink(socket_path)
+def print_status_snapshot():
+    status_dict = read_status_file()
+    if status_dict is None:
+        print("No status snapshot available. Daemon is not running.")
+        return
+    print(f"Status snapshot published at {status_dict['published_at']}:")
+    print(json.dumps(status_dict, ensure_ascii=False, indent=2))
 
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(socket_path)
-    server.listen(1)
-    server.settimeout(1)
 
-    while config.running and not config.shutting_down:
-        try:
-            conn, addr = server.accept()
-            data = conn.recv(1024).decode()
-            sync_request = json.loads(data)
-            job = sync_request['job_key']
-            force_bisync = sync_request.get('force_bisync', False)
-            resync = sync_request.get('resync', False)
-
-            if job in config._config.sync_jobs:
-                config._config.sync_jobs[job].force_operation = force_bisync
-                config._config.sync_jobs[job].force_resync = resync
-                add_to_sync_queue(
-                    job, force_bisync=force_bisync, resync=resync)
-                log_message(f"Added sync job '{job}' to queue (Force bisync: {
-                            force_bisync}, Resync: {resync})")
-                conn.sendall(b"OK")
-            else:
-                log_error(f"Sync job '{job}' not found in configuration")
-                conn.sendall(b"ERROR: Job not found")
-            conn.close()
-        except socket.timeout:
-            continue
-        except Exception as e:
-            log_error(f"Error handling add-sync request: {str(e)}")
-
-    server.close()
-    os.unlink(socket_path)
+def watch_daemon_status():
+    try:
+        with ControlClient() as client:
+            for event, status in client.subscribe():
+                if event is None:
+                    print(json.dumps(status, ensure_ascii=False, indent=2))
+                    continue
+                line = f"{event['time']} {event['event']}"
+                if event["data"]:
+                    line += " (" + ", ".join(f"{k}={v}" for k,
+                                             v in event["data"].items()) + ")"
+                job_status = status.get("sync_jobs", {}).get(
+                    event["data"].get("job"))
+                if job_status:
+                    line += f" sync_status={job_status['sync_status']}"
+                print(line, flush=True)
+    except KeyboardInterrupt:
+        pass
+    except (ConnectionError, ControlError) as e:
+        print(f"Lost connection to daemon: {e}")
+
+
+def request_sync(job, force_bisync=False, resync=False, priority=None):
+    if config._config is None or job not in config._config.sync_jobs:
+        log_error(f"Sync job '{job}' not found in configuration")
+        return False, f"Job not found: {job}"
+    if config.shutting_down:
+        return False, "Daemon is shutting down"
+
+    if not add_to_sync_queue(job, force_bisync=force_bisync, resync=resync, priority=priority, manual=True):
+        state = "running" if job == config.currently_syncing else "queued"
+        return True, f"Sync job '{job}' is already {state}"
+    log_message(f"Added sync job '{job}' to queue (Force bisync: {force_bisync}, Resync: {resync}, "
+                f"Priority: {priority if priority is not None else 'job default'})")
+    return True, f"Sync job '{job}' added to queue"
 
 
 def reload_config():
@@ -283,6 +430,8 @@ def reload_config():
         scheduler.schedule_tasks()
         config.config_invalid = False
         config.in_limbo = False
+        update_config_watcher()
+        event_bus.publish(CONFIG_RELOADED, success=True)
         return True
     except (ValueError, FileNotFoundError) as e:
         error_message = f"Error reloading config: {str(e)}"
@@ -291,4 +440,58 @@ def reload_config():
         config.in_limbo = True
         config.config_error_message = error_message
         log_message("Daemon entering limbo state due to invalid configuration.")
+        update_config_watcher()
+        event_bus.publish(CONFIG_RELOADED, success=False, error=error_message)
         return False
+
+
+def update_config_watcher():
+    # In limbo the config is watched regardless of auto_reload, as a fixed
+    # file is the way out
+    if config.in_limbo or (config._config is not None and config._config.auto_reload):
+        paths = config.get_watched_config_paths()
+        if not config_watcher.running or config_watcher.watched_paths != paths:
+            config_watcher.start(paths, handle_config_file_change)
+    elif config_watcher.running:
+        config_watcher.stop()
+        log_message("Stopped watching config for changes")
+
+
+def handle_config_file_change():
+    # Runs on the watcher thread: validate in the background and hand a good
+    # config to the main loop, which swaps it in between sync runs
+    try:
+        source = config.read_config_source(config.args)
+        if config.is_active_source(source, config.args) and not config.in_limbo:
+            config.reset_config_changed_flag()
+            return
+        new_config = config.build_config(config.args, source)
+    except (ValueError, FileNotFoundError) as e:
+        error_message = f"Auto-reload rejected invalid configuration: {
+            str(e)}"
+        log_error(error_message)
+        config.auto_reload_error = error_message
+        config.config_changed_on_disk = True
+        event_bus.publish(CONFIG_CHANGED, changed_on_disk=True,
+                          error=error_message)
+        return
+
+    log_message("Configuration change detected and validated. Scheduling reload.")
+    config.pending_config = (new_config, source[1])
+
+
+def apply_pending_config():
+    pending = config.pending_config
+    config.pending_config = None
+    if pending is None:
+        return
+
+    new_config, config_key = pending
+    config.apply_config(new_config, config.args, config_key)
+    config.reset_config_changed_flag()
+    scheduler.clear_tasks()
+    scheduler.schedule_tasks()
+    config.in_limbo = False
+    log_message("Configuration reloaded automatically.")
+    update_config_watcher()
+    event_bus.publish(CONFIG_RELOADED, success=True, automatic=True)
@@ -0,0 +1,95 @@
+import heapq
+from datetime import timedelta
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.job_stats import job_stats
+
+# Deadline-aware ordering of the scheduled lane (queue_policy: deadline).
+# Every scheduled run has to start by its scheduled time plus the job's
+# tolerance. Minimising the total lateness exactly is NP-hard, so the queue
+# uses the modified due date rule: run next the job with the smallest
+# max(deadline, now) + predicted duration. While runs can still make their
+# deadline this is earliest-deadline-first; once they are late it becomes
+# shortest-predicted-first, so one long job doesn't make every other late
+# job later still. Durations are predicted from past runs (job_stats);
+# jobs that never completed count as instantaneous.
+#
+# order() simulates the whole lane for the status, so it keeps the jobs that
+# are not late yet in a heap by deadline + duration and moves them to a heap
+# of late jobs by duration once the simulated clock passes their deadline:
+# O(n log n) instead of a scan per pick.
+
+
+def deadline_for(key, queued_at):
+    job = config._config.sync_jobs.get(key)
+    minutes = job.deadline_tolerance_minutes if job and job.deadline_tolerance_minutes is not None \
+        else config._config.deadline_tolerance_minutes
+    return queued_at + timedelta(minutes=minutes)
+
+
+class DeadlinePolicy:
+    def __init__(self, predict_duration):
+        self._predict_duration = predict_duration
+        self._durations = {}
+
+    def duration(self, item):
+        if item.job_key not in self._durations:
+            self._durations[item.job_key] = self._predict_duration(item.job_key) or 0.0
+        return self._durations[item.job_key]
+
+    def _cost(self, item, start):
+        deadline = item.deadline or item.requested_at
+        return max(0.0, (deadline - start).total_seconds()) + self.duration(item)
+
+    def pick(self, items, start):
+        # items come in priority order, which breaks ties
+        return min(items, key=lambda item: self._cost(item, start))
+
+    def order(self, items, start):
+        # The order the queue would run in if nothing else were queued and
+        # every job took its predicted time; the same order pick() gives
+        by_deadline = []
+        early = []
+        late = []
+        for index, item in enumerate(items):
+            deadline = (item.deadline or item.requested_at).timestamp()
+            heapq.heappush(by_deadline, (deadline, index, item))
+            heapq.heappush(early, (deadline + self.duration(item), index, item))
+        clock = start.timestamp()
+        done = set()
+        ordered = []
+        while len(ordered) < len(items):
+            while by_deadline and by_deadline[0][0] <= clock:
+                _, index, item = heapq.heappop(by_deadline)
+                if index not in done:
+                    heapq.heappush(late, (self.duration(item), index, item))
+            while early and (early[0][1] in done or early[0][0] - self.duration(early[0][2]) <= clock):
+                heapq.heappop(early)
+            candidates = []
+            if late:
+                candidates.append(late[0][:2])
+            if early:
+                candidates.append((early[0][0] - clock, early[0][1]))
+            _, index = min(candidates)
+            heap = late if late and late[0][1] == index else early
+            item = heapq.heappop(heap)[2]
+            done.add(index)
+            ordered.append(item)
+            clock += self.duration(item)
+        return ordered
+
+
+_policy = None
+_policy_key = None
+
+
+def dispatch_policy():
+    # None for plain priority order. The policy is kept until a run records
+    # a new duration, so its predictions are reused between calls.
+    global _policy, _policy_key
+    if config._config is None or config._config.queue_policy != 'deadline':
+        return None
+    if _policy is None or _policy_key != job_stats.durations_version:
+        _policy = DeadlinePolicy(job_stats.predicted_duration)
+        _policy_key = job_stats.durations_version
+    return _policy
+
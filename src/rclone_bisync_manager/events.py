@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime
+
+from rclone_bisync_manager.logging_utils import log_error
+
+# Event types published by the daemon and pushed to SUBSCRIBE clients
+JOB_STARTED = "job_started"
+JOB_FINISHED = "job_finished"
+QUEUE_CHANGED = "queue_changed"
+CONFIG_CHANGED = "config_changed"
+CONFIG_RELOADED = "config_reloaded"
+SCHEDULE_CHANGED = "schedule_changed"
+SYNC_ERROR = "sync_error"
+DAEMON_STATE = "daemon_state"
+ADMISSION_CHANGED = "admission_changed"
+BREAKER_CHANGED = "breaker_changed"
+RUN_CANCELLED = "run_cancelled"
+REMOTE_PROBED = "remote_probed"
+
+
+class EventBus:
+    # Publishing is cheap when nobody listens: subscribers are plain
+    # callbacks, and the control server only hands events to its loop
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+        # Every published event is a state change, so the number of events
+        # so far doubles as the daemon's state version
+        self.version = 0
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [
+                c for c in self._subscribers if c is not callback]
+
+    def publish(self, event_type, **data):
+        with self._lock:
+            self.version += 1
+            version = self.version
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        event = {"event": event_type, "time": datetime.now().isoformat(),
+                 "version": version, "data": data}
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                log_error(f"Error delivering {event_type} event: {str(e)}")
+                self.unsubscribe(callback)
+
+
+event_bus = EventBus()
@@ -0,0 +1,147 @@
+import os
+import json
+import threading
+from datetime import datetime
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_error
+from rclone_bisync_manager import metrics
+
+# Resource usage and timing history per job, kept in job_stats.json in the
+# cache dir. The memory budget check predicts a job's peak RSS from the
+# highest of its recent peaks, so a single light run doesn't hide a heavy
+# listing; the deadline policy predicts a job's duration from the median of
+# its recent runs. Start lateness against the deadline is summed up per job.
+# The auto-tuner keeps its values and history here as well.
+
+JOB_STATS_FILE_NAME = 'job_stats.json'
+PEAK_RSS_HISTORY = 10
+DURATION_HISTORY = 10
+
+
+class JobStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._loaded_from = None
+        # Changes whenever the duration history may have, for the deadline
+        # policy's cached predictions
+        self.durations_version = 0
+
+    def stats_path(self):
+        return os.path.join(config.cache_dir, JOB_STATS_FILE_NAME)
+
+    def _ensure_loaded(self):
+        # Called for every job in a status report: compare the cache dir
+        # rather than build the path each time
+        if self._loaded_from == config.cache_dir:
+            return
+        path = self.stats_path()
+        self._stats = {}
+        self._loaded_from = config.cache_dir
+        self.durations_version += 1
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                self._stats = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"Error loading job stats from {path}: {str(e)}")
+
+    def _save(self):
+        path = self.stats_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._stats, f)
+        os.replace(tmp_path, path)
+        metrics.state_file_writes.inc(file='job_stats')
+
+    def record_run(self, job_key, usage):
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                stats = self._stats.setdefault(job_key, {"peak_rss_history": []})
+                if usage.get("peak_rss_bytes"):
+                    history = stats["peak_rss_history"]
+                    history.append(usage["peak_rss_bytes"])
+                    del history[:-PEAK_RSS_HISTORY]
+                stats["last_cpu_seconds"] = usage.get("cpu_seconds")
+                stats["updated"] = datetime.now().isoformat()
+                self._save()
+            except OSError as e:
+                log_error(f"Error saving job stats: {str(e)}")
+
+    def record_sync(self, job_key, duration, lateness=None):
+        # duration: None for runs that didn't complete, which would skew the
+        # prediction; lateness: seconds the run started after its deadline
+        # (negative if it started in time), None for runs without a deadline
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                stats = self._stats.setdefault(job_key, {"peak_rss_history": []})
+                if duration is not None:
+                    history = stats.setdefault("duration_history", [])
+                    history.append(round(duration, 3))
+                    del history[:-DURATION_HISTORY]
+                    self.durations_version += 1
+                if lateness is not None:
+                    summary = stats.setdefault("lateness", {"runs": 0, "late": 0, "total_seconds": 0.0,
+                                                            "max_seconds": 0.0})
+                    summary["runs"] += 1
+                    if lateness > 0:
+                        summary["late"] += 1
+                        summary["total_seconds"] = round(summary["total_seconds"] + lateness, 3)
+                        summary["max_seconds"] = round(max(summary["max_seconds"], lateness), 3)
+                    summary["last_seconds"] = round(lateness, 3)
+                self._save()
+            except OSError as e:
+                log_error(f"Error saving job stats: {str(e)}")
+
+    def predicted_duration(self, job_key):
+        with self._lock:
+            self._ensure_loaded()
+            history = sorted(self._stats.get(job_key, {}).get("duration_history") or [])
+        return history[len(history) // 2] if history else None
+
+    def lateness_status(self, job_key):
+        with self._lock:
+            self._ensure_loaded()
+            summary = dict(self._stats.get(job_key, {}).get("lateness") or {})
+        if not summary.get("runs"):
+            return None
+        summary["on_time_percent"] = round(
+            100 * (summary["runs"] - summary["late"]) / summary["runs"], 1)
+        summary["mean_seconds"] = round(
+            summary["total_seconds"] / summary["late"], 3) if summary["late"] else 0.0
+        return summary
+
+    def tuning(self, job_key):
+        with self._lock:
+            self._ensure_loaded()
+            tuning = self._stats.get(job_key, {}).get("tuning")
+            return dict(tuning) if tuning else None
+
+    def set_tuning(self, job_key, tuning):
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                self._stats.setdefault(job_key, {"peak_rss_history": []})["tuning"] = tuning
+                self._save()
+            except OSError as e:
+                log_error(f"Error saving job stats: {str(e)}")
+
+    def predicted_peak_rss(self, job_key):
+        # None for a job without recorded runs
+        with self._lock:
+            self._ensure_loaded()
+            history = self._stats.get(job_key, {}).get("peak_rss_history")
+            return max(history) if history else None
+
+    def memory_status(self, job_key):
+        with self._lock:
+            self._ensure_loaded()
+            history = self._stats.get(job_key, {}).get("peak_rss_history") or []
+        return {"last_peak_rss_bytes": history[-1] if history else None,
+                "predicted_peak_rss_bytes": max(history) if history else None}
+
+
+job_stats = JobStats()
@@ -0,0 +1,126 @@
+import os
+import gzip
+import shutil
+import sys
+import threading
+from datetime import datetime, timedelta
+
+ROTATED_SUFFIX_FORMAT = "%Y%m%d-%H%M%S"
+
+# Files that are still being written (by a running rclone process or the
+# compressor); retention must never delete these
+in_use_files = set()
+
+
+def should_rotate(size, started, settings):
+    if settings is None:
+        return False
+    if settings.max_size_mb and size >= settings.max_size_mb * 1024 * 1024:
+        return True
+    if settings.max_age_days and started is not None and size > 0:
+        return datetime.now() - started >= timedelta(days=settings.max_age_days)
+    return False
+
+
+def read_log_start_time(path):
+    # Log lines start with "%Y-%m-%d %H:%M:%S", so the first line tells us
+    # when the current segment was started
+    try:
+        with open(path, 'r') as f:
+            first_line = f.readline()
+        return datetime.strptime(first_line[:19], "%Y-%m-%d %H:%M:%S")
+    except (OSError, ValueError):
+        return None
+
+
+def rotate_file(path, compress=True, after_rotation=None):
+    rotated_path = f"{path}.{datetime.now().strftime(ROTATED_SUFFIX_FORMAT)}"
+    counter = 1
+    while os.path.exists(rotated_path) or os.path.exists(rotated_path + '.gz'):
+        rotated_path = f"{path}.{datetime.now().strftime(
+            ROTATED_SUFFIX_FORMAT)}-{counter}"
+        counter += 1
+    os.rename(path, rotated_path)
+
+    def finish():
+        if compress:
+            compress_file(rotated_path)
+        if after_rotation is not None:
+            after_rotation()
+
+    if compress:
+        # Keep retention away from the segment until it has been compressed
+        in_use_files.add(rotated_path)
+        threading.Thread(target=finish, name='log-compress',
+                         daemon=True).start()
+    else:
+        finish()
+    return rotated_path
+
+
+def compress_file(path):
+    # Write to a temporary name first so an interrupted compression never
+    # leaves a truncated archive next to a deleted original
+    tmp_path = path + '.gz.tmp'
+    try:
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.rename(tmp_path, path + '.gz')
+        os.remove(path)
+    except OSError as e:
+        print(f"ERROR: Failed to compress rotated log {
+              path}: {str(e)}", file=sys.stderr)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    finally:
+        in_use_files.discard(path)
+
+
+def list_rotated_files(log_file_path, run_logs_dir=None):
+    # Rotated manager log segments plus finished per-run rclone logs, which
+    # together make up the retention budget
+    files = []
+    log_dir = os.path.dirname(log_file_path)
+    prefix = os.path.basename(log_file_path) + '.'
+    try:
+        for entry in os.scandir(log_dir):
+            if entry.is_file() and entry.name.startswith(prefix) and not entry.name.endswith('.tmp'):
+                files.append(entry.path)
+    except OSError:
+        pass
+    if run_logs_dir:
+        for root, _, names in os.walk(run_logs_dir):
+            for name in names:
+                if name.endswith('.log'):
+                    files.append(os.path.join(root, name))
+    return files
+
+
+def enforce_retention(log_file_path, max_total_bytes, run_logs_dir=None, protected=()):
+    if not max_total_bytes:
+        return []
+
+    entries = []
+    for path in list_rotated_files(log_file_path, run_logs_dir):
+        if path in protected:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_total_bytes:
+            break
+        try:
+            os.remove(path)
+            removed.append(path)
+            total -= size
+        except OSError:
+            continue
+    return removed
@@ -1,8 +1,14 @@
 import os
 from datetime import datetime
 import sys
+import time
+import queue
+import atexit
+import threading
+from rclone_bisync_manager.log_rotation import should_rotate, read_log_start_time, rotate_file, enforce_retention, in_use_files
 
 config = None  # We'll set this later
+log_rotation = None  # LogRotationConfig, set once the configuration is loaded
 
 
 class BasicLogger:
@@ -29,15 +35,55 @@ def setup_loggers(console_log=False):
     config.console_log = console_log
 
 
+# Only the daemonizing fork re-initialises the logger. Other forks, such as
+# the rclone spawns with a preexec_fn, must stay a few system calls between
+# fork and exec, so there is no process-wide at-fork hook.
+def prepare_daemonize():
+    if isinstance(logger, FileLogger):
+        logger.before_daemonize()
+
+
+def restart_after_daemonize():
+    if isinstance(logger, FileLogger):
+        logger.after_daemonize()
+
+
 class FileLogger:
-    def __init__(self, file_path):
+    # Callers only enqueue a record; a single writer thread formats records
+    # and writes them in batches to one persistently open file handle, so the
+    # hot path never touches the file system and lines from different threads
+    # never interleave.
+    def __init__(self, file_path, flush_interval=1.0, max_queue_size=10000, max_batch_size=1000):
         self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.dropped_records = 0
+        self.written_records = 0
+        self.closed = False
+        self._start_writer()
+        atexit.register(self.close)
+
+    def _start_writer(self):
+        # Also runs in the daemonized child (restart_after_daemonize), where
+        # the writer thread no longer exists and inherited locks may be held
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._counter_lock = threading.Lock()
+        self._file = None
+        self._file_started = None
+        self._thread = threading.Thread(
+            target=self._writer, name='log-writer', daemon=True)
+        self._thread.start()
 
     def log(self, level, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} - {level} - {message}\n"
-        with open(self.file_path, 'a') as f:
-            f.write(log_entry)
+        if self.closed:
+            self._write_direct(level, message)
+            return
+        try:
+            self._queue.put_nowait((time.time(), level, message))
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped_records += 1
 
     def info(self, message):
         self.log("INFO", message)
@@ -45,6 +91,183 @@ class FileLogger:
     def error(self, message):
         self.log("ERROR", message)
 
+    def flush(self, timeout=5, close_file=False):
+        if self.closed or not self._thread.is_alive():
+            return
+        marker = _FlushMarker(close_file)
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return
+        marker.done.wait(timeout)
+
+    def before_daemonize(self):
+        # Don't let the child inherit an open handle: the daemonizing fork
+        # closes all descriptors and the number could later be reused
+        self.flush(close_file=True)
+
+    def after_daemonize(self):
+        # Without a fork (DaemonContext may not detach) the writer still runs
+        if not self._thread.is_alive():
+            self._start_writer()
+
+    def close(self, timeout=5):
+        if self.closed:
+            return
+        self.flush(timeout)
+        self.closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self.max_queue_size,
+            "dropped_records": self.dropped_records,
+            "written_records": self.written_records,
+        }
+
+    def _writer(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush_file()
+                last_flush = time.monotonic()
+                continue
+
+            records = []
+            markers = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _FlushMarker):
+                    markers.append(item)
+                else:
+                    records.append(item)
+                if stop or len(records) >= self.max_batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if records:
+                self._write_records(records)
+            if markers or stop or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush_file()
+                last_flush = time.monotonic()
+            if stop or any(marker.close_file for marker in markers):
+                self._close_file()
+            for marker in markers:
+                marker.done.set()
+            if stop:
+                return
+
+    def _open_file(self):
+        # The handle can be invalidated underneath us: the daemonizing fork
+        # closes inherited descriptors and the file may be moved away. Compare
+        # the open handle against the path and reopen if they differ.
+        if self._file is not None:
+            try:
+                open_id = os.fstat(self._file.fileno())
+                path_id = os.stat(self.file_path)
+                if (open_id.st_dev, open_id.st_ino) == (path_id.st_dev, path_id.st_ino):
+                    return self._file
+            except (OSError, ValueError):
+                pass
+            self._close_file()
+        self._file = open(self.file_path, 'a')
+        self._file_started = read_log_start_time(self.file_path)
+        return self._file
+
+    def _write_records(self, records):
+        text = "".join(_format_record(*record) for record in records)
+        try:
+            f = self._open_file()
+            f.write(text)
+        except OSError as e:
+            print(f"ERROR: Failed to write log file {
+                  self.file_path}: {str(e)}", file=sys.stderr)
+            self._file = None
+            with self._counter_lock:
+                self.dropped_records += len(records)
+            return
+        with self._counter_lock:
+            self.written_records += len(records)
+        if self._file_started is None:
+            self._file_started = datetime.fromtimestamp(records[0][0])
+        self._maybe_rotate()
+
+    def _maybe_rotate(self):
+        settings = log_rotation
+        try:
+            size = self._file.tell()
+        except (OSError, ValueError):
+            return
+        if not should_rotate(size, self._file_started, settings):
+            return
+        self._flush_file()
+        self._close_file()
+        try:
+            rotate_file(self.file_path, settings.compress,
+                        after_rotation=lambda: enforce_retention(
+                            self.file_path, settings.retention_mb * 1024 * 1024,
+                            os.path.join(os.path.dirname(self.file_path), 'runs'), protected=in_use_files))
+        except OSError as e:
+            print(f"ERROR: Failed to rotate log file {
+                  self.file_path}: {str(e)}", file=sys.stderr)
+
+    def _flush_file(self):
+        if self._file is not None:
+            try:
+                self._file.flush()
+            except (OSError, ValueError):
+                self._file = None
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _write_direct(self, level, message):
+        with open(self.file_path, 'a') as f:
+            f.write(_format_record(time.time(), level, message))
+
+
+_STOP = object()
+
+
+class _FlushMarker:
+    def __init__(self, close_file=False):
+        self.close_file = close_file
+        self.done = threading.Event()
+
+
+def _format_record(timestamp, level, message):
+    formatted_time = datetime.fromtimestamp(
+        timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{formatted_time} - {level} - {message}\n"
+
+
+def get_logger_stats():
+    if isinstance(logger, FileLogger):
+        return logger.stats()
+    return None
+
+
+def shutdown_logging():
+    if isinstance(logger, FileLogger):
+        logger.close()
+
 
 def log_message(message):
     logger.info(message)
@@ -94,6 +317,11 @@ def log_status_server_error(e):
     log_error(f"Error in status server: {str(e)}")
 
 
+def set_log_rotation(settings):
+    global log_rotation
+    log_rotation = settings
+
+
 def set_config(cfg):
     global config
     config = cfg
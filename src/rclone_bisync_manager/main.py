@@ -9,12 +9,12 @@ from rclone_bisync_manager.cli import parse_args
 from rclone_bisync_manager.daemon_functions import daemon_main, stop_daemon, print_daemon_status
 from rclone_bisync_manager.sync import perform_sync_operations
 from rclone_bisync_manager.utils import check_tools, ensure_rclone_dir, handle_filter_changes, check_and_create_lock_file
-from rclone_bisync_manager.logging_utils import log_message, log_error, ensure_log_file_path, setup_loggers, log_config_file_location, set_config
+from rclone_bisync_manager.logging_utils import log_message, log_error, ensure_log_file_path, setup_loggers, log_config_file_location, set_config, prepare_daemonize, restart_after_daemonize
 from rclone_bisync_manager.config import config, signal_handler
+from rclone_bisync_manager.run_logs import run_log_index, read_run_log
+from rclone_bisync_manager.control_protocol import SOCKET_PATH, ControlClient, ControlError, send_command
 import fcntl
 import traceback
-import socket
-import json
 
 
 def main():
@@ -65,6 +65,7 @@ def main():
 
                 print("Starting daemon process...")
                 log_message("Starting daemon in limbo state...")
+                prepare_daemonize()
                 with daemon.DaemonContext(
                     working_directory='/',
                     umask=0o002,
@@ -75,6 +76,7 @@ def main():
                     stdout=sys.stdout,
                     stderr=sys.stderr
                 ):
+                    restart_after_daemonize()
                     config.args = args
                     print("Daemon process started. Calling daemon_main()...")
                     daemon_main()
@@ -87,28 +89,25 @@ def main():
         elif args.action == 'stop':
             stop_daemon()
         elif args.action == 'status':
-            print_daemon_status()
+            query = {name: value for name, value in (("fields", args.fields), ("jobs", args.status_jobs),
+                                                     ("job_fields", args.job_fields), ("offset", args.offset),
+                                                     ("limit", args.limit)) if value is not None}
+            print_daemon_status(
+                watch=args.watch, query=query, snapshot=args.snapshot)
         elif args.action == 'reload':
-            socket_path = '/tmp/rclone_bisync_manager_status.sock'
-            if not os.path.exists(socket_path):
+            if not os.path.exists(SOCKET_PATH):
                 print("Daemon is not running.")
                 return
 
             try:
-                client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-                client.connect(socket_path)
-                client.sendall(b"RELOAD")
-                chunks = []
-                while True:
-                    chunk = client.recv(4096)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                response = b''.join(chunks).decode()
-                client.close()
-                print(response)
+                result = send_command("RELOAD", timeout=60)
+                print(result["message"])
+            except ControlError as e:
+                print(str(e))
             except Exception as e:
                 print(f"Error reloading daemon configuration: {e}")
+        elif args.action == 'profile':
+            profile_daemon(args)
     elif args.command == 'sync':
         if os.path.exists(config.LOCK_FILE_PATH):
             print(
@@ -147,28 +146,135 @@ def main():
             lock_fd.close()
             os.unlink(config.LOCK_FILE_PATH)
     elif args.command == 'add-sync':
-        add_sync_jobs(args.sync_jobs)
+        add_sync_jobs(args)
+    elif args.command == 'cancel':
+        cancel_sync_job(args)
+    elif args.command == 'logs':
+        show_run_logs(args)
 
 
-def add_sync_jobs(sync_jobs):
-    socket_path = '/tmp/rclone_bisync_manager_add_sync.sock'
-    if not os.path.exists(socket_path):
+def show_run_logs(args):
+    # Reads the run index straight from disk, so it also works while the
+    # daemon is not running
+    if args.list:
+        runs = run_log_index.runs(args.job)
+        if not runs:
+            print(f"No runs recorded for job '{args.job}'.")
+        for record in runs:
+            print(f"{record.run_id}  {record.status or 'RUNNING':<9}  exit={record.exit_code}  {
+                  record.started}  {record.segment}:{record.start_offset}-{record.end_offset}")
+        return
+
+    if args.run_id:
+        record = run_log_index.find_run(args.job, run_id=args.run_id)
+    else:
+        record = run_log_index.find_run(args.job, failed_only=args.failed)
+    if record is None:
+        print(f"No matching run found for job '{args.job}'.")
+        sys.exit(1)
+
+    print(f"Run {record.run_id} ({record.operation}) started {record.started}, finished {
+          record.finished}, status {record.status}, exit code {record.exit_code}")
+    log_text = read_run_log(record)
+    if log_text is None:
+        print("Log segment is no longer available (removed by log retention).")
+    else:
+        print(log_text, end='')
+
+
+def add_sync_jobs(args):
+    if not os.path.exists(SOCKET_PATH):
+        print("Error: Daemon is not running.")
+        return
+
+    request = {"jobs": args.sync_jobs, "force_bisync": args.force_bisync,
+               "resync": args.resync, "priority": args.priority}
+    try:
+        with ControlClient() as client:
+            if not args.wait:
+                print_add_sync_results(client.request(
+                    "ADD_SYNC", **request)["results"])
+                return
+
+            waiting = set()
+            try:
+                for message in client.stream("ADD_SYNC", end_event="batch_finished", timeout=args.timeout,
+                                             wait=True, **request):
+                    if "result" in message:
+                        print_add_sync_results(message["result"]["results"])
+                        waiting = set(message["result"]["waiting"])
+                    elif message["event"] == "job_finished":
+                        job = message["data"]
+                        waiting.discard(job["job"])
+                        print(f"{job['job']}: {job['result']} (exit code {
+                              job['exit_code']})", flush=True)
+                    elif message["event"] == "batch_finished":
+                        if not message["data"]["succeeded"]:
+                            sys.exit(1)
+            except TimeoutError:
+                print(f"Stopped waiting after {args.timeout}s, still pending: {
+                      ', '.join(sorted(waiting)) or 'none'}")
+                sys.exit(1)
+    except (ControlError, OSError) as e:
+        print(f"Error communicating with daemon: {str(e)}")
+        sys.exit(1)
+
+
+def cancel_sync_job(args):
+    if not os.path.exists(SOCKET_PATH):
         print("Error: Daemon is not running.")
         return
+    try:
+        print(send_command("CANCEL", job_key=args.job)["message"])
+    except (ControlError, OSError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+def profile_daemon(args):
+    if not os.path.exists(SOCKET_PATH):
+        print("Daemon is not running.")
+        return
 
+    action = args.profile_action or 'status'
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect(socket_path)
-        client.sendall(json.dumps(sync_jobs).encode())
-        response = client.recv(1024).decode()
-        client.close()
-
-        if response == "OK":
-            print(f"Successfully added sync job(s): {', '.join(sync_jobs)}")
+        if action == 'memsnapshot' or action == 'memsnapshot-stop':
+            result = send_command("MEMSNAPSHOT", timeout=120,
+                                  action='stop' if action == 'memsnapshot-stop' else 'snapshot', limit=args.top)
         else:
-            print(f"Error adding sync job(s): {response}")
+            result = send_command("PROFILE", timeout=60, action=action,
+                                  interval=args.interval / 1000)
+    except ControlError as e:
+        print(str(e))
+        sys.exit(1)
     except Exception as e:
-        print(f"Error communicating with daemon: {str(e)}")
+        print(f"Error communicating with daemon: {e}")
+        sys.exit(1)
+
+    if "message" in result:
+        print(result["message"])
+    if "top_functions" in result:
+        print(f"{result['samples']} samples over {result['duration']}s written to {result['file']}")
+        print(f"{'self':>7} {'total':>7}  function")
+        for entry in result["top_functions"][:args.top]:
+            print(f"{entry['self']:>7} {entry['total']:>7}  {entry['function']}")
+    elif "top_diffs" in result:
+        print(f"Traced memory {result['traced_bytes'] / 1024:.0f} KiB (peak {
+              result['peak_bytes'] / 1024:.0f} KiB), snapshot written to {result['file']}")
+        for entry in result["top_diffs"]:
+            print(f"{entry['size_diff'] / 1024:>+10.1f} KiB {entry['count_diff']:>+8} blocks  {entry['location']}")
+    elif "running" in result:
+        print(f"Profiler running since {result['since']}, {result['samples']} samples" if result["running"]
+              else "Profiler is not running.")
+
+
+def print_add_sync_results(results):
+    for result in results:
+        if result["queued"]:
+            print(result["message"])
+        else:
+            print(f"Error adding sync job {
+                  result['job_key']}: {result['message']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+import os
+import math
+import asyncio
+import threading
+
+import psutil
+
+# Prometheus text exposition (version 0.0.4) without the client library.
+# Metrics are updated where things happen; a scrape only formats the stored
+# values plus a few gauges that are read on demand.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600, 7200)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+WAIT_BUCKETS = (0.1, 1, 5, 15, 30, 60, 300, 900, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=(), function=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        # Unlabelled metrics can be read on demand at scrape time instead
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        if self.function is not None:
+            return [f'{self.name} {_format_value(self.function())}']
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in items]
+
+    def render(self):
+        return self.header() + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count))
+                     for key, (counts, total, count) in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, [("le", _format_value(bound))])} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return ('\n'.join(lines) + '\n').encode()
+
+
+registry = Registry()
+_process = None
+
+
+def _current_process():
+    # The daemon forks after import, so don't hold on to the parent's pid
+    global _process
+    if _process is None or _process.pid != os.getpid():
+        _process = psutil.Process()
+    return _process
+
+
+job_run_duration = registry.register(Histogram(
+    'rclone_bisync_manager_job_run_duration_seconds', 'Duration of rclone runs per job and operation.',
+    labels=('job', 'operation')))
+preflight_duration = registry.register(Histogram(
+    'rclone_bisync_manager_preflight_duration_seconds', 'Duration of the RCLONE_TEST checks before a sync.',
+    labels=('job',), buckets=LATENCY_BUCKETS))
+queue_wait = registry.register(Histogram(
+    'rclone_bisync_manager_queue_wait_seconds', 'Time from the scheduled (or requested) start until the job was dequeued.',
+    labels=('job',), buckets=WAIT_BUCKETS))
+deadline_misses = registry.register(Counter(
+    'rclone_bisync_manager_deadline_misses_total', 'Scheduled runs that started after their deadline.',
+    labels=('job',)))
+rclone_exit_codes = registry.register(Counter(
+    'rclone_bisync_manager_rclone_exit_codes_total', 'rclone runs by exit code.',
+    labels=('job', 'operation', 'code')))
+bytes_transferred = registry.register(Counter(
+    'rclone_bisync_manager_bytes_transferred_total', 'Bytes transferred by rclone, as reported in its final stats.',
+    labels=('job',)))
+state_file_writes = registry.register(Counter(
+    'rclone_bisync_manager_state_file_writes_total', 'Writes of persistent state files.',
+    labels=('file',)))
+jobs_running = registry.register(Gauge(
+    'rclone_bisync_manager_jobs_running', 'Sync jobs currently running.'))
+jobs_queued = registry.register(Gauge(
+    'rclone_bisync_manager_jobs_queued', 'Sync jobs waiting in the queue.'))
+registry.register(Gauge(
+    'rclone_bisync_manager_process_resident_memory_bytes', 'Resident memory of the daemon process.',
+    function=lambda: _current_process().memory_info().rss))
+registry.register(Counter(
+    'rclone_bisync_manager_process_cpu_seconds_total', 'User and system CPU time of the daemon process.',
+    function=lambda: sum(_current_process().cpu_times()[:2])))
+
+
+async def handle_metrics_request(reader, writer):
+    # Just enough HTTP/1.1 for a Prometheus scrape: one GET per connection
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while await asyncio.wait_for(reader.readline(), 5) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] in ('GET', 'HEAD') and parts[1].split('?')[0] in ('/', '/metrics'):
+            status, content_type, body = '200 OK', CONTENT_TYPE, registry.render()
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain', b'Not Found\n'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode())
+        if parts and parts[0] != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(settings):
+    if settings.unix_socket:
+        if os.path.exists(settings.unix_socket):
+            os.unlink(settings.unix_socket)
+        return await asyncio.start_unix_server(handle_metrics_request, path=settings.unix_socket)
+    return await asyncio.start_server(handle_metrics_request, host=settings.listen_address, port=settings.port)
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message
+
+# Profiling hooks for a live daemon, driven by the PROFILE and MEMSNAPSHOT
+# control commands. The CPU profiler samples the stacks of all threads with
+# sys._current_frames(), so unlike cProfile it sees the daemon loop, the sync
+# and the control server alike and costs nothing while it is stopped. Stacks
+# are written in the folded format that flamegraph.pl and speedscope read.
+
+DEFAULT_SAMPLE_INTERVAL = 0.01
+TRACEMALLOC_FRAMES = 10
+
+
+def get_profiles_dir():
+    return os.path.join(os.path.dirname(config._config.log_file_path), 'profiles')
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._stacks = Counter()
+        self._samples = 0
+        self._started = None
+        self.interval = DEFAULT_SAMPLE_INTERVAL
+
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        if self.running():
+            raise ValueError("Profiler is already running")
+        self.interval = interval
+        self._stacks = Counter()
+        self._samples = 0
+        self._started = time.time()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        log_message(f"Sampling profiler started ({interval * 1000:g} ms interval)")
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop_event.wait(self.interval):
+            if len(thread_names) != threading.active_count():
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self._stacks[';'.join(reversed(stack))] += 1
+            self._samples += 1
+
+    def stop(self):
+        if not self.running():
+            raise ValueError("Profiler is not running")
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        duration = time.time() - self._started
+
+        profiles_dir = get_profiles_dir()
+        os.makedirs(profiles_dir, exist_ok=True)
+        path = os.path.join(
+            profiles_dir, f"cpu-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, 'w') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log_message(f"Sampling profiler stopped, stacks written to {path}")
+        return {"file": path, "duration": round(duration, 3), "samples": self._samples,
+                "top_functions": self.top_functions()}
+
+    def top_functions(self, limit=20):
+        # Samples in which a function was executing (self) or on the stack
+        own = Counter()
+        total = Counter()
+        for stack, count in self._stacks.items():
+            frames = stack.split(';')[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [{"function": name, "self": count, "total": total[name]}
+                for name, count in own.most_common(limit)]
+
+    def status(self):
+        return {"running": self.running(), "samples": self._samples,
+                "interval": self.interval,
+                "since": datetime.fromtimestamp(self._started).isoformat() if self.running() else None}
+
+
+class MemorySnapshots:
+    def __init__(self):
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def take(self, limit=20):
+        # The first call only starts tracemalloc; allocations are traced from
+        # then on and every later call reports the growth since the last one
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._previous = self._snapshot()
+                log_message("tracemalloc started")
+                return {"started": True, "message": "Allocation tracing started; take another snapshot to see the growth"}
+
+            snapshot = self._snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            diffs = snapshot.compare_to(self._previous, 'lineno')
+            self._previous = snapshot
+
+            profiles_dir = get_profiles_dir()
+            os.makedirs(profiles_dir, exist_ok=True)
+            path = os.path.join(
+                profiles_dir, f"memory-{datetime.now().strftime('%Y%m%d-%H%M%S')}.tracemalloc")
+            snapshot.dump(path)
+            return {"started": False, "file": path, "traced_bytes": current, "peak_bytes": peak,
+                    "top_diffs": [{"location": str(diff.traceback[0]), "size_diff": diff.size_diff,
+                                   "size": diff.size, "count_diff": diff.count_diff}
+                                  for diff in diffs[:limit]]}
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def stop(self):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise ValueError("tracemalloc is not running")
+            tracemalloc.stop()
+            self._previous = None
+            log_message("tracemalloc stopped")
+
+
+sampling_profiler = SamplingProfiler()
+memory_snapshots = MemorySnapshots()
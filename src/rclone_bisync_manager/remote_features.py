@@ -0,0 +1,152 @@
+import os
+import json
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.events import event_bus, REMOTE_PROBED
+from rclone_bisync_manager import metrics
+
+# Capabilities of each rclone remote, from `rclone backend features`, cached
+# in remote_features.json in the cache dir for remote_features_ttl_hours.
+# A remote is probed before the first run on it once its pre-flight check
+# passed. The rclone options that come from the global and operation
+# sections are then adjusted to the remote:
+#   - compare drops checksum if the remote has no hash (the local side can
+#     compute any hash), and modtime if the remote can't store one
+#   - --fast-list is added where the remote supports ListR, which saves
+#     listing calls, and dropped where it doesn't
+# Options set in the job's own rclone_options are never changed.
+# Off by default (tune_remote_options).
+
+FEATURES_FILE_NAME = 'remote_features.json'
+PROBE_TIMEOUT = 60
+# rclone's fs.ModTimeNotSupported precision (100 years in ns)
+MODTIME_NOT_SUPPORTED = 3153600000000000000
+
+
+class RemoteFeatures:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._features = {}
+        self._loaded_from = None
+
+    def features_path(self):
+        return os.path.join(config.cache_dir, FEATURES_FILE_NAME)
+
+    def _ensure_loaded(self):
+        path = self.features_path()
+        if self._loaded_from == path:
+            return
+        self._features = {}
+        self._loaded_from = path
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as f:
+                self._features = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"Error loading remote features from {path}: {str(e)}")
+
+    def _save(self):
+        path = self.features_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._features, f, indent=2)
+        os.replace(tmp_path, path)
+        metrics.state_file_writes.inc(file='remote_features')
+
+    def cached(self, remote):
+        # Features of the remote if they were probed within the TTL
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._features.get(remote)
+        if entry is None:
+            return None
+        ttl = timedelta(hours=config._config.remote_features_ttl_hours)
+        if datetime.now() - datetime.fromisoformat(entry["probed_at"]) >= ttl:
+            return None
+        return entry
+
+    def ensure(self, remote):
+        if not config._config.tune_remote_options:
+            return None
+        return self.cached(remote) or self.probe(remote)
+
+    def probe(self, remote):
+        entry = {"probed_at": datetime.now().isoformat()}
+        try:
+            result = subprocess.run(['rclone', 'backend', 'features', f"{remote}:"],
+                                    capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+            if result.returncode != 0:
+                raise ValueError(result.stderr.strip().splitlines()[-1] if result.stderr.strip()
+                                 else f"exit code {result.returncode}")
+            info = json.loads(result.stdout)
+            features = info.get("Features") or {}
+            entry.update({
+                "backend": info.get("Name"),
+                "hashes": info.get("Hashes") or [],
+                "modtime": info.get("Precision", MODTIME_NOT_SUPPORTED) < MODTIME_NOT_SUPPORTED,
+                "list_r": bool(features.get("ListR")),
+                "change_notify": bool(features.get("ChangeNotify")),
+            })
+            log_message(f"Probed remote '{remote}': hashes {', '.join(entry['hashes']) or 'none'}, "
+                        f"ListR {entry['list_r']}, ChangeNotify {entry['change_notify']}")
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            # Cached as well, so a remote that can't be probed isn't probed
+            # before every run; its options are used as configured
+            entry["error"] = str(e)
+            log_error(f"Probing the features of remote '{remote}' failed: {str(e)}")
+
+        with self._lock:
+            self._ensure_loaded()
+            self._features[remote] = entry
+            try:
+                self._save()
+            except OSError as e:
+                log_error(f"Error saving remote features: {str(e)}")
+        event_bus.publish(REMOTE_PROBED, remote=remote)
+        return entry
+
+    def tune(self, remote, options, job_options):
+        # Returns the options adjusted to the remote and the plan: what was
+        # chosen and why
+        plan = {"remote": remote, "features": None, "compare": options.get("compare"),
+                "fast_list": "fast_list" in options and options["fast_list"] is not False,
+                "adjusted": []}
+        if not config._config.tune_remote_options:
+            return options, plan
+        features = self.cached(remote)
+        plan["features"] = features
+        if features is None or "error" in features:
+            return options, plan
+
+        options = dict(options)
+        if "compare" in options and "compare" not in job_options:
+            wanted = [c.strip() for c in str(options["compare"]).split(',') if c.strip()]
+            missing = {}
+            if not features["hashes"]:
+                missing["checksum"] = "no hash"
+            if not features["modtime"]:
+                missing["modtime"] = "no modtime"
+            supported = [c for c in wanted if c not in missing] or ["size"]
+            if supported != wanted:
+                options["compare"] = ','.join(supported)
+                reasons = ', '.join(missing[c] for c in wanted if c in missing)
+                plan["adjusted"].append(
+                    f"compare {','.join(wanted)} -> {options['compare']} (remote has {reasons})")
+        if "fast_list" not in job_options:
+            if features["list_r"] and "fast_list" not in options:
+                options["fast_list"] = None
+                plan["adjusted"].append("--fast-list added (remote supports ListR)")
+            elif not features["list_r"] and "fast_list" in options:
+                del options["fast_list"]
+                plan["adjusted"].append("--fast-list dropped (remote has no ListR)")
+
+        plan["compare"] = options.get("compare")
+        plan["fast_list"] = "fast_list" in options and options["fast_list"] is not False
+        return options, plan
+
+
+remote_features = RemoteFeatures()
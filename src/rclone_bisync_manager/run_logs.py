@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from typing import Optional
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.log_rotation import enforce_retention, in_use_files
+from rclone_bisync_manager.logging_utils import log_error
+from rclone_bisync_manager import metrics
+
+RUN_LOGS_DIRNAME = 'runs'
+INDEX_FILE_NAME = 'index.jsonl'
+MAX_RUNS_PER_JOB = 200
+# The index is appended to; it is rewritten once this many of its lines
+# belong to runs that no longer fit in a job's history
+COMPACT_AFTER_STALE_LINES = 1000
+# Retention walks the whole runs dir, so it is not run after every run but
+# once finished runs have added this share of the budget, or after a while
+RETENTION_SLACK = 0.05
+RETENTION_INTERVAL = timedelta(hours=1)
+
+
+@dataclass
+class RunRecord:
+    job: str
+    run_id: str
+    operation: str
+    segment: str
+    start_offset: int
+    started: str
+    end_offset: Optional[int] = None
+    finished: Optional[str] = None
+    exit_code: Optional[int] = None
+    status: Optional[str] = None
+    extra: dict = field(default_factory=dict)
+
+
+def get_run_logs_dir():
+    return os.path.join(os.path.dirname(config._config.log_file_path), RUN_LOGS_DIRNAME)
+
+
+def _job_dir(job_key):
+    return os.path.join(get_run_logs_dir(), re.sub(r'[^A-Za-z0-9._-]', '_', job_key))
+
+
+def _current_segment(job_key):
+    # Runs of a job are appended to the job's newest segment; once that
+    # reaches the rotation size a new segment is started. Segments are never
+    # renamed, so the offsets recorded in the index stay valid until the
+    # segment is removed by retention.
+    job_dir = _job_dir(job_key)
+    os.makedirs(job_dir, exist_ok=True)
+    segments = sorted(name for name in os.listdir(job_dir)
+                      if name.endswith('.log'))
+    if segments:
+        latest = os.path.join(job_dir, segments[-1])
+        max_size = config._config.log_rotation.max_size_mb * 1024 * 1024
+        if os.path.getsize(latest) < max_size:
+            return latest
+    return os.path.join(job_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.log")
+
+
+class RunLogIndex:
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+        self._loaded_from = None
+        self._stale_lines = 0
+        self._retention_checked = None
+        self._written_since_retention = 0
+
+    def index_path(self):
+        return os.path.join(get_run_logs_dir(), INDEX_FILE_NAME)
+
+    def _ensure_loaded(self):
+        path = self.index_path()
+        if self._loaded_from == path:
+            return
+        self._runs = {}
+        self._loaded_from = path
+        self._stale_lines = 0
+        if not os.path.exists(path):
+            return
+
+        dropped = 0
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = RunRecord(**json.loads(line))
+                except (ValueError, TypeError):
+                    dropped += 1
+                    continue
+                runs = self._runs.setdefault(
+                    record.job, deque(maxlen=MAX_RUNS_PER_JOB))
+                if len(runs) == runs.maxlen:
+                    dropped += 1
+                runs.append(record)
+        if dropped:
+            self._rewrite()
+
+    def _rewrite(self):
+        path = self.index_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for runs in self._runs.values():
+                for record in runs:
+                    f.write(json.dumps(asdict(record)) + "\n")
+        os.replace(tmp_path, path)
+        self._stale_lines = 0
+
+    def start_run(self, job_key, operation):
+        segment = _current_segment(job_key)
+        start_offset = os.path.getsize(
+            segment) if os.path.exists(segment) else 0
+        now = datetime.now()
+        record = RunRecord(job=job_key,
+                           run_id=f"{now.strftime('%Y%m%d-%H%M%S-%f')}-{operation}",
+                           operation=operation,
+                           segment=segment,
+                           start_offset=start_offset,
+                           started=now.isoformat())
+        in_use_files.add(segment)
+        return record
+
+    def finish_run(self, record, exit_code, status):
+        in_use_files.discard(record.segment)
+        record.end_offset = os.path.getsize(
+            record.segment) if os.path.exists(record.segment) else record.start_offset
+        record.finished = datetime.now().isoformat()
+        record.exit_code = exit_code
+        record.status = status
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                runs = self._runs.setdefault(record.job, deque(
+                    maxlen=MAX_RUNS_PER_JOB))
+                if len(runs) == runs.maxlen:
+                    self._stale_lines += 1
+                runs.append(record)
+                if self._stale_lines >= COMPACT_AFTER_STALE_LINES:
+                    self._rewrite()
+                else:
+                    with open(self.index_path(), 'a') as f:
+                        f.write(json.dumps(asdict(record)) + "\n")
+                metrics.state_file_writes.inc(file='run_index')
+            except OSError as e:
+                log_error(f"Error writing run log index: {str(e)}")
+        self._maybe_enforce_retention(record.end_offset - record.start_offset)
+
+    def _maybe_enforce_retention(self, written):
+        with self._lock:
+            self._written_since_retention += written
+            now = datetime.now()
+            slack = config._config.log_rotation.retention_mb * 1024 * 1024 * RETENTION_SLACK
+            if self._retention_checked is not None and now - self._retention_checked < RETENTION_INTERVAL \
+                    and self._written_since_retention < slack:
+                return
+            self._retention_checked = now
+            self._written_since_retention = 0
+        enforce_log_retention()
+
+    def runs(self, job_key):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._runs.get(job_key, ()))
+
+    def find_run(self, job_key, run_id=None, failed_only=False):
+        for record in reversed(self.runs(job_key)):
+            if run_id is not None and record.run_id != run_id:
+                continue
+            if failed_only and record.status != "FAILED":
+                continue
+            return record
+        return None
+
+
+def read_run_log(record, max_bytes=1024 * 1024):
+    # One seek into the job's segment instead of scanning a shared log
+    if not os.path.exists(record.segment):
+        return None
+    end_offset = record.end_offset if record.end_offset is not None else os.path.getsize(
+        record.segment)
+    start_offset = max(record.start_offset, end_offset - max_bytes)
+    with open(record.segment, 'rb') as f:
+        f.seek(start_offset)
+        return f.read(end_offset - start_offset).decode(errors='replace')
+
+
+def enforce_log_retention():
+    settings = config._config.log_rotation
+    return enforce_retention(config._config.log_file_path, settings.retention_mb * 1024 * 1024,
+                             get_run_logs_dir(), protected=in_use_files)
+
+
+run_log_index = RunLogIndex()
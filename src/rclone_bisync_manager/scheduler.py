@@ -1,5 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import heapq
+import random
 from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 from croniter import croniter
@@ -10,12 +11,34 @@ from rclone_bisync_manager.config import config, sync_state
 class SyncTask:
     scheduled_time: datetime
     path_key: str = field(compare=False)
+    # 1 for a regular run, higher for retries of a failed run
+    attempt: int = field(default=1, compare=False)
+
+
+@dataclass
+class QueuedSync:
+    job_key: str
+    force_bisync: bool = False
+    resync: bool = False
+    priority: int = 0
+    requested_at: datetime = field(default_factory=datetime.now)
+    # Set for scheduled runs; queue wait is measured from here
+    scheduled_time: Optional[datetime] = None
+    # Requested by the user; not subject to admission control
+    manual: bool = False
+    # Scheduled runs should start by then; see deadlines.py
+    deadline: Optional[datetime] = None
+    deferred_since: Optional[datetime] = None
+    deferral_reason: Optional[str] = None
+    attempt: int = 1
 
 
 class SyncScheduler:
     def __init__(self):
         self.tasks: List[SyncTask] = []
         self.task_map: Dict[str, SyncTask] = {}
+        # Job key -> retry state of its last failed run
+        self.retries: Dict[str, dict] = {}
 
     def schedule_tasks(self):
         self.check_missed_jobs()
@@ -43,10 +66,10 @@ class SyncScheduler:
                         self.schedule_task(key, next_run)
                         next_run = cron_obj.get_next(datetime)
 
-    def schedule_task(self, path_key: str, scheduled_time: datetime):
+    def schedule_task(self, path_key: str, scheduled_time: datetime, attempt: int = 1):
         if path_key in self.task_map:
             self.remove_task(path_key)
-        task = SyncTask(scheduled_time, path_key)
+        task = SyncTask(scheduled_time, path_key, attempt)
         heapq.heappush(self.tasks, task)
         self.task_map[path_key] = task
         sync_state.update_job_state(path_key, next_run=scheduled_time)
@@ -58,6 +81,47 @@ class SyncScheduler:
             self.tasks.remove(task)
             heapq.heapify(self.tasks)
 
+    def schedule_retry(self, path_key: str, attempt: int, exit_code: int) -> Optional[datetime]:
+        # A retry takes the place of the job's next scheduled run, with
+        # exponential backoff and jitter (half to all of the delay); it is
+        # dropped when the job is out of attempts or the next scheduled run
+        # would come first anyway. Returns when the retry runs.
+        settings = config._config.retry
+        job = config._config.sync_jobs[path_key]
+        max_attempts = job.max_attempts if job.max_attempts is not None else settings.max_attempts
+        state = {"attempt": attempt, "max_attempts": max_attempts,
+                 "exit_code": exit_code, "next_retry": None}
+        self.retries[path_key] = state
+        if attempt >= max_attempts:
+            return None
+
+        delay = min(settings.initial_delay_seconds * 2 ** (attempt - 1),
+                    settings.max_delay_minutes * 60)
+        retry_time = datetime.now() + timedelta(seconds=random.uniform(delay / 2, delay))
+        next_task = self.task_map.get(path_key)
+        if next_task is not None and next_task.scheduled_time <= retry_time:
+            return None
+        self.schedule_task(path_key, retry_time, attempt + 1)
+        state["next_retry"] = retry_time
+        return retry_time
+
+    def clear_retry(self, path_key: str) -> bool:
+        # After a successful or non-retryable run; a pending retry goes back
+        # to the regular schedule
+        if self.retries.pop(path_key, None) is None:
+            return False
+        task = self.task_map.get(path_key)
+        job = config._config.sync_jobs.get(path_key)
+        if task is not None and task.attempt > 1 and job is not None:
+            self.schedule_task(path_key, croniter(job.schedule, datetime.now()).get_next(datetime))
+        return True
+
+    def retry_status(self, path_key: str) -> Optional[dict]:
+        state = self.retries.get(path_key)
+        if state is None:
+            return None
+        return dict(state, next_retry=state["next_retry"].isoformat() if state["next_retry"] else None)
+
     def get_next_task(self) -> Optional[SyncTask]:
         return self.tasks[0] if self.tasks else None
 
@@ -71,6 +135,7 @@ class SyncScheduler:
     def clear_tasks(self):
         self.tasks.clear()
         self.task_map.clear()
+        self.retries.clear()
 
     def get_all_tasks(self) -> List[SyncTask]:
         return sorted(self.tasks)
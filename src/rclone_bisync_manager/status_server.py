@@ -1,112 +1,803 @@
 import os
-import socket
 import json
-import threading
+import asyncio
 from pathlib import Path
 
 from pydantic import BaseModel
 from rclone_bisync_manager.config import config, sync_state, get_config_schema
+from rclone_bisync_manager.run_logs import run_log_index, read_run_log
+from rclone_bisync_manager.events import event_bus, CONFIG_RELOADED, DAEMON_STATE, JOB_FINISHED
+from rclone_bisync_manager.scheduler import QueuedSync, scheduler
+from rclone_bisync_manager.status_snapshot import StatusFileWriter
+from rclone_bisync_manager import metrics
+from rclone_bisync_manager.tracing import tracer
+from rclone_bisync_manager.admission import admission
+from rclone_bisync_manager.circuit_breaker import circuit_breakers
+from rclone_bisync_manager.watchdog import run_watchdog
+from rclone_bisync_manager.sync import get_job_plan
+from rclone_bisync_manager.autotune import autotuner
+from rclone_bisync_manager.job_stats import job_stats
+from rclone_bisync_manager.deadlines import dispatch_policy
+from rclone_bisync_manager.sync_queue import describe_items
+from rclone_bisync_manager.profiling import sampling_profiler, memory_snapshots, DEFAULT_SAMPLE_INTERVAL
+from rclone_bisync_manager.control_protocol import SOCKET_PATH, FRAME_HEADER, MAX_FRAME_SIZE, encode_frame, is_legacy_request
+from dataclasses import asdict
 from typing import Any
 from datetime import datetime, date
 
-from rclone_bisync_manager.logging_utils import log_error
+from rclone_bisync_manager.logging_utils import log_error, get_logger_stats
 from rclone_bisync_manager.logging_utils import log_message
 
 
+class CommandError(Exception):
+    pass
+
+
+# Events after which subscribers receive a complete status instead of a delta
+FULL_SNAPSHOT_EVENTS = {CONFIG_RELOADED, "snapshot"}
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Shorthands accepted in a STATUS projection
+FIELD_GROUPS = {
+    "queue": ["currently_syncing", "cancelling", "queued_paths", "queue_order", "admission", "circuit_breakers"],
+    "errors": ["config_error_message", "auto_reload_error", "job_file_errors", "sync_errors"],
+}
+JOB_STATE_FIELDS = {"last_sync", "next_run", "sync_status",
+                    "resync_status", "hash_warnings", "last_run_phases", "memory", "lateness",
+                    "retry", "plan", "autotune"}
+STATUS_QUERY_ARGS = {"fields", "jobs", "job", "job_fields", "offset", "limit"}
+# The snapshot file trails the state by at most this long; events within it
+# share one rebuild
+SNAPSHOT_PUBLISH_DELAY = 0.25
+
+
+class RawJSON:
+    # An already serialized result that is spliced into the response as is,
+    # given as a list of byte strings that are only joined once
+    def __init__(self, parts):
+        self.parts = parts
+
+    @property
+    def data(self):
+        return b''.join(self.parts)
+
+
+# Serialized status report without its closing brace and the state version
+# it was built at
+_status_snapshot = (None, None)
+# Status fields that change without an event, so they are left out of the
+# cached report and added fresh to every response
+VOLATILE_STATUS_FIELDS = ("admission", "logger")
+
+
+# Command name -> (handler, blocking). Blocking handlers run in a worker
+# thread so they can't stall the event loop.
+COMMANDS = {}
+
+
+def command(name, blocking=False):
+    def register(handler):
+        COMMANDS[name] = (handler, blocking)
+        return handler
+    return register
+
+
 def start_status_server():
-    socket_path = '/tmp/rclone_bisync_manager_status.sock'
+    asyncio.run(serve())
 
-    if os.path.exists(socket_path):
-        os.unlink(socket_path)
 
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(socket_path)
-    server.listen(1)
-    server.settimeout(1)  # Set a timeout so we can check the running flag
+async def serve():
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
 
+    server = await asyncio.start_unix_server(handle_connection, path=SOCKET_PATH, backlog=256)
+    status_file = StatusFileWriter()
+    publisher = asyncio.create_task(publish_status_file(status_file))
+
+    metrics_server = (None, None)
+
+    # Poll the running flag so the server goes away with the daemon
     while config.running or not config.shutdown_complete:
-        try:
-            conn, addr = server.accept()
-            threading.Thread(target=handle_client, args=(conn,)).start()
-        except socket.timeout:
-            continue
+        metrics_server = await update_metrics_server(*metrics_server)
+        await asyncio.sleep(0.5)
 
+    publisher.cancel()
+    status_file.close()
+    await stop_metrics_server(*metrics_server)
     server.close()
-    os.unlink(socket_path)
+    await server.wait_closed()
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
 
 
-def handle_client(conn):
+async def update_metrics_server(server, settings):
+    # (Re)starts the metrics endpoint whenever its settings change, so a
+    # config reload can enable, move or disable it
+    wanted = config._config.metrics if config._config else None
+    if wanted is not None and not wanted.enabled:
+        wanted = None
+    if wanted == settings:
+        return server, settings
+
+    await stop_metrics_server(server, settings)
+    if wanted is None:
+        return None, None
     try:
-        data = conn.recv(4096).decode().strip()
-
-        if data == "RELOAD":
-            from rclone_bisync_manager.daemon_functions import reload_config
-            success = reload_config()
-            response = json.dumps({
-                "status": "success" if success else "error",
-                "message": "Configuration reloaded successfully" if success else f"Error reloading configuration. Daemon is in limbo state. Error: {config.config_error_message}"
-            })
-        elif data == "STOP":
-            config.running = False
-            config.shutting_down = True
-            response = json.dumps({
-                "status": "success",
-                "message": "Shutdown signal sent to daemon"
-            })
-        elif data == "STATUS":
-            response = generate_status_report()
-        elif data == "GET_CONFIG":
-            response = generate_config_report()
-        else:
-            response = json.dumps({
-                "status": "error",
-                "message": "Invalid command"
-            })
+        server = await metrics.start_metrics_server(wanted)
+        log_message(f"Metrics endpoint listening on {format_metrics_address(wanted)}")
+    except OSError as e:
+        log_error(
+            f"Failed to start metrics endpoint on {format_metrics_address(wanted)}: {str(e)}")
+        server = None
+    return server, wanted
+
+
+async def stop_metrics_server(server, settings):
+    if server is None:
+        return
+    server.close()
+    await server.wait_closed()
+    if settings.unix_socket and os.path.exists(settings.unix_socket):
+        os.unlink(settings.unix_socket)
+
+
+def format_metrics_address(settings):
+    if settings.unix_socket:
+        return settings.unix_socket
+    return f"http://{settings.listen_address}:{settings.port}/metrics"
+
+
+async def handle_connection(reader, writer):
+    write_lock = asyncio.Lock()
+    tasks = set()
+    subscriptions = set()
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        if is_legacy_request(header):
+            await handle_legacy_request(header, reader, writer)
+            return
 
-        conn.sendall(response.encode())
+        while True:
+            (length,) = FRAME_HEADER.unpack(header)
+            if length > MAX_FRAME_SIZE:
+                log_error(f"Control request too large: {length} bytes")
+                return
+            body = await reader.readexactly(length)
+            # Requests on one connection are handled concurrently; the id in
+            # each response lets the client match them up
+            task = asyncio.create_task(process_frame(
+                body, writer, write_lock, subscriptions))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            header = await reader.readexactly(FRAME_HEADER.size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
     except Exception as e:
         log_error(f"Error handling client request: {str(e)}")
     finally:
-        conn.close()
+        # Subscriptions live until the client hangs up
+        for task in subscriptions:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+
+async def process_frame(body, writer, write_lock, subscriptions):
+    request_id = None
+    try:
+        request = json.loads(body)
+        if not isinstance(request, dict):
+            raise CommandError("Request must be a JSON object")
+        request_id = request.get("id")
+        args = request.get("args") or {}
+        if request.get("command") == "SUBSCRIBE":
+            subscriptions.add(asyncio.current_task())
+            await stream_events(request_id, writer, write_lock)
+            return
+        if request.get("command") == "ADD_SYNC" and isinstance(args, dict) and args.get("wait"):
+            subscriptions.add(asyncio.current_task())
+            await stream_add_sync(request_id, args, writer, write_lock)
+            return
+        result = await dispatch(request.get("command"), args)
+        response = {"id": request_id, "status": "success", "result": result}
+    except CommandError as e:
+        response = {"id": request_id, "status": "error", "message": str(e)}
+    except Exception as e:
+        log_error(f"Error handling client request: {str(e)}")
+        response = {"id": request_id, "status": "error", "message": str(e)}
+
+    async with write_lock:
+        writer.write(encode_response(response))
+        await writer.drain()
+
+
+def encode_response(response):
+    result = response.get("result")
+    if not isinstance(result, RawJSON):
+        return encode_frame(response, default=json_serializer)
+    body = b''.join([b'{"id": ', json.dumps(response["id"]).encode(),
+                     b', "status": "success", "result": ', *result.parts, b'}'])
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+async def stream_events(request_id, writer, write_lock):
+    # The first response carries the full status; every later frame with the
+    # same id is an event plus the status fields it changed ("changes")
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def enqueue(event):
+        if events.full():
+            # A client that can't keep up gets one fresh snapshot instead of
+            # an ever-growing backlog
+            while not events.empty():
+                events.get_nowait()
+            event = {"event": "snapshot",
+                     "time": event["time"], "data": {}}
+        events.put_nowait(event)
+
+    def deliver(event):
+        loop.call_soon_threadsafe(enqueue, event)
+
+    event_bus.subscribe(deliver)
+    try:
+        async with write_lock:
+            writer.write(encode_response(
+                {"id": request_id, "status": "success", "result": RawJSON(get_status_snapshot()[1])}))
+            await writer.drain()
+
+        while True:
+            event = await events.get()
+            changes, full = build_status_changes(event)
+            async with write_lock:
+                writer.write(encode_frame({"id": request_id, **event, "changes": changes, "full": full},
+                                          default=json_serializer))
+                await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        event_bus.unsubscribe(deliver)
+
+
+async def publish_status_file(status_file):
+    # Rewrites the shared snapshot file after state changes. At most one
+    # rebuild is pending, and it waits SNAPSHOT_PUBLISH_DELAY for the rest of
+    # a burst of events (a queue of syncs starting, say) to arrive.
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_event(event):
+        loop.call_soon_threadsafe(changed.set)
+
+    event_bus.subscribe(on_event)
+    try:
+        while True:
+            changed.clear()
+            try:
+                status_file.publish(build_compact_snapshot())
+            except Exception as e:
+                log_error(f"Error publishing status snapshot: {str(e)}")
+            await changed.wait()
+            await asyncio.sleep(SNAPSHOT_PUBLISH_DELAY)
+    finally:
+        event_bus.unsubscribe(on_event)
+
+
+def build_compact_snapshot():
+    status = build_projected_status({"job_fields": sorted(JOB_STATE_FIELDS)})
+    status["published_at"] = datetime.now().isoformat()
+    return json.dumps(status, default=json_serializer, ensure_ascii=False).encode()
+
+
+async def dispatch(command_name, args):
+    if command_name not in COMMANDS:
+        raise CommandError("Invalid command")
+    if not isinstance(args, dict):
+        raise CommandError("Command arguments must be a JSON object")
+    handler, blocking = COMMANDS[command_name]
+    if blocking:
+        return await asyncio.get_running_loop().run_in_executor(None, handler, args)
+    return handler(args)
 
 
-def generate_status_report():
+async def handle_legacy_request(header, reader, writer):
+    # Unframed one-shot request ("STATUS", "RUN_LOG <job> failed", ...) from
+    # an older client: answer with bare JSON and close the connection
+    data = (header + await reader.read(4096)).decode().strip()
+    parts = data.split()
+    command_name, positional = parts[0], parts[1:]
+    args = {}
+    if command_name in ("RUN_LOG", "RUNS", "TRACES"):
+        args = {"job": positional[0] if positional else None}
+        if len(positional) > 1:
+            args["selector"] = positional[1]
+    elif command_name in ("PROFILE", "MEMSNAPSHOT") and positional:
+        args = {"action": positional[0]}
+    elif command_name == "STATUS_IF_CHANGED" and positional:
+        args = {"version": positional[0]}
+    elif command_name == "STATUS":
+        # STATUS job=photos fields=running,queue limit=20
+        args = dict(item.split('=', 1)
+                    for item in positional if '=' in item)
+
     try:
-        status = {
-            "pid": os.getpid(),
-            "running": config.running,
-            "shutting_down": config.shutting_down,
-            "in_limbo": config.in_limbo,
-            "config_invalid": config.config_invalid,
-            "config_error_message": getattr(config, 'config_error_message', None),
-            "currently_syncing": config.currently_syncing,
-            "queued_paths": list(config.queued_paths),
-            "config_changed_on_disk": config.config_changed_on_disk,
-            "config_file_location": str(config.config_file),
-            "log_file_location": str(config._config.log_file_path) if config._config else None,
-            "sync_errors": config.sync_errors
-        }
-
-        if config._config and not config.in_limbo and not config.config_invalid:
-            status["current_config"] = model_to_dict(config._config)
-            status["sync_jobs"] = {}
-            for key, value in config._config.sync_jobs.items():
-                if value.active:
-                    job_state = sync_state.get_job_state(key)
-                    status["sync_jobs"][key] = model_to_dict(value)
-                    status["sync_jobs"][key].update({
-                        "last_sync": job_state["last_sync"].isoformat() if job_state["last_sync"] else None,
-                        "next_run": job_state["next_run"].isoformat() if job_state["next_run"] else None,
-                        "sync_status": standardize_status(job_state["sync_status"]),
-                        "resync_status": standardize_status(job_state["resync_status"]),
-                        "hash_warnings": config.hash_warnings.get(key, False)
-                    })
-
-        return json.dumps(status, default=json_serializer, ensure_ascii=False)
+        result = await dispatch(command_name, args)
+        if isinstance(result, RawJSON):
+            response = result.data
+        elif command_name in ("STATUS", "GET_CONFIG"):
+            response = json.dumps(result, default=json_serializer,
+                                  ensure_ascii=False).encode()
+        else:
+            response = json.dumps({"status": "success", **result}, default=json_serializer,
+                                  ensure_ascii=False).encode()
     except Exception as e:
-        error_message = f"Error generating status report: {str(e)}"
-        log_error(error_message)
-        return json.dumps({"status": "error", "message": error_message})
+        response = json.dumps({"status": "error", "message": str(e)}).encode()
+
+    writer.write(response)
+    await writer.drain()
+
+
+@command("PING")
+def handle_ping(args):
+    return {"pong": True}
+
+
+@command("STATUS")
+def handle_status(args):
+    # Without a query the whole cached report is returned
+    if not STATUS_QUERY_ARGS & args.keys():
+        return RawJSON(get_status_snapshot()[1])
+    return build_projected_status(args)
+
+
+@command("STATUS_IF_CHANGED")
+def handle_status_if_changed(args):
+    try:
+        known_version = int(args.get("version"))
+    except (TypeError, ValueError):
+        raise CommandError("STATUS_IF_CHANGED requires a numeric version")
+    if known_version == event_bus.version:
+        # The volatile fields change without a new version, so they come along
+        return {"not_modified": True, "version": known_version, **build_volatile_status()}
+    return RawJSON(get_status_snapshot()[1])
+
+
+@command("GET_CONFIG")
+def handle_get_config(args):
+    return {"config_schema": get_config_schema()}
+
+
+@command("RELOAD", blocking=True)
+def handle_reload(args):
+    from rclone_bisync_manager.daemon_functions import reload_config
+    if not reload_config():
+        raise CommandError(
+            f"Error reloading configuration. Daemon is in limbo state. Error: {config.config_error_message}")
+    return {"message": "Configuration reloaded successfully"}
+
+
+@command("STOP")
+def handle_stop(args):
+    config.running = False
+    config.shutting_down = True
+    event_bus.publish(DAEMON_STATE, shutting_down=True)
+    return {"message": "Shutdown signal sent to daemon"}
+
+
+@command("ADD_SYNC")
+def handle_add_sync(args):
+    results = queue_sync_requests(parse_sync_requests(args))
+    if "jobs" not in args:
+        # Single job form: {"job_key": ..., "force_bisync": ..., "resync": ...}
+        if not results[0]["queued"]:
+            raise CommandError(results[0]["message"])
+        return {"message": results[0]["message"]}
+    return {"results": results}
+
+
+def parse_sync_requests(args):
+    # Either a single job_key or a batch under "jobs". Batch entries are job
+    # names or objects with their own flags; flags given next to "jobs"
+    # are the defaults for the batch.
+    if "jobs" in args:
+        entries = args["jobs"]
+        if not isinstance(entries, list) or not entries:
+            raise CommandError("'jobs' must be a non-empty list")
+    elif args.get("job_key"):
+        entries = [{"job_key": args["job_key"]}]
+    else:
+        raise CommandError("ADD_SYNC requires a job_key or a list of jobs")
+
+    defaults = {k: args[k]
+                for k in ("force_bisync", "resync", "priority") if k in args}
+    requests = []
+    seen = set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"job_key": entry}
+        if not isinstance(entry, dict) or not entry.get("job_key"):
+            raise CommandError("Every job in an ADD_SYNC batch needs a job_key")
+        entry = {**defaults, **entry}
+        if entry["job_key"] in seen:
+            continue
+        seen.add(entry["job_key"])
+        # Without a priority the job's configured priority applies
+        priority = entry.get("priority")
+        try:
+            priority = int(priority) if priority is not None else None
+        except (TypeError, ValueError):
+            raise CommandError(f"Invalid priority for job '{
+                               entry['job_key']}'")
+        requests.append(QueuedSync(entry["job_key"], bool(entry.get("force_bisync", False)),
+                                   bool(entry.get("resync", False)), priority))
+    return requests
+
+
+def queue_sync_requests(requests):
+    from rclone_bisync_manager.daemon_functions import request_sync
+    results = []
+    for request in requests:
+        queued, message = request_sync(request.job_key, force_bisync=request.force_bisync,
+                                       resync=request.resync, priority=request.priority)
+        results.append({"job_key": request.job_key,
+                       "queued": queued, "message": message})
+    return results
+
+
+async def stream_add_sync(request_id, args, writer, write_lock):
+    # ADD_SYNC with "wait": the first response lists what was queued, then
+    # a job_finished frame follows for every job as it completes and a
+    # final batch_finished frame sums up the batch
+    requests = parse_sync_requests(args)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def deliver(event):
+        if event["event"] in (JOB_FINISHED, DAEMON_STATE):
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+    # Subscribe before queueing so a quick job can't finish unnoticed
+    event_bus.subscribe(deliver)
+    try:
+        results = queue_sync_requests(requests)
+        pending = {result["job_key"]
+                   for result in results if result["queued"]}
+        finished = {result["job_key"]: {"job": result["job_key"], "result": "REJECTED", "message": result["message"]}
+                    for result in results if not result["queued"]}
+
+        async with write_lock:
+            writer.write(encode_frame({"id": request_id, "status": "success",
+                                       "result": {"results": results, "waiting": sorted(pending)}}))
+            await writer.drain()
+
+        while pending:
+            event = await events.get()
+            if event["event"] == DAEMON_STATE:
+                if event["data"].get("shutting_down"):
+                    for job in pending:
+                        finished[job] = {"job": job, "result": "CANCELLED"}
+                    break
+                continue
+            job = event["data"]["job"]
+            if job not in pending:
+                continue
+            pending.discard(job)
+            finished[job] = event["data"]
+            async with write_lock:
+                writer.write(encode_frame(
+                    {"id": request_id, **event}, default=json_serializer))
+                await writer.drain()
+
+        async with write_lock:
+            writer.write(encode_frame({"id": request_id, "event": "batch_finished", "time": datetime.now().isoformat(),
+                                       "data": {"jobs": finished,
+                                                "succeeded": all(job["result"] == "COMPLETED" for job in finished.values())}}))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        event_bus.unsubscribe(deliver)
+
+
+@command("METRICS")
+def handle_metrics(args):
+    return metrics.registry.render().decode()
+
+
+@command("REMOVE_SYNC")
+def handle_remove_sync(args):
+    from rclone_bisync_manager.daemon_functions import remove_from_sync_queue
+    job_key = args.get("job_key")
+    if not job_key:
+        raise CommandError("REMOVE_SYNC requires a job_key")
+    if not remove_from_sync_queue(job_key):
+        raise CommandError(f"Sync job '{job_key}' is not queued")
+    return {"message": f"Sync job '{job_key}' removed from queue"}
+
+
+@command("CANCEL")
+def handle_cancel(args):
+    from rclone_bisync_manager.daemon_functions import cancel_sync
+    job_key = args.get("job_key")
+    if not job_key:
+        raise CommandError("CANCEL requires a job_key")
+    success, message = cancel_sync(job_key)
+    if not success:
+        raise CommandError(message)
+    return {"message": message}
+
+
+@command("SET_PRIORITY")
+def handle_set_priority(args):
+    from rclone_bisync_manager.daemon_functions import set_sync_priority
+    job_key = args.get("job_key")
+    if not job_key or "priority" not in args:
+        raise CommandError("SET_PRIORITY requires a job_key and a priority")
+    try:
+        priority = int(args["priority"])
+    except (TypeError, ValueError):
+        raise CommandError("'priority' must be an integer")
+    if not set_sync_priority(job_key, priority):
+        raise CommandError(f"Sync job '{job_key}' is not queued")
+    return {"message": f"Priority of sync job '{job_key}' set to {priority}"}
+
+
+@command("RUN_LOG", blocking=True)
+def handle_run_log(args):
+    job_key = args.get("job")
+    if not job_key:
+        raise CommandError("Usage: RUN_LOG <job> [last|failed|<run_id>]")
+    record = find_run_record(job_key, args.get("selector", "last"))
+    if record is None:
+        raise CommandError(f"No matching run found for job '{job_key}'")
+    log_text = read_run_log(record)
+    return {
+        "run": asdict(record),
+        "log": log_text if log_text is not None else "Log segment is no longer available (removed by log retention)."
+    }
+
+
+@command("RUNS")
+def handle_runs(args):
+    job_key = args.get("job")
+    if not job_key:
+        raise CommandError("Usage: RUNS <job>")
+    return {"runs": [asdict(record) for record in run_log_index.runs(job_key)]}
+
+
+@command("TRACES", blocking=True)
+def handle_traces(args):
+    job_key = args.get("job")
+    if not job_key:
+        raise CommandError("Usage: TRACES <job>")
+    return {"traces": tracer.traces(job_key)}
+
+
+@command("PROFILE", blocking=True)
+def handle_profile(args):
+    action = args.get("action", "status")
+    try:
+        if action == "start":
+            interval = float(args.get("interval", DEFAULT_SAMPLE_INTERVAL))
+            if not 0.001 <= interval <= 1:
+                raise CommandError("interval must be between 0.001 and 1 second")
+            sampling_profiler.start(interval)
+            return {"message": "Profiler started"}
+        if action == "stop":
+            return sampling_profiler.stop()
+    except ValueError as e:
+        raise CommandError(str(e))
+    if action == "status":
+        return sampling_profiler.status()
+    raise CommandError("Usage: PROFILE start|stop|status")
+
+
+@command("MEMSNAPSHOT", blocking=True)
+def handle_memsnapshot(args):
+    action = args.get("action", "snapshot")
+    try:
+        if action == "snapshot":
+            return memory_snapshots.take(parse_int_arg(args, "limit", 20))
+        if action == "stop":
+            memory_snapshots.stop()
+            return {"message": "Allocation tracing stopped"}
+    except ValueError as e:
+        raise CommandError(str(e))
+    raise CommandError("Usage: MEMSNAPSHOT [snapshot|stop]")
+
+
+def build_status_summary():
+    # Simulating the deadline order is the costly part, so do it once
+    queued = config.sync_queue.ordered(dispatch_policy())
+    return {
+        "version": event_bus.version,
+        "pid": os.getpid(),
+        "running": config.running,
+        "shutting_down": config.shutting_down,
+        "in_limbo": config.in_limbo,
+        "config_invalid": config.config_invalid,
+        "config_error_message": getattr(config, 'config_error_message', None),
+        "currently_syncing": config.currently_syncing,
+        # Queued jobs in the order they will run, then the deferred ones
+        "queued_paths": [item.job_key for item in queued] + list(admission.deferred),
+        "queue_order": describe_items(queued),
+        # Breaker state per remote that has failed since it was last healthy
+        "circuit_breakers": circuit_breakers.status(),
+        # Running jobs that are being cancelled, with the reason
+        "cancelling": run_watchdog.status(),
+        "config_changed_on_disk": config.config_changed_on_disk,
+        "auto_reload_error": config.auto_reload_error,
+        "job_file_errors": config.job_file_errors,
+        "config_file_location": str(config.config_file),
+        "log_file_location": str(config._config.log_file_path) if config._config else None,
+        "sync_errors": config.sync_errors,
+        **build_volatile_status()
+    }
+
+
+def build_job_status(key, fields=None):
+    job_state = sync_state.get_job_state(key)
+    # The job's config is only dumped when a config field was asked for
+    if fields is not None and fields <= JOB_STATE_FIELDS:
+        job_status = {}
+    else:
+        job_status = model_to_dict(config._config.sync_jobs[key])
+    job_status.update({
+        "last_sync": job_state["last_sync"].isoformat() if job_state["last_sync"] else None,
+        "next_run": job_state["next_run"].isoformat() if job_state["next_run"] else None,
+        "sync_status": standardize_status(job_state["sync_status"]),
+        "resync_status": standardize_status(job_state["resync_status"]),
+        "hash_warnings": config.hash_warnings.get(key, False),
+        # Seconds spent in each phase of the job's last run
+        "last_run_phases": tracer.last_phases(key),
+        # Peak RSS of the last run and the prediction used for the budget
+        "memory": job_stats.memory_status(key),
+        # How late the job's scheduled runs started against their deadlines
+        "lateness": job_stats.lateness_status(key),
+        # Attempt and next retry time after a transient failure
+        "retry": scheduler.retry_status(key),
+        # Remote features and the compare/listing options chosen from them
+        "plan": get_job_plan(key),
+        # Tuned --transfers/--checkers and the decisions that led to them
+        "autotune": autotuner.status(key)
+    })
+    if fields is not None:
+        job_status = {k: v for k, v in job_status.items() if k in fields}
+    return job_status
+
+
+def jobs_visible():
+    return config._config is not None and not config.in_limbo and not config.config_invalid
+
+
+def build_status_report():
+    status = build_status_summary()
+
+    if jobs_visible():
+        status["current_config"] = model_to_dict(config._config)
+        status["sync_jobs"] = {}
+        for key, value in config._config.sync_jobs.items():
+            if value.active:
+                status["sync_jobs"][key] = build_job_status(key)
+
+    return status
+
+
+def parse_list_arg(value):
+    if value is None or isinstance(value, list):
+        return value
+    return [item for item in str(value).split(',') if item]
+
+
+def parse_int_arg(args, name, default):
+    value = args.get(name, default)
+    try:
+        value = int(value) if value is not None else None
+    except (TypeError, ValueError):
+        raise CommandError(f"'{name}' must be an integer")
+    if value is not None and value < 0:
+        raise CommandError(f"'{name}' must not be negative")
+    return value
+
+
+def build_projected_status(args):
+    # STATUS with a projection ("fields"), a job filter ("jobs"/"job"), the
+    # per-job fields to include ("job_fields") and pagination over the jobs
+    # ("offset", "limit"). current_config is only included when requested.
+    summary = build_status_summary()
+    valid_fields = set(summary) | set(FIELD_GROUPS) | {
+        "current_config", "sync_jobs"}
+
+    fields = parse_list_arg(args.get("fields"))
+    if fields is not None:
+        unknown = [field for field in fields if field not in valid_fields]
+        if unknown:
+            raise CommandError(f"Unknown status field(s): {', '.join(unknown)}. Valid fields: {
+                ', '.join(sorted(valid_fields))}")
+        fields = {expanded for field in fields for expanded in FIELD_GROUPS.get(
+            field, [field])}
+
+    job_filter = parse_list_arg(args.get("jobs"))
+    if args.get("job"):
+        job_filter = (job_filter or []) + [args["job"]]
+    job_fields = parse_list_arg(args.get("job_fields"))
+    offset = parse_int_arg(args, "offset", 0)
+    limit = parse_int_arg(args, "limit", None)
+
+    status = {"version": summary["version"]}
+    status.update({k: v for k, v in summary.items()
+                  if fields is None or k in fields})
+
+    if not jobs_visible():
+        return status
+
+    if fields is not None and "current_config" in fields:
+        status["current_config"] = model_to_dict(config._config)
+
+    paging = any(args.get(name) is not None for name in (
+        "jobs", "job", "job_fields", "offset", "limit"))
+    if fields is None or "sync_jobs" in fields or paging:
+        if job_filter is not None:
+            unknown = [
+                job for job in job_filter if job not in config._config.sync_jobs]
+            if unknown:
+                raise CommandError(f"Unknown sync job(s): {
+                                   ', '.join(unknown)}")
+            keys = [job for job in job_filter if config._config.sync_jobs[job].active]
+        else:
+            keys = [key for key, value in config._config.sync_jobs.items()
+                    if value.active]
+
+        page = keys[offset:offset + limit if limit is not None else None]
+        job_fields = set(job_fields) if job_fields is not None else None
+        status["sync_jobs"] = {key: build_job_status(
+            key, job_fields) for key in page}
+        status["jobs_total"] = len(keys)
+        status["offset"] = offset
+        status["next_offset"] = offset + \
+            len(page) if offset + len(page) < len(keys) else None
+
+    return status
+
+
+def get_status_snapshot():
+    # Rebuilt only when the state version moved; between events every
+    # STATUS request is served from the cached bytes plus the volatile
+    # fields. Runs on the event loop thread only.
+    global _status_snapshot
+    version, data = _status_snapshot
+    if version != event_bus.version:
+        version = event_bus.version
+        status = build_status_report()
+        status["version"] = version
+        for field in VOLATILE_STATUS_FIELDS:
+            del status[field]
+        data = json.dumps(status, default=json_serializer,
+                          ensure_ascii=False).encode()[:-1]
+        _status_snapshot = (version, data)
+    volatile = json.dumps(build_volatile_status(), default=json_serializer,
+                          ensure_ascii=False).encode()
+    return version, [data, b', ', volatile[1:]]
+
+
+def build_volatile_status():
+    # Admission pressure, deferred jobs (with the reason) and suspended
+    # syncs; logger queue depth and record counts
+    return {"admission": admission.status(), "logger": get_logger_stats()}
+
+
+def build_status_changes(event):
+    # Only what the event can have touched: the cheap top-level fields plus
+    # the affected job. Config reloads and queue overflows resend everything.
+    if event["event"] in FULL_SNAPSHOT_EVENTS:
+        return build_status_report(), True
+
+    changes = build_status_summary()
+    job_key = event["data"].get("job")
+    if job_key and jobs_visible() and job_key in config._config.sync_jobs and config._config.sync_jobs[job_key].active:
+        changes["sync_jobs"] = {job_key: build_job_status(job_key)}
+    return changes, False
 
 
 def model_to_dict(obj: Any) -> dict:
@@ -134,16 +825,12 @@ def json_serializer(obj: Any) -> Any:
     return str(obj)  # Convert any other types to strings
 
 
-def generate_config_report():
-    try:
-        config_data = {
-            "config_schema": get_config_schema()
-        }
-        return json.dumps(config_data, default=json_serializer, ensure_ascii=False)
-    except Exception as e:
-        error_message = f"Error generating config report: {str(e)}"
-        log_error(error_message)
-        return json.dumps({"status": "error", "message": error_message})
+def find_run_record(job_key, selector="last"):
+    if selector == "failed":
+        return run_log_index.find_run(job_key, failed_only=True)
+    if selector == "last":
+        return run_log_index.find_run(job_key)
+    return run_log_index.find_run(job_key, run_id=selector)
 
 
 def standardize_status(status):
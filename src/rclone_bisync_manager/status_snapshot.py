@@ -0,0 +1,121 @@
+import os
+import json
+import mmap
+import time
+import struct
+import tempfile
+
+# The daemon publishes a compact status snapshot to a memory-mapped file so
+# read-only clients get status without talking to the daemon at all. Like
+# control_protocol, this module must not import daemon modules.
+#
+# Layout: header (magic, sequence, payload length) followed by the JSON
+# payload. The writer bumps the sequence to an odd value before touching the
+# payload and to the next even value afterwards; a reader that sees an odd
+# or changed sequence retries (a seqlock). When the payload outgrows the
+# file a larger file is renamed over it, so readers simply reopen per read.
+
+SNAPSHOT_MAGIC = b'RBMSTAT1'
+SNAPSHOT_HEADER = struct.Struct('<8sQQ')
+MIN_CAPACITY = 64 * 1024
+READ_RETRIES = 100
+
+
+def get_status_file_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        directory = os.path.join(runtime_dir, 'rclone-bisync-manager')
+    else:
+        directory = os.path.join(
+            tempfile.gettempdir(), f'rclone-bisync-manager-{os.getuid()}')
+    return os.path.join(directory, 'status.snapshot')
+
+
+class StatusFileWriter:
+    def __init__(self, path=None):
+        self.path = path or get_status_file_path()
+        self._file = None
+        self._map = None
+        self._sequence = 0
+
+    def _allocate(self, payload_size):
+        capacity = MIN_CAPACITY
+        while capacity < SNAPSHOT_HEADER.size + payload_size:
+            capacity *= 2
+
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        new_file = open(tmp_path, 'w+b')
+        new_file.truncate(capacity)
+        new_map = mmap.mmap(new_file.fileno(), capacity)
+        SNAPSHOT_HEADER.pack_into(
+            new_map, 0, SNAPSHOT_MAGIC, self._sequence, 0)
+        os.replace(tmp_path, self.path)
+
+        self.close(remove=False)
+        self._file, self._map = new_file, new_map
+
+    def publish(self, payload):
+        if self._map is None or SNAPSHOT_HEADER.size + len(payload) > len(self._map):
+            self._allocate(len(payload))
+
+        self._sequence += 1
+        SNAPSHOT_HEADER.pack_into(
+            self._map, 0, SNAPSHOT_MAGIC, self._sequence, len(payload))
+        self._map[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size +
+                  len(payload)] = payload
+        self._sequence += 1
+        SNAPSHOT_HEADER.pack_into(
+            self._map, 0, SNAPSHOT_MAGIC, self._sequence, len(payload))
+
+    def close(self, remove=True):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+        if remove:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def read_status_file(path=None, check_alive=True):
+    # Returns the last published status, or None if there is none or the
+    # daemon that wrote it is gone
+    path = path or get_status_file_path()
+    try:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for _ in range(READ_RETRIES):
+                    magic, sequence, length = SNAPSHOT_HEADER.unpack_from(
+                        mm, 0)
+                    if magic != SNAPSHOT_MAGIC:
+                        return None
+                    if sequence % 2 == 0 and length:
+                        payload = mm[SNAPSHOT_HEADER.size:
+                                     SNAPSHOT_HEADER.size + length]
+                        if SNAPSHOT_HEADER.unpack_from(mm, 0)[1] == sequence:
+                            break
+                    time.sleep(0.001)
+                else:
+                    return None
+    except (OSError, ValueError):
+        return None
+
+    status = json.loads(payload)
+    if check_alive and not _process_alive(status.get("pid")):
+        return None
+    return status
+
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -1,9 +1,20 @@
 import os
+import re
+import time
 import subprocess
 from datetime import datetime
-from rclone_bisync_manager.utils import is_cpulimit_installed, check_local_rclone_test, check_remote_rclone_test, ensure_local_directory
+from rclone_bisync_manager.utils import check_local_rclone_test, check_remote_rclone_test, ensure_local_directory
 from rclone_bisync_manager.logging_utils import log_message, log_error
 from rclone_bisync_manager.config import config, sync_state
+from rclone_bisync_manager.run_logs import run_log_index
+from rclone_bisync_manager import metrics
+from rclone_bisync_manager.tracing import tracer
+from rclone_bisync_manager.cpu_limit import run_limited
+from rclone_bisync_manager.job_stats import job_stats
+from rclone_bisync_manager.circuit_breaker import circuit_breakers
+from rclone_bisync_manager.watchdog import run_watchdog, CANCELLED, SHUTDOWN, STALLED, MAX_RUNTIME
+from rclone_bisync_manager.remote_features import remote_features
+from rclone_bisync_manager.autotune import autotuner, count_rate_limit_errors
 
 
 def perform_sync_operations(key, force_bisync=False, force_resync=False):
@@ -11,10 +22,29 @@ def perform_sync_operations(key, force_bisync=False, force_resync=False):
     local_path = os.path.join(config._config.local_base_path, value.local)
     remote_path = f"{value.rclone_remote}:{value.remote}"
 
-    if not check_local_rclone_test(local_path) or not check_remote_rclone_test(remote_path):
-        return
-
-    ensure_local_directory(local_path)
+    skip_reason = circuit_breakers.check(value.rclone_remote, config.current_sync_manual)
+    if skip_reason is not None:
+        log_message(f"Skipping sync job {key}: {skip_reason}")
+        return "SKIPPED"
+
+    preflight_started = time.monotonic()
+    try:
+        with tracer.span("preflight_local"):
+            preflight_passed = check_local_rclone_test(local_path)
+        if preflight_passed:
+            with tracer.span("preflight_remote"):
+                preflight_passed = check_remote_rclone_test(remote_path)
+    finally:
+        circuit_breakers.end_probe(value.rclone_remote)
+    metrics.preflight_duration.observe(
+        time.monotonic() - preflight_started, job=key)
+    if not preflight_passed:
+        return "SKIPPED"
+
+    with tracer.span("ensure_local_directory"):
+        ensure_local_directory(local_path)
+    with tracer.span("probe_remote_features"):
+        remote_features.ensure(value.rclone_remote)
 
     log_message(f"Performing sync operation for {key}. Force bisync: {force_bisync}, Force resync: {force_resync}, Dry run: {config._config.dry_run}")
 
@@ -25,25 +55,34 @@ def perform_sync_operations(key, force_bisync=False, force_resync=False):
         log_message(f"Initiating resync for {key}. Force resync: {force_resync}, Resync status: {status['resync_status']}")
         write_status(key, resync_status="IN_PROGRESS")
         resync_result = resync(key, remote_path, local_path)
+        if resync_result == "CANCELLED":
+            # The resync status stays IN_PROGRESS, so the next run resyncs
+            return resync_result
         write_status(key, resync_status=resync_result)
 
         if resync_result == "COMPLETED":
             log_message(f"Resync completed for {key}, proceeding with bisync.")
             bisync_result = bisync(key, remote_path, local_path, force_bisync)
+            if bisync_result == "CANCELLED":
+                return bisync_result
             write_status(key, sync_status=bisync_result)
         else:
             log_error(f"Resync failed for {key}. Manual intervention or force resync required.")
-            return
+            return resync_result
     else:
         log_message(f"Proceeding with bisync for {key}. Force bisync: {force_bisync}")
         bisync_result = bisync(key, remote_path, local_path, force_bisync)
+        if bisync_result == "CANCELLED":
+            return bisync_result
         write_status(key, sync_status=bisync_result)
 
-    sync_state.update_job_state(key, 
-                                sync_status=bisync_result if 'bisync_result' in locals() else status["sync_status"],
-                                resync_status=resync_result if 'resync_result' in locals() else status["resync_status"],
-                                last_sync=datetime.now())
-    config.save_sync_state()
+    with tracer.span("save_state"):
+        sync_state.update_job_state(key, 
+                                    sync_status=bisync_result if 'bisync_result' in locals() else status["sync_status"],
+                                    resync_status=resync_result if 'resync_result' in locals() else status["resync_status"],
+                                    last_sync=datetime.now())
+        config.save_sync_state()
+    return bisync_result
 
 
 def bisync(key, remote_path, local_path, force_bisync):
@@ -51,23 +90,32 @@ def bisync(key, remote_path, local_path, force_bisync):
                 (" - Performing a dry run" if config._config.dry_run else "") +
                 (f" - Force bisync {'enabled' if force_bisync else 'disabled'}"))
 
-    # Set the initial log position
-    config._last_log_position = get_log_file_position()
+    run = run_log_index.start_run(key, 'bisync')
 
     rclone_args = ['rclone', 'bisync', remote_path, local_path]
     rclone_args.extend(get_rclone_args(
-        config._config.bisync_options, 'bisync', key))
+        config._config.bisync_options, 'bisync', key, log_file=run.segment))
 
     if force_bisync:
         rclone_args.append('--force')
 
-    result = run_rclone_command(rclone_args)
-
-    # Check for hash warnings in the log file
-    check_for_hash_warnings(key)
-
-    sync_result = handle_rclone_exit_code(
-        result.returncode, local_path, "Bisync")
+    try:
+        with tracer.span("bisync", run_id=run.run_id):
+            result = run_rclone_command(
+                key, rclone_args, run.segment, get_cpu_limit(key))
+    except Exception:
+        run_log_index.finish_run(run, None, "FAILED")
+        raise
+    record_run_metrics(key, run, result)
+    if not result.cancelled:
+        circuit_breakers.record_run(config._config.sync_jobs[key].rclone_remote, result.returncode)
+
+    sync_result = handle_run_result(result, local_path, "Bisync")
+    run_log_index.finish_run(run, result.returncode, sync_result)
+
+    # Check for hash warnings in this run's part of the job log
+    with tracer.span("check_for_hash_warnings"):
+        check_for_hash_warnings(key, run)
     log_message(f"Bisync status for {local_path}: {sync_result}")
     return sync_result
 
@@ -79,21 +127,77 @@ def resync(key, remote_path, local_path):
     log_message(f"Resync started for {local_path} at {datetime.now(
     )}" + (" - Performing a dry run" if config._config.dry_run else ""))
 
+    run = run_log_index.start_run(key, 'resync')
+
     rclone_args = ['rclone', 'bisync', remote_path, local_path, '--resync']
     rclone_args.extend(get_rclone_args(
-        config._config.resync_options, 'resync', key))
-
-    result = run_rclone_command(rclone_args)
-    sync_result = handle_rclone_exit_code(
-        result.returncode, local_path, "Resync")
+        config._config.resync_options, 'resync', key, log_file=run.segment))
+
+    try:
+        with tracer.span("resync", run_id=run.run_id):
+            result = run_rclone_command(
+                key, rclone_args, run.segment, get_cpu_limit(key))
+    except Exception:
+        run_log_index.finish_run(run, None, "FAILED")
+        raise
+    record_run_metrics(key, run, result)
+    if not result.cancelled:
+        circuit_breakers.record_run(value.rclone_remote, result.returncode)
+
+    sync_result = handle_run_result(result, local_path, "Resync")
+    run_log_index.finish_run(run, result.returncode, sync_result)
     log_message(f"Resync status for {local_path}: {sync_result}")
 
     return sync_result
 
 
-def get_rclone_args(options, operation_type, job_key):
-    args = []
+def record_run_metrics(key, run, result):
+    # CPU and memory usage of the run is kept with its record in the run
+    # index; the job's peak RSS history feeds the memory budget check
+    run.extra["resources"] = result.usage
+    if result.cancelled:
+        run.extra["cancelled"] = result.cancelled
+    job_stats.record_run(key, result.usage)
+    log_message(f"rclone {run.operation} for {key} used {result.usage['cpu_seconds']}s CPU "
+                f"({result.usage['cpu_percent']}% of available CPUs, limit {result.usage['limit_percent']}% via {result.usage['limiter']})")
+
+    metrics.job_run_duration.observe(
+        (datetime.now() - datetime.fromisoformat(run.started)).total_seconds(), job=key, operation=run.operation)
+    metrics.rclone_exit_codes.inc(
+        job=key, operation=run.operation, code=result.returncode)
+
+    # rclone's final stats are at the end of the run's output; the segment
+    # position is only recorded by finish_run, so read up to the current end
+    try:
+        end_offset = os.path.getsize(run.segment)
+        start_offset = max(run.start_offset, end_offset - STATS_TAIL_BYTES)
+        with open(run.segment, 'rb') as f:
+            f.seek(start_offset)
+            tail = f.read(end_offset - start_offset).decode(errors='replace')
+    except OSError:
+        return
+    transferred_bytes = parse_transferred_bytes(tail)
+    if transferred_bytes is not None:
+        metrics.bytes_transferred.inc(transferred_bytes, job=key)
+
+    # Cancelled runs and dry runs say nothing about the throughput
+    if not result.cancelled and not config._config.dry_run:
+        autotuner.record(key, transferred_bytes, result.usage["wall_seconds"],
+                         count_rate_limit_errors(run.segment, run.start_offset, end_offset))
+
+
+def parse_transferred_bytes(text):
+    # Bytes of the last "Transferred:" stats line in text, None if there is none
+    transferred = TRANSFERRED_PATTERN.findall(text)
+    if not transferred:
+        return None
+    amount, prefix, binary = transferred[-1]
+    base = 1024 if binary else 1000
+    return float(amount) * base ** SIZE_PREFIXES.index(prefix.upper())
 
+
+def get_rclone_options(options, operation_type, job_key):
+    # The merged options and the plan of what was adjusted to the remote
     # Determine which options to use based on operation type
     if operation_type == 'bisync':
         default_options = config._config.bisync_options
@@ -115,6 +219,19 @@ def get_rclone_args(options, operation_type, job_key):
     merged_options['dry_run'] = config._config.dry_run
     merged_options['force'] = config._config.sync_jobs[job_key].force_operation
 
+    merged_options = autotuner.apply(job_key, merged_options)
+    return remote_features.tune(config._config.sync_jobs[job_key].rclone_remote, merged_options, job_options)
+
+
+def get_job_plan(job_key):
+    _, plan = get_rclone_options({}, 'bisync', job_key)
+    return plan
+
+
+def get_rclone_args(options, operation_type, job_key, log_file=None):
+    args = []
+    merged_options, _ = get_rclone_options(options, operation_type, job_key)
+
     for key, value in merged_options.items():
         option_key = f"--{key.replace('_', '-')}"
         if value is None:
@@ -128,26 +245,51 @@ def get_rclone_args(options, operation_type, job_key):
         else:
             args.extend([option_key, str(value)])
 
-    if hasattr(config._config, 'exclusion_rules_file') and os.path.exists(config._config.exclusion_rules_file):
+    if config._config.exclusion_rules_file and os.path.exists(config._config.exclusion_rules_file):
         args.extend(['--exclude-from', config._config.exclusion_rules_file])
 
-    if config._config.redirect_rclone_log_output and hasattr(config._config, 'log_file_path'):
-        args.extend(['--log-file', config._config.log_file_path])
+    if log_file and config._config.redirect_rclone_log_output:
+        args.extend(['--log-file', log_file])
 
     return args
 
 
-def run_rclone_command(rclone_args):
+def get_cpu_limit(job_key):
+    job_limit = config._config.sync_jobs[job_key].max_cpu_usage_percent
+    return job_limit if job_limit is not None else config._config.max_cpu_usage_percent
+
+
+def run_rclone_command(key, rclone_args, output_file, max_cpu_usage_percent=100):
+    # rclone's stdout/stderr are appended to the run's job log segment; with
+    # --log-file pointing at the same file both streams append safely
+    log_message(f"Rclone command parameters: {' '.join(rclone_args)}")
+    with open(output_file, 'ab') as output:
+        result = run_limited(rclone_args, max_cpu_usage_percent,
+                             on_start=lambda pid: run_watchdog.watch(key, pid, output_file),
+                             stdout=output, stderr=subprocess.STDOUT)
+    result.cancelled = run_watchdog.finish(key)
+    return result
 
-    if is_cpulimit_installed():
-        cpulimit_command = ['cpulimit',
-                            f'--limit={config._config.max_cpu_usage_percent}', '--']
-        cpulimit_command.extend(rclone_args)
-        log_message(f"Running with cpulimit: {' '.join(cpulimit_command)}")
-        return subprocess.run(cpulimit_command, capture_output=True, text=True)
-    else:
-        log_message(f"Rclone command parameters: {' '.join(rclone_args)}")
-        return subprocess.run(rclone_args, capture_output=True, text=True)
+
+CANCEL_MESSAGES = {
+    STALLED: "made no progress and was cancelled by the watchdog",
+    MAX_RUNTIME: "exceeded its maximum runtime and was cancelled by the watchdog",
+}
+
+
+def handle_run_result(result, local_path, sync_type):
+    # A run cancelled by hand or by the shutdown didn't fail and leaves the
+    # job's sync status and errors alone; the exit code of an interrupted
+    # rclone says nothing about the sync
+    if result.cancelled in (CANCELLED, SHUTDOWN):
+        log_message(f"{sync_type} cancelled for {local_path} ({result.cancelled}).")
+        return "CANCELLED"
+    if result.cancelled is not None:
+        message = CANCEL_MESSAGES[result.cancelled]
+        config.update_sync_error(local_path, sync_type, result.returncode, message)
+        log_error(f"{sync_type} {message} for {local_path}.")
+        return "FAILED"
+    return handle_rclone_exit_code(result.returncode, local_path, sync_type)
 
 
 def handle_rclone_exit_code(result_code, local_path, sync_type):
@@ -189,7 +331,8 @@ def write_status(job_key, sync_status=None, resync_status=None):
     if resync_status is not None:
         sync_state.resync_status[job_key] = resync_status
     sync_state.last_sync_times[job_key] = datetime.now()
-    config.save_sync_state()
+    with tracer.span("save_state"):
+        config.save_sync_state()
 
 
 def read_status(job_key):
@@ -203,36 +346,40 @@ def read_status(job_key):
     }
 
 
-def get_log_file_position():
-    log_file_path = config._config.log_file_path
-    if os.path.exists(log_file_path):
-        return os.path.getsize(log_file_path)
-    return 0
-
-
-def check_for_hash_warnings(key):
-    log_file_path = config._config.log_file_path
-    if os.path.exists(log_file_path):
-        current_position = os.path.getsize(log_file_path)
-        if current_position > config._last_log_position:
-            with open(log_file_path, 'r') as log_file:
-                log_file.seek(config._last_log_position)
-                chunk_size = 4096
-                warning_detected = False
-                while True:
-                    chunk = log_file.read(chunk_size)
-                    if not chunk:
-                        break
-                    if "WARNING: hash unexpectedly blank despite Fs support" in chunk:
-                        warning_detected = True
-                        break
-
-                if warning_detected:
-                    warning_message = f"WARNING: Detected blank hash warnings for {
-                        key}. This may indicate issues with Live Photos or other special file types. You should try to resync and if that is not successful you should consider using --ignore-size for future syncs."
-                    log_message(warning_message)
-                    config.hash_warnings[key] = warning_message
-                else:
-                    config.hash_warnings[key] = None
-
-        config._last_log_position = current_position
+HASH_WARNING = "WARNING: hash unexpectedly blank despite Fs support"
+
+# "Transferred:   1.234 MiB / 1.234 MiB, 100%, ..." from rclone's stats; the
+# file count line ("Transferred: 3 / 3, 100%") has no unit and won't match
+TRANSFERRED_PATTERN = re.compile(
+    r'Transferred:\s+([\d.]+)\s*([kKMGTP]?)(i?)B\s*/')
+SIZE_PREFIXES = ['', 'K', 'M', 'G', 'T', 'P']
+STATS_TAIL_BYTES = 64 * 1024
+
+
+def check_for_hash_warnings(key, run):
+    warning_detected = False
+    if os.path.exists(run.segment):
+        # Only scan this run's byte range of the job log segment
+        with open(run.segment, 'rb') as log_file:
+            log_file.seek(run.start_offset)
+            remaining = run.end_offset - run.start_offset
+            chunk_size = 4096
+            tail = b''
+            warning = HASH_WARNING.encode()
+            while remaining > 0:
+                chunk = log_file.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if warning in tail + chunk:
+                    warning_detected = True
+                    break
+                tail = chunk[-len(warning):]
+
+    if warning_detected:
+        warning_message = f"WARNING: Detected blank hash warnings for {
+            key}. This may indicate issues with Live Photos or other special file types. You should try to resync and if that is not successful you should consider using --ignore-size for future syncs."
+        log_message(warning_message)
+        config.hash_warnings[key] = warning_message
+    else:
+        config.hash_warnings[key] = None
@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+# Priority queue of pending syncs, replacing a FIFO Queue plus a set of
+# queued job keys. Manual requests go to an interactive lane that is always
+# served before the scheduled lane. Within a lane, a job is ordered as if it
+# had been queued priority * aging_seconds earlier than it was: higher
+# priorities go first, but a job that has waited long enough overtakes newer
+# higher-priority jobs, so nothing starves. Keys never change while an item
+# is queued, which keeps this a plain binary heap.
+#
+# Removal and reprioritisation mark the old heap entry as dead (O(1)) and
+# push a new one (O(log n)); dead entries are dropped when they reach the top.
+#
+# pop() and ordered() optionally take a dispatch policy (deadlines.py) that
+# picks from the scheduled lane instead of the heap order; it scans the lane
+# on every pop, as its choice depends on the current time.
+
+INTERACTIVE_LANE = 0
+SCHEDULED_LANE = 1
+LANE_NAMES = {INTERACTIVE_LANE: "interactive", SCHEDULED_LANE: "scheduled"}
+
+
+class SyncQueue:
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _push(self, item, aging_seconds):
+        lane = INTERACTIVE_LANE if item.manual else SCHEDULED_LANE
+        queued_at = item.scheduled_time or item.requested_at
+        entry = [lane, queued_at.timestamp() - item.priority * aging_seconds,
+                 next(self._counter), item]
+        self._entries[item.job_key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _remove_entry(self, job_key):
+        entry = self._entries.pop(job_key, None)
+        if entry is None:
+            return None
+        item = entry[-1]
+        entry[-1] = None
+        return item
+
+    def put(self, item, aging_seconds=0):
+        # False if the job is already queued
+        with self._lock:
+            if item.job_key in self._entries:
+                return False
+            self._push(item, aging_seconds)
+            return True
+
+    def _lane(self, lane):
+        return [entry[-1] for entry in sorted(self._entries.values()) if entry[0] == lane]
+
+    def pop(self, policy=None):
+        with self._lock:
+            while self._heap and self._heap[0][-1] is None:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            if policy is not None and self._heap[0][0] == SCHEDULED_LANE:
+                item = policy.pick(self._lane(SCHEDULED_LANE), datetime.now())
+                return self._remove_entry(item.job_key)
+            item = heapq.heappop(self._heap)[-1]
+            del self._entries[item.job_key]
+            return item
+
+    def remove(self, job_key):
+        with self._lock:
+            return self._remove_entry(job_key)
+
+    def reprioritize(self, job_key, priority=None, manual=None, aging_seconds=0):
+        # Moves a queued job to a new priority and/or lane; it keeps the
+        # time it was queued at, so the wait it has accumulated still counts
+        with self._lock:
+            item = self._remove_entry(job_key)
+            if item is None:
+                return False
+            if priority is not None:
+                item.priority = priority
+            if manual is not None:
+                item.manual = manual
+            self._push(item, aging_seconds)
+            return True
+
+    def get(self, job_key):
+        with self._lock:
+            entry = self._entries.get(job_key)
+            return entry[-1] if entry else None
+
+    def __contains__(self, job_key):
+        return job_key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def empty(self):
+        return not self._entries
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self._entries = {}
+
+    def ordered(self, policy=None):
+        # Queued items in the order they will run, as far as it is known now
+        with self._lock:
+            interactive = self._lane(INTERACTIVE_LANE)
+            scheduled = self._lane(SCHEDULED_LANE)
+        if policy is not None:
+            start = datetime.now() + timedelta(seconds=sum(policy.duration(item) for item in interactive))
+            scheduled = policy.order(scheduled, start)
+        return interactive + scheduled
+
+    def describe(self, policy=None):
+        return describe_items(self.ordered(policy))
+
+
+def describe_items(items):
+    return [{"job": item.job_key,
+             "lane": LANE_NAMES[INTERACTIVE_LANE if item.manual else SCHEDULED_LANE],
+             "priority": item.priority,
+             "queued_at": (item.scheduled_time or item.requested_at).isoformat(),
+             "deadline": item.deadline.isoformat() if item.deadline else None}
+            for item in items]
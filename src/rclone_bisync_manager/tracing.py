@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_error
+from rclone_bisync_manager.run_logs import get_run_logs_dir
+
+# Spans around the phases of a sync (pre-flight checks, resync, bisync, hash
+# warning scan, state persistence). Each job run collects its spans into a
+# trace that is kept per job in traces.jsonl next to the run log index, shown
+# in the status report and optionally appended to a Chrome trace file per day
+# (chrome://tracing, Perfetto). Spans outside a job run, from the daemon
+# loop, are only exported and only when they were slow.
+
+TRACES_FILE_NAME = 'traces.jsonl'
+MAX_TRACES_PER_JOB = 50
+# traces.jsonl is appended to; it is rewritten once this many of its lines
+# belong to traces that no longer fit in a job's history
+COMPACT_AFTER_STALE_LINES = 500
+SLOW_LOOP_SPAN = 0.05
+
+
+class Trace:
+    def __init__(self, job):
+        self.job = job
+        self.started = datetime.now()
+        self.trace_id = f"{self.started.strftime('%Y%m%d-%H%M%S-%f')}-{job}"
+        self.spans = []
+        self.result = None
+
+    def add_span(self, name, start, duration, **args):
+        self.spans.append({"name": name, "start": start,
+                          "duration": duration, "args": args})
+
+    def phases(self):
+        # Total time per phase; a phase like state persistence can occur
+        # several times in one run
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = round(
+                totals.get(span["name"], 0) + span["duration"], 6)
+        return totals
+
+    def to_record(self):
+        return {"trace_id": self.trace_id, "job": self.job, "started": self.started.isoformat(),
+                "result": self.result, "phases": self.phases(), "spans": self.spans}
+
+
+class Tracer:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._traces = {}
+        self._loaded_from = None
+        self._stale_lines = 0
+        self._job_rows = {}
+        self._row_names = {}
+        self._exported_rows = (None, set())
+
+    def traces_path(self):
+        return os.path.join(get_run_logs_dir(), TRACES_FILE_NAME)
+
+    def current(self):
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def trace(self, job):
+        trace = Trace(job)
+        self._local.trace = trace
+        started = time.perf_counter()
+        try:
+            yield trace
+        finally:
+            self._local.trace = None
+            trace.add_span("total", trace.started.timestamp(),
+                           time.perf_counter() - started)
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter() - started
+            trace = self.current()
+            if trace is not None:
+                trace.add_span(name, start, duration, **args)
+            elif duration >= SLOW_LOOP_SPAN:
+                self._export([self._chrome_event(
+                    "daemon", name, start, duration, args)])
+
+    def _finish(self, trace):
+        record = trace.to_record()
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                traces = self._traces.setdefault(trace.job, deque(
+                    maxlen=MAX_TRACES_PER_JOB))
+                if len(traces) == traces.maxlen:
+                    self._stale_lines += 1
+                traces.append(record)
+                # A job skipped before its first rclone run has no runs dir yet
+                os.makedirs(os.path.dirname(self.traces_path()), exist_ok=True)
+                if self._stale_lines >= COMPACT_AFTER_STALE_LINES:
+                    self._rewrite()
+                else:
+                    with open(self.traces_path(), 'a') as f:
+                        f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                log_error(f"Error writing trace of {trace.job}: {str(e)}")
+        self._export([self._chrome_event(trace.job, span["name"], span["start"], span["duration"],
+                                         dict(span["args"], trace_id=trace.trace_id))
+                      for span in trace.spans])
+
+    def _ensure_loaded(self):
+        # Called for every job in a status report: compare the log file
+        # setting the path derives from rather than build the path each time
+        log_file_path = config._config.log_file_path
+        if self._loaded_from == log_file_path:
+            return
+        path = self.traces_path()
+        self._traces = {}
+        self._loaded_from = log_file_path
+        self._stale_lines = 0
+        if not os.path.exists(path):
+            return
+
+        dropped = 0
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    traces = self._traces.setdefault(
+                        record["job"], deque(maxlen=MAX_TRACES_PER_JOB))
+                except (ValueError, KeyError, TypeError):
+                    dropped += 1
+                    continue
+                if len(traces) == traces.maxlen:
+                    dropped += 1
+                traces.append(record)
+        if dropped:
+            self._rewrite()
+
+    def _rewrite(self):
+        path = self.traces_path()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for traces in self._traces.values():
+                for record in traces:
+                    f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, path)
+        self._stale_lines = 0
+
+    def traces(self, job_key):
+        with self._lock:
+            try:
+                self._ensure_loaded()
+            except OSError as e:
+                log_error(f"Error reading traces: {str(e)}")
+            return list(self._traces.get(job_key, ()))
+
+    def last_phases(self, job_key):
+        traces = self.traces(job_key)
+        return traces[-1]["phases"] if traces else None
+
+    def _chrome_event(self, row, name, start, duration, args):
+        # Complete ("X") events, one row per job in the viewer
+        tid = self._job_rows.setdefault(row, len(self._job_rows) + 1)
+        self._row_names[tid] = row
+        return {"name": name, "cat": "daemon" if row == "daemon" else "sync", "ph": "X",
+                "ts": int(start * 1e6), "dur": int(duration * 1e6),
+                "pid": os.getpid(), "tid": tid,
+                "args": args}
+
+    def _export(self, events):
+        export_dir = config._config.trace_export_dir if config._config else None
+        if not export_dir or not events:
+            return
+        path = os.path.join(
+            os.path.expanduser(export_dir), f"trace-{datetime.now().strftime('%Y-%m-%d')}.json")
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # The JSON array format may be left unterminated, so events
+                # are appended without rewriting the file
+                new_file = not os.path.exists(path)
+                exported_path, named_rows = self._exported_rows
+                if exported_path != path or new_file:
+                    named_rows = set()
+                    self._exported_rows = (path, named_rows)
+                with open(path, 'a') as f:
+                    if new_file:
+                        f.write("[\n")
+                    for event in events:
+                        if event["tid"] not in named_rows:
+                            named_rows.add(event["tid"])
+                            f.write(json.dumps({"name": "thread_name", "ph": "M", "pid": event["pid"],
+                                                "tid": event["tid"], "args": {"name": self._row_names[event["tid"]]}}) + ",\n")
+                        f.write(json.dumps(event) + ",\n")
+            except OSError as e:
+                log_error(f"Error exporting trace to {path}: {str(e)}")
+
+
+tracer = Tracer()
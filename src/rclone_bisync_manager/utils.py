@@ -6,18 +6,26 @@ import hashlib
 import psutil
 from rclone_bisync_manager.logging_utils import log_message, log_error
 from rclone_bisync_manager.config import config
+from rclone_bisync_manager.circuit_breaker import circuit_breakers
 import fcntl
 import errno
 
 
-def is_cpulimit_installed():
-    return shutil.which('cpulimit') is not None
+def run_preflight_lsf(path):
+    # A hung mount or a dead connection must not block the daemon, so the
+    # listing gets the watchdog's preflight timeout; returns the result, or
+    # None if rclone was killed after the timeout
+    timeout = config._config.watchdog.preflight_timeout_seconds
+    try:
+        return subprocess.run(['rclone', 'lsf', path], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        log_error(f"rclone lsf {path} did not finish within {timeout}s")
+        return None
 
 
 def check_local_rclone_test(local_path):
-    result = subprocess.run(['rclone', 'lsf', local_path],
-                            capture_output=True, text=True)
-    if result.returncode != 0:
+    result = run_preflight_lsf(local_path)
+    if result is None or result.returncode != 0:
         log_error(f"Local rclone test failed for {local_path}")
         return False
     if config.rclone_test_file_name not in result.stdout:
@@ -28,11 +36,20 @@ def check_local_rclone_test(local_path):
 
 
 def check_remote_rclone_test(remote_path):
-    result = subprocess.run(['rclone', 'lsf', remote_path],
-                            capture_output=True, text=True)
+    result = run_preflight_lsf(remote_path)
+    remote = remote_path.split(':', 1)[0]
+    if result is None:
+        log_error(f"Remote rclone test failed for {remote_path}")
+        circuit_breakers.record_failure(
+            remote, f"rclone lsf timed out after {config._config.watchdog.preflight_timeout_seconds}s")
+        return False
     if result.returncode != 0:
         log_error(f"Remote rclone test failed for {remote_path}")
+        error = result.stderr.strip().splitlines()
+        circuit_breakers.record_failure(
+            remote, error[-1] if error else f"rclone lsf exited with code {result.returncode}")
         return False
+    circuit_breakers.record_success(remote)
     if config.rclone_test_file_name not in result.stdout:
         log_message(f"{config.rclone_test_file_name} file not found in {
                     remote_path}. To add it run 'rclone touch \"{remote_path}/{config.rclone_test_file_name}\"'")
@@ -0,0 +1,208 @@
+import os
+import time
+import signal
+import threading
+
+import psutil
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import log_message, log_error
+from rclone_bisync_manager.cpu_limit import active_processes
+from rclone_bisync_manager.admission import admission
+from rclone_bisync_manager.events import event_bus, RUN_CANCELLED
+
+# Watchdog for running rclone processes. A run is cancelled when it exceeds
+# the job's max_runtime_minutes, when it stalls (neither reads anything nor
+# writes output for stall_minutes), on the CANCEL command and once the daemon
+# is shutting down (the watchdog thread reacts to the flag, so nothing is
+# done in the signal handler).
+# Cancelling sends SIGINT, which lets rclone bisync finish cleanly and release
+# its lock file, and SIGKILL if rclone is still running after the grace
+# period. A job that is cancelled stays cancelled until it ends, so a resync
+# isn't followed by the bisync.
+#
+# Progress is what rclone reads (rchar, which includes network reads) plus
+# its output; a run suspended by admission control doesn't stall.
+
+CHECK_INTERVAL = 1
+# Cancel reasons; only stalled runs are worth a retry
+CANCELLED = "cancelled"
+SHUTDOWN = "shutdown"
+MAX_RUNTIME = "max_runtime"
+STALLED = "stalled"
+
+
+def _read_chars(process):
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            total += proc.io_counters().read_chars
+        except (psutil.Error, AttributeError):
+            continue
+    return total
+
+
+class WatchedRun:
+    def __init__(self, job, pid, output_file):
+        self.job = job
+        self.pid = pid
+        self.output_file = output_file
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.progress = None
+        self.signalled_at = None
+        self.killed = False
+        try:
+            self.process = psutil.Process(pid)
+        except psutil.Error:
+            self.process = None
+
+    def sample_progress(self):
+        try:
+            output_size = os.path.getsize(self.output_file)
+        except OSError:
+            output_size = 0
+        try:
+            read_chars = _read_chars(self.process) if self.process else 0
+        except psutil.Error:
+            read_chars = 0
+        progress = (output_size, read_chars)
+        if progress != self.progress:
+            self.progress = progress
+            self.last_progress = time.monotonic()
+
+
+class RunWatchdog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+        # Job key -> why the job was cancelled
+        self._cancelled = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def settings(self):
+        return config._config.watchdog
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='run-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _limits(self, job_key):
+        settings = self.settings()
+        job = config._config.sync_jobs.get(job_key)
+        max_runtime = job.max_runtime_minutes if job and job.max_runtime_minutes is not None \
+            else settings.max_runtime_minutes
+        stall = job.stall_minutes if job and job.stall_minutes is not None else settings.stall_minutes
+        return max_runtime, stall
+
+    def end_job(self, job_key):
+        with self._lock:
+            self._cancelled.pop(job_key, None)
+
+    def watch(self, job_key, pid, output_file):
+        run = WatchedRun(job_key, pid, output_file)
+        with self._lock:
+            self._runs[job_key] = run
+            reason = self._cancelled.get(job_key)
+        if reason is not None:
+            self._signal(run)
+
+    def finish(self, job_key):
+        # Returns why the job's last run was cancelled, if it was
+        with self._lock:
+            run = self._runs.pop(job_key, None)
+            return self._cancelled.get(job_key) if run is not None else None
+
+    def cancel(self, job_key, reason=CANCELLED):
+        # False if the job isn't running
+        with self._lock:
+            if job_key != config.currently_syncing:
+                return False
+            if job_key in self._cancelled:
+                return True
+            self._cancelled[job_key] = reason
+            run = self._runs.get(job_key)
+        log_message(f"Cancelling sync job {job_key} ({reason})")
+        event_bus.publish(RUN_CANCELLED, job=job_key, reason=reason)
+        if run is not None:
+            self._signal(run)
+        return True
+
+    def kill_all(self):
+        # Last resort before the daemon exits, so no rclone is left orphaned
+        for pid in list(active_processes):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                log_error(f"Killed rclone process {pid} on shutdown")
+            except OSError:
+                continue
+
+    def _signal(self, run):
+        with self._lock:
+            if run.signalled_at is not None:
+                return
+            run.signalled_at = time.monotonic()
+        try:
+            # A run suspended by admission control has to run to react
+            os.kill(run.pid, signal.SIGCONT)
+            os.kill(run.pid, signal.SIGINT)
+        except OSError:
+            pass
+
+    def _run(self):
+        while not self._stop_event.wait(CHECK_INTERVAL):
+            try:
+                self.check()
+            except Exception as e:
+                log_error(f"Run watchdog check failed: {str(e)}")
+
+    def check(self):
+        job = config.currently_syncing
+        if config.shutting_down and job is not None:
+            self.cancel(job, SHUTDOWN)
+        suspended = set(admission.suspended_runs())
+        now = time.monotonic()
+        with self._lock:
+            runs = list(self._runs.values())
+        for run in runs:
+            if run.pid not in active_processes:
+                continue
+            if run.signalled_at is not None:
+                if not run.killed and now - run.signalled_at >= self.settings().grace_seconds:
+                    log_error(f"rclone for {run.job} did not stop within "
+                              f"{self.settings().grace_seconds}s of SIGINT, killing it")
+                    run.killed = True
+                    try:
+                        os.kill(run.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                continue
+
+            max_runtime, stall = self._limits(run.job)
+            if run.pid in suspended:
+                run.last_progress = now
+            else:
+                run.sample_progress()
+            if max_runtime is not None and now - run.started >= max_runtime * 60:
+                log_error(f"Sync job {run.job} exceeded its maximum runtime of {max_runtime} minutes")
+                self.cancel(run.job, MAX_RUNTIME)
+            elif stall is not None and now - run.last_progress >= stall * 60:
+                log_error(f"Sync job {run.job} made no progress for {stall} minutes")
+                self.cancel(run.job, STALLED)
+
+    def status(self):
+        with self._lock:
+            return dict(self._cancelled)
+
+
+run_watchdog = RunWatchdog()
@@ -20,6 +20,8 @@ import queue
 from queue import Queue
 from threading import Thread, Lock
 from rclone_bisync_manager_tray.config_editor import edit_config
+from rclone_bisync_manager.status_snapshot import read_status_file
+from rclone_bisync_manager.control_protocol import ControlClient, ControlError, send_command
 import sys
 from pystray import MenuItem as item
 # os.environ['PYSTRAY_BACKEND'] = 'gtk'  # or 'qt'
@@ -30,6 +32,7 @@ update_queue = queue.Queue()
 icon = None
 last_status = None
 last_offline_log_time = 0
+live_status = None
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG,
@@ -141,7 +144,9 @@ class DaemonManager:
                 job.get("hash_warnings", False)
                 for job in status.get("sync_jobs", {}).values()
             ) or
-            bool(status.get("sync_errors"))
+            bool(status.get("sync_errors")) or
+            bool(status.get("job_file_errors")) or
+            bool(get_open_breakers(status))
         )
 
     def get_menu_items(self, status):
@@ -234,6 +239,10 @@ class DaemonManager:
                 items.append(pystray.MenuItem(
                     "⚠️ Config changed on disk", None, enabled=False))
 
+            for remote, breaker in get_open_breakers(status).items():
+                items.append(pystray.MenuItem(
+                    f"⚠ Remote {remote} unreachable{format_probe_time(breaker)}", None, enabled=False))
+
             if self._has_sync_issues(status) or status.get("config_changed_on_disk"):
                 items.append(pystray.Menu.SEPARATOR)
 
@@ -268,6 +277,10 @@ class DaemonManager:
                             "⚡ Force Sync Now", create_sync_now_handler(job_key, force_bisync=True)),
                         pystray.MenuItem(
                             "⚡ Resync + Sync Now", create_sync_now_handler(job_key, resync=True)),
+                        pystray.MenuItem(
+                            "Show Last Run Log", create_show_run_log_handler(job_key)),
+                        pystray.MenuItem(
+                            "Show Last Failed Run Log", create_show_run_log_handler(job_key, "failed")),
                         pystray.MenuItem(
                             f"Last sync: {job_status['last_sync'] or 'Never'}", None, enabled=False),
                         pystray.MenuItem(
@@ -337,31 +350,43 @@ class DaemonManager:
             return "RUN"
 
     def get_config_file_path(self):
-        status = get_daemon_status()
+        status = get_daemon_status(fields=["config_file_location"])
         if status and isinstance(status, dict):
             return status.get('config_file_location')
         return None
 
 
-def get_daemon_status():
+def get_open_breakers(status):
+    return {remote: breaker for remote, breaker in (status.get("circuit_breakers") or {}).items()
+            if breaker.get("state") != "closed"}
+
+
+def format_probe_time(breaker):
+    if breaker.get("state") == "half_open" or not breaker.get("probe_after"):
+        return " (probing)"
+    return f" (retry at {breaker['probe_after'][11:19]})"
+
+
+def get_daemon_status(fields=None):
     global last_status, last_offline_log_time
-    socket_path = '/tmp/rclone_bisync_manager_status.sock'
+    # While subscribed, the pushed status is always current
+    if live_status is not None:
+        return live_status
+    if fields is not None:
+        # Fields the daemon publishes in its snapshot file need no request
+        snapshot = read_status_file()
+        if snapshot is not None and all(field in snapshot for field in fields):
+            return {field: snapshot[field] for field in fields}
+    if fields is not None:
+        # A projected query for callers that only need a few fields
+        try:
+            return send_command("STATUS", fields=fields)
+        except Exception as e:
+            log_message(f"Error communicating with daemon: {
+                        str(e)}", level=logging.DEBUG)
+            return None
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.settimeout(5)  # Set a timeout of 5 seconds
-        client.connect(socket_path)
-        client.sendall(b"STATUS")
-
-        chunks = []
-        while True:
-            chunk = client.recv(4096)
-            if not chunk:
-                break
-            chunks.append(chunk)
-        response = b''.join(chunks).decode()
-
-        status = json.loads(response)
-        client.close()
+        status = send_command("STATUS")
 
         if status != last_status:
             log_message("Daemon status changed", level=logging.INFO)
@@ -394,14 +419,28 @@ def create_sync_now_handler(job_key, force_bisync=False, resync=False):
     return handler
 
 
+def create_show_run_log_handler(job_key, selector="last"):
+    def handler(item):
+        try:
+            response = send_command("RUN_LOG", job=job_key, selector=selector)
+        except ControlError as e:
+            show_notification("Run Log", str(e))
+            return
+        except Exception as e:
+            log_message(f"Error fetching run log: {
+                        str(e)}", level=logging.ERROR)
+            show_notification("Run Log", f"Could not fetch the run log for '{
+                              job_key}'.")
+            return
+        run = response["run"]
+        show_text_window(f"{job_key} - {run['operation']} {run['run_id']} (exit code {run['exit_code']})",
+                         response["log"])
+    return handler
+
+
 def stop_daemon():
-    socket_path = '/tmp/rclone_bisync_manager_status.sock'
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect(socket_path)
-        client.sendall(b"STOP")
-        response = client.recv(1024).decode()
-        client.close()
+        send_command("STOP")
         log_message(
             "Daemon is shutting down. Use 'daemon status' to check progress.")
 
@@ -415,7 +454,7 @@ def start_daemon():
     global daemon_manager
     log_message("Starting daemon", level=logging.DEBUG)
     # First, check if the daemon is already running
-    current_status = get_daemon_status()
+    current_status = get_daemon_status(fields=["running"])
     if current_status is not None:
         log_message("Daemon is already running", level=logging.INFO)
         daemon_manager.update_state(DaemonState.RUNNING)
@@ -475,41 +514,31 @@ def start_daemon():
 
 def reload_config():
     global daemon_manager, icon
-    socket_path = '/tmp/rclone_bisync_manager_status.sock'
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect(socket_path)
-        client.sendall(b"RELOAD")
-        response = client.recv(1024).decode()
-        client.close()
-
         try:
-            response_data = json.loads(response)
-            if response_data["status"] == "success":
-                log_message("Configuration reloaded successfully")
-            else:
-                log_message(f"Error reloading configuration: {
-                            response_data['message']}", level=logging.ERROR)
+            send_command("RELOAD", timeout=60)
+            log_message("Configuration reloaded successfully")
+            success = True
+        except ControlError as e:
+            log_message(f"Error reloading configuration: {
+                        str(e)}", level=logging.ERROR)
+            success = False
+
+        current_status = get_daemon_status()
+        new_menu = pystray.Menu(
+            *daemon_manager.get_menu_items(current_status))
+        new_icon = create_status_image(
+            daemon_manager.get_icon_color(current_status),
+            daemon_manager.get_icon_text(current_status),
+            style=args.icon_style,
+            thickness=args.icon_thickness
+        )
 
-            current_status = get_daemon_status()
-            new_menu = pystray.Menu(
-                *daemon_manager.get_menu_items(current_status))
-            new_icon = create_status_image(
-                daemon_manager.get_icon_color(current_status),
-                daemon_manager.get_icon_text(current_status),
-                style=args.icon_style,
-                thickness=args.icon_thickness
-            )
-
-            icon.menu = new_menu
-            icon.icon = new_icon
-            icon.update_menu()
-
-            return response_data["status"] == "success"
-        except json.JSONDecodeError:
-            log_message(f"Error: Invalid JSON response from daemon: {
-                        response}", level=logging.ERROR)
-            return False
+        icon.menu = new_menu
+        icon.icon = new_icon
+        icon.update_menu()
+
+        return success
     except Exception as e:
         log_message(f"Error communicating with daemon: {
                     str(e)}", level=logging.ERROR)
@@ -517,24 +546,11 @@ def reload_config():
 
 
 def add_to_sync_queue(job_key, force_bisync=False, resync=False):
-    socket_path = '/tmp/rclone_bisync_manager_add_sync.sock'
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect(socket_path)
-        client.sendall(json.dumps(
-            {"job_key": job_key, "force_bisync": force_bisync, "resync": resync}).encode())
-
-        chunks = []
-        while True:
-            chunk = client.recv(4096)
-            if not chunk:
-                break
-            chunks.append(chunk)
-        response = b''.join(chunks).decode()
-
-        client.close()
+        result = send_command("ADD_SYNC", job_key=job_key,
+                              force_bisync=force_bisync, resync=resync)
         log_message(f"Add to sync queue response: {
-                    response}", level=logging.INFO)
+                    result['message']}", level=logging.INFO)
 
         # Trigger an immediate update of the menu and icon
         update_queue.put(True)
@@ -693,6 +709,14 @@ def show_status_window():
             ttk.Label(general_frame, text="None").pack(
                 anchor='w', padx=20, pady=(0, 5))
 
+        open_breakers = get_open_breakers(status)
+        if open_breakers:
+            ttk.Label(general_frame, text="Unreachable remotes:").pack(
+                anchor='w', padx=5, pady=(5, 0))
+            for remote, breaker in open_breakers.items():
+                ttk.Label(general_frame, text=f"{remote}{format_probe_time(breaker)}: {
+                          breaker.get('last_error')}", foreground="red").pack(anchor='w', padx=20, pady=(0, 2))
+
         jobs_frame = ttk.Frame(notebook)
         notebook.add(jobs_frame, text='Sync Jobs')
 
@@ -806,12 +830,12 @@ def open_log_folder():
 
 
 def get_config_file_path():
-    status = get_daemon_status()
+    status = get_daemon_status(fields=["config_file_location"])
     return status.get('config_file_location')
 
 
 def get_log_file_path():
-    status = get_daemon_status()
+    status = get_daemon_status(fields=["log_file_location"])
     return status.get('log_file_location')
 
 
@@ -838,7 +862,7 @@ def ensure_daemon_running():
     timeout = 30  # Timeout in seconds
     interval = 1  # Check interval in seconds
 
-    status = get_daemon_status()
+    status = get_daemon_status(fields=["running"])
     if status is not None:
         log_message("Daemon is already running", level=logging.INFO)
         return True
@@ -857,7 +881,7 @@ def ensure_daemon_running():
     while elapsed_time < timeout:
         log_message(f"Checking daemon status: Elapsed time {
                     elapsed_time}s", level=logging.DEBUG)
-        status = get_daemon_status()
+        status = get_daemon_status(fields=["running"])
         if status is not None:
             log_message("Daemon started successfully", level=logging.INFO)
             return True
@@ -985,7 +1009,10 @@ def update_menu_and_icon():
 
 
 def check_status_and_update():
-    global daemon_manager
+    # Keeps a SUBSCRIBE connection open while the daemon runs, so status
+    # changes arrive as they happen and an idle daemon costs nothing. Only
+    # while the daemon is offline do we retry once a second.
+    global daemon_manager, live_status
     last_status = None
     while True:
         try:
@@ -999,22 +1026,25 @@ def check_status_and_update():
                                 current_state.name}", level=logging.ERROR)
                     log_message(f"Crash message: {
                                 crash_message}", level=logging.ERROR)
+                time.sleep(1)
                 continue
 
+            try:
+                with ControlClient() as client:
+                    for event, current_status in client.subscribe():
+                        live_status = current_status
+                        if event is not None:
+                            log_message(f"Daemon event: {event['event']} {
+                                        event['data']}", level=logging.DEBUG)
+                        handle_status_change(current_status, last_status)
+                        last_status = current_status
+            except (OSError, ControlError) as e:
+                log_message(f"Status subscription ended: {
+                            e}", level=logging.DEBUG)
+
+            live_status = None
             current_status = get_daemon_status()
-            current_state = daemon_manager.get_current_state(current_status)
-
-            # Update the daemon manager state
-            state_changed = daemon_manager.update_state(current_state)
-
-            # Check if the status or state has changed
-            if current_status != last_status or state_changed:
-                log_message(
-                    "Status or state changed. Updating menu and icon.", level=logging.INFO)
-                log_message(f"New status: {
-                            current_status}", level=logging.DEBUG)
-                update_queue.put(True)
-
+            handle_status_change(current_status, last_status)
             last_status = current_status
 
         except Exception as e:
@@ -1026,6 +1056,21 @@ def check_status_and_update():
         time.sleep(1)
 
 
+def handle_status_change(current_status, last_status):
+    current_state = daemon_manager.get_current_state(current_status)
+
+    # Update the daemon manager state
+    state_changed = daemon_manager.update_state(current_state)
+
+    # Check if the status or state has changed
+    if current_status != last_status or state_changed:
+        log_message(
+            "Status or state changed. Updating menu and icon.", level=logging.INFO)
+        log_message(f"New status: {
+                    current_status}", level=logging.DEBUG)
+        update_queue.put(True)
+
+
 def handle_updates():
     while True:
         try:
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# The daemon's singletons pick their paths from the XDG directories when they
+# are imported, so point those at a scratch directory first
+_xdg_root = tempfile.mkdtemp(prefix='rclone-bisync-manager-tests-')
+for _variable in ('XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_STATE_HOME'):
+    os.environ[_variable] = os.path.join(_xdg_root, _variable.lower())
+    os.makedirs(os.path.join(os.environ[_variable], 'rclone-bisync-manager'), exist_ok=True)
+
+from rclone_bisync_manager.config import config  # noqa: E402
+from rclone_bisync_manager.sync_queue import SyncQueue  # noqa: E402
+from rclone_bisync_manager.circuit_breaker import circuit_breakers  # noqa: E402
+
+JOB_TEMPLATE = """\
+  {key}:
+    local: {key}
+    rclone_remote: {remote}
+    remote: path/{key}
+    schedule: '0 * * * *'
+"""
+
+
+def make_args(**overrides):
+    args = {"dry_run": False, "console_log": False, "command": "daemon"}
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+def write_config(directory, extra="", jobs=("job1",), remote="remote"):
+    path = os.path.join(directory, 'config.yaml')
+    with open(path, 'w') as f:
+        f.write(f"local_base_path: {directory}\n")
+        f.write(f"log_file_path: {os.path.join(directory, 'logs', 'manager.log')}\n")
+        f.write(extra)
+        f.write("sync_jobs:\n")
+        for key in jobs:
+            f.write(JOB_TEMPLATE.format(key=key, remote=remote))
+    return path
+
+
+@pytest.fixture
+def daemon_config(tmp_path, monkeypatch):
+    # A fresh daemon configuration with its own cache dir; returns a function
+    # that (re)loads the config file with extra global options and jobs
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    os.makedirs(tmp_path / 'cache' / 'rclone-bisync-manager')
+
+    def load(extra="", jobs=("job1",), remote="remote"):
+        path = write_config(str(tmp_path), extra, jobs, remote)
+        config.set_config_file(path)
+        config.load_and_validate_config(make_args())
+        config.in_limbo = False
+        return config
+
+    config._config = None
+    config.active_config_key = None
+    config._parse_cache.clear()
+    config.sync_queue = SyncQueue()
+    config.currently_syncing = None
+    config.current_sync_manual = False
+    config.shutting_down = False
+    config.running = True
+    circuit_breakers._breakers.clear()
+    yield load
+    config.shutting_down = False
+    config.currently_syncing = None
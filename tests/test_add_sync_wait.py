@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from rclone_bisync_manager.control_protocol import FRAME_HEADER
+from rclone_bisync_manager.daemon_functions import cancel_sync, remove_from_sync_queue
+from rclone_bisync_manager.status_server import stream_add_sync
+
+
+class FrameWriter:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data):
+        (length,) = FRAME_HEADER.unpack(data[:FRAME_HEADER.size])
+        self.frames.append(json.loads(data[FRAME_HEADER.size:FRAME_HEADER.size + length]))
+
+    async def drain(self):
+        pass
+
+
+async def wait_for_frames(writer, count):
+    while len(writer.frames) < count:
+        await asyncio.sleep(0.01)
+
+
+def run_wait(remove):
+    writer = FrameWriter()
+
+    async def scenario():
+        task = asyncio.create_task(stream_add_sync(
+            1, {"jobs": ["job1", "job2"], "wait": True}, writer, asyncio.Lock()))
+        await asyncio.wait_for(wait_for_frames(writer, 1), 5)
+        remove()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(scenario())
+    return writer.frames
+
+
+def test_wait_ends_when_queued_jobs_are_removed(daemon_config):
+    daemon_config(jobs=("job1", "job2"))
+
+    frames = run_wait(lambda: (remove_from_sync_queue("job1"), remove_from_sync_queue("job2")))
+
+    assert frames[0]["result"]["waiting"] == ["job1", "job2"]
+    assert [frame["data"]["result"] for frame in frames[1:3]] == ["REMOVED", "REMOVED"]
+    batch = frames[-1]
+    assert batch["event"] == "batch_finished"
+    assert not batch["data"]["succeeded"]
+
+
+def test_wait_ends_when_a_queued_job_is_cancelled(daemon_config):
+    daemon_config(jobs=("job1", "job2"))
+
+    frames = run_wait(lambda: (cancel_sync("job1"), cancel_sync("job2")))
+
+    assert {frame["data"]["job"]: frame["data"]["result"] for frame in frames[1:3]} == {
+        "job1": "CANCELLED", "job2": "CANCELLED"}
+    assert frames[-1]["event"] == "batch_finished"
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from rclone_bisync_manager import admission as admission_module
+from rclone_bisync_manager.admission import admission, MB
+from rclone_bisync_manager.daemon_functions import add_to_sync_queue, process_sync_queue
+from rclone_bisync_manager.events import event_bus, QUEUE_CHANGED
+from rclone_bisync_manager.scheduler import QueuedSync
+
+ADMISSION = "admission:\n  enabled: true\n  max_deferral_minutes: 60\n"
+
+
+@pytest.fixture
+def controller(daemon_config, monkeypatch):
+    monkeypatch.setattr(admission_module.psutil, "virtual_memory",
+                        lambda: SimpleNamespace(available=64 * 1024 * MB))
+    admission.deferred.clear()
+    admission.pressure = None
+    yield daemon_config
+    admission.deferred.clear()
+    admission.pressure = None
+
+
+@pytest.fixture
+def queue_events():
+    events = []
+
+    def collect(event):
+        if event["event"] == QUEUE_CHANGED:
+            events.append(event["data"])
+
+    event_bus.subscribe(collect)
+    yield events
+    event_bus.unsubscribe(collect)
+
+
+def test_pressure_defers_scheduled_but_not_manual_jobs(controller):
+    controller(ADMISSION)
+    admission.pressure = "CPU usage 95% above 80%"
+
+    assert admission.check(QueuedSync("job1")) == "CPU usage 95% above 80%"
+    assert admission.check(QueuedSync("job1", manual=True)) is None
+
+
+def test_deferred_jobs_are_released_once_the_pressure_clears(controller):
+    controller(ADMISSION)
+    admission.pressure = "on battery (50%)"
+    item = QueuedSync("job1")
+    assert admission.defer(item, admission.check(item))
+    assert admission.release_deferred() == []
+
+    admission.pressure = None
+    assert admission.release_deferred() == [item]
+    assert not admission.deferred
+
+
+def test_maximum_deferral(controller):
+    controller(ADMISSION)
+    admission.pressure = "on battery (50%)"
+    item = QueuedSync("job1")
+    admission.defer(item, admission.check(item))
+    item.deferred_since = datetime.now() - timedelta(minutes=61)
+
+    assert admission.release_deferred() == [item]
+    assert admission.check(item) is None
+
+
+def test_memory_budget(controller):
+    controller("memory_budget_mb: 512\ndefault_job_memory_mb: 256\n")
+    assert admission.memory_reason("job1") is None
+
+    controller("memory_budget_mb: 512\ndefault_job_memory_mb: 1024\n")
+    assert admission.memory_reason("job1") == \
+        "predicted peak 1.0 GiB exceeds the memory budget of 512 MiB"
+
+
+def test_memory_deferral_is_published_once(controller, queue_events):
+    controller("memory_budget_mb: 512\ndefault_job_memory_mb: 1024\n")
+    add_to_sync_queue("job1", scheduled_time=datetime.now())
+    queue_events.clear()
+
+    for _ in range(3):
+        process_sync_queue()
+
+    assert "job1" in admission.deferred
+    assert [event for event in queue_events if "deferred" in event] == [
+        {"job": "job1", "deferred": "predicted peak 1.0 GiB exceeds the memory budget of 512 MiB"}]
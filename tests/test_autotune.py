@@ -0,0 +1,73 @@
+import pytest
+
+from rclone_bisync_manager.autotune import autotuner, count_rate_limit_errors, HOLD_RUNS
+from rclone_bisync_manager.sync import get_rclone_options
+
+MB = 1024 * 1024
+LOG = """\
+2024/05/01 10:00:00 INFO  : photos/429.jpg: Copied (new)
+2024/05/01 10:00:01 INFO  : notes/rate limit notes.txt: Copied (new)
+2024/05/01 10:00:02 NOTICE: notes/throttle-valve.pdf: Skipped copy as --dry-run is set
+2024/05/01 10:00:03 ERROR : photos/a.jpg: Failed to copy: googleapi: Error 429: Too Many Requests
+2024/05/01 10:00:04 DEBUG : pacer: low level retry 1/10 (error rateLimitExceeded)
+2024/05/01 10:00:05 DEBUG : photos/b.jpg: rate limit
+"""
+
+
+@pytest.fixture
+def tuned_job(daemon_config):
+    def load(extra="", job_options=""):
+        daemon_config("autotune:\n  enabled: true\n  min_transferred_mb: 10\n" + extra)
+    return load
+
+
+def test_rate_limits_are_only_counted_in_rclone_reports(tmp_path):
+    log = tmp_path / 'run.log'
+    log.write_text(LOG)
+
+    # Only the ERROR line and the pacer's retry; not the file names
+    assert count_rate_limit_errors(str(log), 0, log.stat().st_size) == 2
+
+
+def test_aimd(tuned_job):
+    tuned_job()
+    values = lambda: (autotuner.current("job1")["transfers"], autotuner.current("job1")["checkers"])
+    assert values() == (4, 8)
+
+    autotuner.record("job1", 100 * MB, 10, 0)
+    assert values() == (5, 10)
+    # The raise made it slower: taken back
+    autotuner.record("job1", 50 * MB, 10, 0)
+    assert values() == (4, 8)
+    # and held for a while before the next raise
+    for _ in range(HOLD_RUNS):
+        autotuner.record("job1", 100 * MB, 10, 0)
+        assert values() == (4, 8)
+    autotuner.record("job1", 100 * MB, 10, 0)
+    assert values() == (5, 10)
+
+    autotuner.record("job1", 100 * MB, 10, 3)
+    assert values() == (2, 5)
+    autotuner.record("job1", 100 * MB, 10, 0)
+    assert values() == (2, 5)
+    # Too little data to say anything
+    autotuner.record("job1", MB, 10, 0)
+    assert autotuner.status("job1")["history"][-1]["decision"] == "hold"
+
+
+def test_bounds(tuned_job):
+    tuned_job("  max_transfers: 4\n  min_checkers: 6\n")
+
+    autotuner.record("job1", 100 * MB, 10, 0)
+    assert autotuner.current("job1") == {"transfers": 4, "checkers": 10}
+    autotuner.record("job1", 100 * MB, 10, 1)
+    assert autotuner.current("job1") == {"transfers": 2, "checkers": 6}
+
+
+def test_hand_set_values_win(tuned_job):
+    tuned_job("rclone_options:\n  transfers: 2\n")
+
+    options, _ = get_rclone_options({}, 'bisync', 'job1')
+    assert options["transfers"] == 2
+    assert options["checkers"] == 8
+    assert autotuner.status("job1")["hand_set"] == ["transfers"]
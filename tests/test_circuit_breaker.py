@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from rclone_bisync_manager.circuit_breaker import circuit_breakers, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def breakers(daemon_config):
+    daemon_config("circuit_breaker:\n  failure_threshold: 2\n  cooldown_minutes: 5\n  max_cooldown_minutes: 15\n")
+    return circuit_breakers
+
+
+def open_breaker(breakers):
+    breakers.record_failure("remote", "no route to host")
+    breakers.record_failure("remote", "no route to host")
+
+
+def cool_down(breakers):
+    breakers._breakers["remote"].probe_after = datetime.now() - timedelta(seconds=1)
+
+
+def test_opens_after_threshold(breakers):
+    breakers.record_failure("remote", "no route to host")
+    assert breakers.check("remote") is None
+
+    breakers.record_failure("remote", "no route to host")
+    assert "is open until" in breakers.check("remote")
+    assert breakers.check("other") is None
+    assert breakers.check("remote", manual=True) is None
+
+
+def test_success_resets_the_count(breakers):
+    breakers.record_failure("remote", "no route to host")
+    breakers.record_success("remote")
+    breakers.record_failure("remote", "no route to host")
+
+    assert breakers.check("remote") is None
+
+
+def test_half_open_lets_a_single_probe_through(breakers):
+    open_breaker(breakers)
+    cool_down(breakers)
+
+    assert breakers.check("remote") is None
+    assert breakers.status()["remote"]["state"] == HALF_OPEN
+    assert "waiting for its probe" in breakers.check("remote")
+
+
+def test_probe_outcomes(breakers):
+    open_breaker(breakers)
+    cool_down(breakers)
+    breakers.check("remote")
+    breakers.record_failure("remote", "still down")
+
+    state = breakers.status()["remote"]
+    assert state["state"] == OPEN
+    # The cool-down doubled
+    assert datetime.fromisoformat(state["probe_after"]) - datetime.fromisoformat(state["opened_at"]) \
+        == timedelta(minutes=10)
+
+    cool_down(breakers)
+    breakers.check("remote")
+    breakers.record_success("remote")
+    assert "remote" not in breakers.status()
+
+
+def test_probe_without_remote_check_reopens(breakers):
+    open_breaker(breakers)
+    cool_down(breakers)
+    breakers.check("remote")
+    # The local pre-flight check failed, the remote wasn't checked
+    breakers.end_probe("remote")
+
+    assert breakers.status()["remote"]["state"] == OPEN
+    # The next run is the probe
+    assert breakers.check("remote") is None
+    assert breakers.status()["remote"]["state"] == HALF_OPEN
+
+
+def test_rclone_runs_count(breakers):
+    breakers.record_run("remote", 5)
+    breakers.record_run("remote", 3)
+    assert breakers.check("remote") is None
+
+    breakers.record_run("remote", 5)
+    assert breakers.check("remote") is not None
+
+    breakers.record_run("remote", 0)
+    assert breakers.check("remote") is None
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from rclone_bisync_manager import config as config_module
+from rclone_bisync_manager.config import config
+from conftest import make_args, write_config
+
+
+@pytest.fixture
+def yaml_loads(monkeypatch):
+    # The first line of every YAML document parsed
+    loads = []
+    load = config_module.yaml.load
+
+    def counting_load(stream, Loader):
+        loads.append(stream.splitlines()[0] if stream else b"")
+        return load(stream, Loader=Loader)
+
+    monkeypatch.setattr(config_module.yaml, "load", counting_load)
+    return loads
+
+
+def write_jobs(directory, name, text):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), 'w') as f:
+        f.write(text)
+
+
+def test_identical_config_is_parsed_once(daemon_config, yaml_loads):
+    daemon_config()
+    first = config.build_config(make_args())
+    second = config.build_config(make_args())
+
+    assert len(yaml_loads) == 1
+    assert first == second
+    # Every build gets its own copy
+    second.sync_jobs["job1"].schedule = '*/5 * * * *'
+    assert config.build_config(make_args()).sync_jobs["job1"].schedule == '0 * * * *'
+
+    # Other CLI overrides validate to another model
+    assert config.build_config(make_args(dry_run=True)).dry_run
+    assert len(yaml_loads) == 2
+
+
+def test_parse_cache_is_bounded(daemon_config):
+    for jobs in range(1, config.parse_cache_size + 3):
+        daemon_config(jobs=[f"job{i}" for i in range(jobs)])
+
+    assert len(config._parse_cache) == config.parse_cache_size
+
+
+def test_unchanged_config_is_not_reapplied(daemon_config):
+    daemon_config()
+    active = config._config
+
+    config.load_and_validate_config(make_args())
+
+    assert config._config is active
+
+
+def test_invalid_config_is_rejected(daemon_config, tmp_path):
+    daemon_config()
+    active = config._config
+    with open(tmp_path / 'config.yaml', 'a') as f:
+        f.write("  job2:\n    local: job2\n")
+
+    with pytest.raises(ValueError):
+        config.load_and_validate_config(make_args())
+    assert config.config_invalid
+    assert config._config is active
+
+
+def test_job_files(daemon_config, tmp_path, yaml_loads):
+    jobs_dir = tmp_path / 'jobs.d'
+    write_jobs(jobs_dir, 'a.yaml', "# a\nphotos:\n  local: photos\n  rclone_remote: remote\n"
+               "  remote: photos\n  schedule: '0 * * * *'\n")
+    write_jobs(jobs_dir, 'b.yaml', "# b\nmusic:\n  local: music\n")
+    write_jobs(jobs_dir, 'c.yaml', "# c\njob1:\n  local: other\n  rclone_remote: remote\n"
+               "  remote: other\n  schedule: '0 * * * *'\n")
+    daemon_config("sync_jobs_dir: jobs.d\n")
+
+    # A broken file only disables its own jobs; the main config wins
+    assert set(config._config.sync_jobs) == {"job1", "photos"}
+    assert config._config.sync_jobs["job1"].local == "job1"
+    assert set(config.job_file_errors) == {str(jobs_dir / 'b.yaml'), str(jobs_dir)}
+
+    # Editing one file only parses that file again
+    yaml_loads.clear()
+    write_jobs(jobs_dir, 'b.yaml', "# b fixed\nmusic:\n  local: music\n  rclone_remote: remote\n"
+               "  remote: music\n  schedule: '0 * * * *'\n")
+    assert config._job_files_changed(config._config, make_args())
+    config.load_and_validate_config(make_args())
+
+    assert yaml_loads == [b"# b fixed"]
+    assert set(config._config.sync_jobs) == {"job1", "photos", "music"}
+    assert not config._job_files_changed(config._config, make_args())
+
+
+def test_rejected_config_keeps_job_model_cache(daemon_config, tmp_path, monkeypatch):
+    daemon_config(jobs=("job1", "job2"))
+    active_models = config_module._job_model_cache
+    assert len(active_models) == 2
+
+    # job3 validates fine, but the config as a whole does not
+    with pytest.raises(ValueError):
+        daemon_config("max_cpu_usage_percent: 150\n", jobs=("job1", "job3"))
+    assert config_module._job_model_cache is active_models
+
+    # Built but not applied yet
+    write_config(str(tmp_path), jobs=("job4",))
+    config.build_config(make_args())
+    assert config_module._job_model_cache is active_models
+
+    validated = []
+    validate = config_module.validate_sync_job
+    monkeypatch.setattr(config_module, "validate_sync_job",
+                        lambda key, job: validated.append(key) or validate(key, job))
+    daemon_config(jobs=("job1", "job2", "job3"))
+    assert validated == ["job3"]
+    assert len(config_module._job_model_cache) == 3
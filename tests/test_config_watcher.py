@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+
+import pytest
+
+from rclone_bisync_manager import config_watcher as config_watcher_module
+from rclone_bisync_manager.config_watcher import ConfigWatcher
+from conftest import write_config
+
+
+@pytest.fixture
+def watcher(daemon_config, monkeypatch):
+    # A watcher on the config file with a short debounce; returns the times
+    # of the change callbacks
+    monkeypatch.setattr(config_watcher_module, "DEBOUNCE_SECONDS", 0.3)
+    monkeypatch.setattr(config_watcher_module, "POLL_INTERVAL_SECONDS", 0.05)
+    config = daemon_config()
+    watcher = ConfigWatcher()
+    fired = []
+    changed = threading.Event()
+
+    def start():
+        watcher.start([config.config_file], lambda: (fired.append(time.monotonic()), changed.set()))
+        deadline = time.monotonic() + 5
+        while watcher.backend is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        time.sleep(0.1)
+        return watcher, fired, changed
+
+    yield start
+    watcher.stop()
+
+
+def save_like_an_editor(directory, jobs):
+    # Write a temporary file and rename it over the config
+    path = write_config(directory, jobs=jobs)
+    os.replace(path, path + '.new')
+    os.replace(path + '.new', path)
+
+
+def test_burst_of_writes_fires_once(watcher, tmp_path):
+    watcher, fired, changed = watcher()
+    assert watcher.backend == 'inotify'
+
+    started = time.monotonic()
+    for i in range(5):
+        time.sleep(0.1)
+        save_like_an_editor(str(tmp_path), jobs=("job1", f"job{i + 2}"))
+    last_write = time.monotonic()
+    assert changed.wait(5)
+    time.sleep(0.5)
+
+    assert len(fired) == 1
+    # Only once the burst has settled
+    assert fired[0] - last_write >= 0.3 and fired[0] - started >= 0.8
+
+    changed.clear()
+    save_like_an_editor(str(tmp_path), jobs=("job1",))
+    assert changed.wait(5)
+    assert len(fired) == 2
+
+
+def test_other_files_are_ignored(watcher, tmp_path):
+    watcher, fired, changed = watcher()
+    (tmp_path / 'notes.txt').write_text("unrelated")
+
+    assert not changed.wait(0.6)
+    assert fired == []
+
+
+def test_polling_fallback_is_debounced(watcher, tmp_path, monkeypatch):
+    def no_inotify():
+        raise OSError("inotify_init1 failed")
+
+    monkeypatch.setattr(config_watcher_module, "Inotify", no_inotify)
+    watcher, fired, changed = watcher()
+    assert watcher.backend == 'polling'
+
+    for i in range(4):
+        save_like_an_editor(str(tmp_path), jobs=("job1", f"job{i + 2}"))
+        time.sleep(0.1)
+    assert changed.wait(5)
+    time.sleep(0.5)
+    assert len(fired) == 1
+
+
+def test_callback_errors_keep_the_watcher_running(watcher, tmp_path):
+    watcher, fired, changed = watcher()
+    on_change = watcher.on_change
+
+    def failing():
+        on_change()
+        raise ValueError("broken")
+
+    watcher.on_change = failing
+    save_like_an_editor(str(tmp_path), jobs=("job2",))
+    assert changed.wait(5)
+
+    changed.clear()
+    save_like_an_editor(str(tmp_path), jobs=("job3",))
+    assert changed.wait(5)
+    assert watcher.running and len(fired) == 2
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+
+from rclone_bisync_manager.control_protocol import (
+    ControlClient, ControlError, FRAME_HEADER, MAX_FRAME_SIZE, encode_frame, is_legacy_request)
+from rclone_bisync_manager.status_server import handle_connection
+
+
+@pytest.fixture
+def control_server(daemon_config, tmp_path):
+    # The daemon's connection handler on a socket of its own
+    daemon_config()
+    path = str(tmp_path / 'control.sock')
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def start():
+        return await asyncio.start_unix_server(handle_connection, path=path)
+
+    async def stop(server):
+        server.close()
+        await server.wait_closed()
+
+    server = asyncio.run_coroutine_threadsafe(start(), loop).result(5)
+    yield path
+    asyncio.run_coroutine_threadsafe(stop(server), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(path)
+    return sock
+
+
+def read_frame(sock):
+    header = sock.recv(FRAME_HEADER.size, socket.MSG_WAITALL)
+    (length,) = FRAME_HEADER.unpack(header)
+    return json.loads(sock.recv(length, socket.MSG_WAITALL))
+
+
+@pytest.fixture
+def silent_daemon(tmp_path):
+    # Accepts connections and reads requests, but never answers
+    path = str(tmp_path / 'control.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    connections = []
+
+    def accept():
+        try:
+            while True:
+                connections.append(server.accept()[0])
+        except OSError:
+            pass
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield path
+    server.close()
+    for connection in connections:
+        connection.close()
+
+
+def test_stream_timeout(silent_daemon):
+    with ControlClient(silent_daemon) as client:
+        with pytest.raises(TimeoutError):
+            list(client.stream("ADD_SYNC", end_event="batch_finished", timeout=0.2, wait=True))
+
+
+def test_legacy_detection():
+    assert is_legacy_request(b"STAT")
+    assert is_legacy_request(b"RUN_")
+    assert not is_legacy_request(encode_frame({"id": 1, "command": "PING"})[:FRAME_HEADER.size])
+
+
+def test_pipelined_requests(control_server):
+    with connect(control_server) as sock:
+        sock.sendall(encode_frame({"id": 1, "command": "STATUS", "args": {"fields": ["running"]}}) +
+                     encode_frame({"id": 2, "command": "PING", "args": {}}) +
+                     encode_frame({"id": 3, "command": "NOPE", "args": {}}))
+        responses = {response["id"]: response for response in (read_frame(sock) for _ in range(3))}
+
+    assert responses[1]["result"]["running"] is True
+    assert responses[2] == {"id": 2, "status": "success", "result": {"pong": True}}
+    assert responses[3]["status"] == "error"
+
+
+def test_legacy_request(control_server):
+    with connect(control_server) as sock:
+        sock.sendall(b"PING")
+        sock.shutdown(socket.SHUT_WR)
+        response = b"".join(iter(lambda: sock.recv(4096), b""))
+
+    assert json.loads(response) == {"status": "success", "pong": True}
+
+
+def test_too_large_request_closes_the_connection(control_server):
+    with connect(control_server) as sock:
+        sock.sendall(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+        assert sock.recv(1) == b""
+
+
+def test_too_large_response():
+    daemon, client_sock = socket.socketpair()
+    with daemon, client_sock:
+        daemon.sendall(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+        client = ControlClient()
+        client._sock = client_sock
+        with pytest.raises(ControlError):
+            client.receive()
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+from rclone_bisync_manager import cpu_limit
+from rclone_bisync_manager.cpu_limit import cpu_limiter, run_limited, FALLBACK_NICE
+
+REPORT_LIMITS = [sys.executable, '-c',
+                 'import os; print(os.getpriority(os.PRIO_PROCESS, 0), len(os.sched_getaffinity(0)))']
+
+
+@pytest.fixture
+def cgroup_base(tmp_path, monkeypatch):
+    # A directory standing in for the daemon's delegated cgroup, or None for
+    # a system without one
+    def use(base):
+        monkeypatch.setattr(cpu_limiter, "_probed", True)
+        monkeypatch.setattr(cpu_limiter, "_cgroup_base", base)
+    return use
+
+
+def run_reporting(tmp_path, percent, on_start=None):
+    output = tmp_path / 'output'
+    with open(output, 'w') as f:
+        result = run_limited(REPORT_LIMITS, percent, on_start=on_start, stdout=f)
+    nice, cpus = map(int, output.read_text().split())
+    return result, nice, cpus
+
+
+def test_fallback_limits_apply_before_exec(tmp_path, cgroup_base):
+    cgroup_base(None)
+    result, nice, cpus = run_reporting(tmp_path, 50)
+
+    assert result.usage["limiter"] == "nice"
+    assert nice >= FALLBACK_NICE
+    assert cpus == max(1, len(os.sched_getaffinity(0)) // 2)
+
+
+def test_child_joins_its_cgroup_before_exec(tmp_path, cgroup_base):
+    cgroup_base(str(tmp_path))
+    members = {}
+
+    def on_start(pid):
+        (cgroup,) = [name for name in os.listdir(tmp_path) if name.startswith('rclone-')]
+        members[pid] = (tmp_path / cgroup / 'cgroup.procs').read_text()
+
+    result, nice, _ = run_reporting(tmp_path, 50, on_start)
+
+    assert result.usage["limiter"] == "cgroup"
+    ((pid, procs),) = members.items()
+    assert procs == str(pid)
+    assert nice < FALLBACK_NICE
+
+
+def test_failed_cgroup_move_falls_back_to_nice(tmp_path, cgroup_base, monkeypatch):
+    cgroup_base(str(tmp_path))
+    write = cpu_limit._write
+
+    def refuse_procs(path, value):
+        if path.endswith('cgroup.procs'):
+            raise PermissionError(path)
+        write(path, value)
+
+    monkeypatch.setattr(cpu_limit, "_write", refuse_procs)
+    result, nice, _ = run_reporting(tmp_path, 50)
+
+    assert result.usage["limiter"] == "nice"
+    assert nice >= FALLBACK_NICE
+
+
+def test_no_limit(tmp_path, cgroup_base):
+    cgroup_base(str(tmp_path))
+    result, nice, cpus = run_reporting(tmp_path, 100)
+
+    assert result.usage["limiter"] == "none"
+    assert cpus == len(os.sched_getaffinity(0))
+
+
+def test_usage_of_the_run_and_its_children(cgroup_base):
+    cgroup_base(None)
+    # Holds 64 MB for a few RSS samples and burns CPU in a child it waits for
+    command = [sys.executable, '-c',
+               'import time, subprocess, sys; data = bytearray(64 << 20); time.sleep(1.2); '
+               'subprocess.run([sys.executable, "-c", "sum(range(10 ** 7))"])']
+    result = run_limited(command, 100)
+
+    usage = result.usage
+    assert result.returncode == 0
+    assert usage["limiter"] == "none" and usage["limit_percent"] == 100
+    assert usage["peak_rss_bytes"] >= 64 << 20
+    assert usage["wall_seconds"] >= 1.2
+    # ru_utime/ru_stime of wait4 include the waited-for grandchild
+    assert usage["cpu_seconds"] >= 0.1
+    assert usage["cpu_percent"] == pytest.approx(
+        100 * usage["cpu_seconds"] / (usage["wall_seconds"] * len(os.sched_getaffinity(0))), abs=0.2)
@@ -0,0 +1,54 @@
+import random
+from datetime import datetime, timedelta
+
+from rclone_bisync_manager.deadlines import DeadlinePolicy, dispatch_policy
+from rclone_bisync_manager.job_stats import job_stats
+from rclone_bisync_manager.scheduler import QueuedSync
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def picked_order(policy, items, start):
+    # What popping the queue one job at a time would give
+    pending = list(items)
+    ordered = []
+    while pending:
+        item = policy.pick(pending, start)
+        pending.remove(item)
+        ordered.append(item)
+        start += timedelta(seconds=policy.duration(item))
+    return ordered
+
+
+def test_order_is_the_order_of_picks():
+    rng = random.Random(4)
+    for _ in range(200):
+        durations = {f"job{i}": rng.choice([None, 0, 10, 60, 600, 3600]) for i in range(rng.randint(1, 25))}
+        items = [QueuedSync(key, requested_at=NOW - timedelta(seconds=rng.randint(0, 600)),
+                            deadline=rng.choice([None, NOW + timedelta(seconds=rng.randint(-3600, 3600))]))
+                 for key in durations]
+        policy = DeadlinePolicy(durations.get)
+
+        assert policy.order(items, NOW) == picked_order(policy, items, NOW)
+
+
+def test_late_jobs_run_shortest_first():
+    durations = {"long": 3600, "short": 60, "future": 10}
+    items = [QueuedSync("long", requested_at=NOW, deadline=NOW - timedelta(minutes=10)),
+             QueuedSync("short", requested_at=NOW, deadline=NOW - timedelta(minutes=5)),
+             QueuedSync("future", requested_at=NOW, deadline=NOW + timedelta(minutes=30))]
+
+    ordered = DeadlinePolicy(durations.get).order(items, NOW)
+
+    assert [item.job_key for item in ordered] == ["short", "future", "long"]
+
+
+def test_policy_is_reused_until_a_duration_is_recorded(daemon_config):
+    daemon_config("queue_policy: deadline\n")
+    policy = dispatch_policy()
+    assert dispatch_policy() is policy
+
+    job_stats.record_sync("job1", 30.0)
+
+    assert dispatch_policy() is not policy
+    assert dispatch_policy().duration(QueuedSync("job1")) == 30.0
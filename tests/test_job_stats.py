@@ -0,0 +1,43 @@
+import json
+
+from rclone_bisync_manager.admission import admission
+from rclone_bisync_manager.job_stats import job_stats, PEAK_RSS_HISTORY
+
+MB = 1024 * 1024
+
+
+def usage(peak_mb, cpu_seconds=1.0):
+    return {"peak_rss_bytes": peak_mb * MB, "cpu_seconds": cpu_seconds}
+
+
+def test_peak_rss_history(daemon_config):
+    daemon_config()
+    assert job_stats.memory_status("job1") == {
+        "last_peak_rss_bytes": None, "predicted_peak_rss_bytes": None}
+
+    job_stats.record_run("job1", usage(300))
+    job_stats.record_run("job1", usage(100))
+    # A run whose peak wasn't sampled doesn't count as a light run
+    job_stats.record_run("job1", usage(0, cpu_seconds=2.5))
+
+    assert job_stats.memory_status("job1") == {
+        "last_peak_rss_bytes": 100 * MB, "predicted_peak_rss_bytes": 300 * MB}
+
+    with open(job_stats.stats_path()) as f:
+        saved = json.load(f)["job1"]
+    assert saved["peak_rss_history"] == [300 * MB, 100 * MB]
+    assert saved["last_cpu_seconds"] == 2.5
+
+    # The heavy run ages out of the history
+    for _ in range(PEAK_RSS_HISTORY):
+        job_stats.record_run("job1", usage(50))
+    assert job_stats.predicted_peak_rss("job1") == 50 * MB
+
+
+def test_memory_budget_uses_the_predicted_peak(daemon_config):
+    daemon_config("memory_budget_mb: 200\ndefault_job_memory_mb: 100\n", jobs=("job1", "job2"))
+    job_stats.record_run("job1", usage(300))
+    job_stats.record_run("job1", usage(100))
+
+    assert "predicted peak" in admission.memory_reason("job1")
+    assert admission.memory_reason("job2") is None
@@ -0,0 +1,48 @@
+import pytest
+
+from rclone_bisync_manager import daemon_functions
+from rclone_bisync_manager.config import config, signal_handler
+from rclone_bisync_manager.config_watcher import config_watcher
+from rclone_bisync_manager.daemon_functions import (
+    apply_pending_config, handle_config_file_change, update_config_watcher)
+from conftest import make_args, write_config
+
+
+@pytest.fixture
+def limbo(tmp_path, daemon_config, monkeypatch):
+    # The state daemon_main leaves the daemon in after an invalid config
+    monkeypatch.setattr(daemon_functions.scheduler, "schedule_tasks", lambda: None)
+    path = tmp_path / 'config.yaml'
+    path.write_text("sync_jobs:\n  job1:\n    local: job1\n")
+    config.set_config_file(str(path))
+    config.args = make_args()
+    with pytest.raises(ValueError):
+        config.load_and_validate_config(config.args)
+    config.in_limbo = True
+    yield path
+    config_watcher.stop()
+    config.pending_config = None
+
+
+def test_limbo_watches_the_config_and_recovers(tmp_path, limbo):
+    update_config_watcher()
+    assert config_watcher.running
+    assert config_watcher.watched_paths == [str(limbo)]
+
+    # What the watcher calls once the file has been fixed
+    write_config(str(tmp_path))
+    handle_config_file_change()
+    apply_pending_config()
+
+    assert not config.in_limbo
+    assert not config.config_invalid
+    assert list(config._config.sync_jobs) == ["job1"]
+    # auto_reload is off in the fixed config
+    assert not config_watcher.running
+
+
+def test_signals_stop_the_daemon_in_limbo(limbo):
+    signal_handler(15, None)
+
+    assert config.shutting_down
+    assert not config.running
@@ -0,0 +1,85 @@
+import os
+import gzip
+import time
+from datetime import datetime, timedelta
+
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import FileLogger
+from rclone_bisync_manager.log_rotation import (
+    should_rotate, enforce_retention, in_use_files)
+
+MB = 1024 * 1024
+
+
+def write_file(path, size, age_minutes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    mtime = time.time() - age_minutes * 60
+    os.utime(path, (mtime, mtime))
+
+
+def test_should_rotate(daemon_config):
+    settings = daemon_config(
+        "log_rotation:\n  max_size_mb: 2\n  max_age_days: 1\n")._config.log_rotation
+    now = datetime.now()
+
+    assert not should_rotate(MB, now, settings)
+    assert should_rotate(2 * MB, now, settings)
+    assert should_rotate(10, now - timedelta(days=1, minutes=1), settings)
+    # An empty file is not rotated for its age, nor one of unknown age
+    assert not should_rotate(0, now - timedelta(days=2), settings)
+    assert not should_rotate(10, None, settings)
+    assert not should_rotate(100 * MB, now, None)
+
+
+def test_manager_log_is_rotated_and_compressed(daemon_config, tmp_path):
+    daemon_config("log_rotation:\n  max_size_mb: 1\n")
+    path = tmp_path / 'manager.log'
+    # Rotation is checked after each batch written
+    file_logger = FileLogger(str(path), flush_interval=0.05, max_batch_size=100)
+    try:
+        for i in range(1500):
+            file_logger.info(f"{i:04d} " + "x" * 1000)
+        file_logger.flush()
+    finally:
+        file_logger.close()
+
+    deadline = time.monotonic() + 5
+    while in_use_files and time.monotonic() < deadline:
+        time.sleep(0.01)
+    rotated = [name for name in os.listdir(tmp_path)
+               if name.startswith('manager.log.')]
+    assert len(rotated) == 1 and rotated[0].endswith('.gz')
+
+    with gzip.open(tmp_path / rotated[0], 'rt') as f:
+        segment = f.read().splitlines()
+    with open(path) as f:
+        current = f.read().splitlines()
+    assert segment[0].endswith(" - INFO - 0000 " + "x" * 1000)
+    assert len(segment) + len(current) == 1500
+    assert current[-1].endswith(" - INFO - 1499 " + "x" * 1000)
+    assert os.path.getsize(path) < MB
+
+
+def test_retention_removes_the_oldest_files_not_in_use(daemon_config, tmp_path):
+    settings = daemon_config("log_rotation:\n  retention_mb: 1\n")._config.log_rotation
+    log_file_path = str(tmp_path / 'logs' / 'manager.log')
+    runs_dir = str(tmp_path / 'logs' / 'runs')
+    oldest = log_file_path + '.20240101-000000.gz'
+    in_use = log_file_path + '.20240102-000000'
+    old_run = os.path.join(runs_dir, 'job1', 'old.log')
+    new_run = os.path.join(runs_dir, 'job1', 'new.log')
+    write_file(oldest, MB, 40)
+    write_file(in_use, MB, 30)
+    write_file(old_run, MB, 20)
+    write_file(new_run, MB, 10)
+    write_file(log_file_path, MB, 0)
+
+    removed = enforce_retention(log_file_path, settings.retention_mb * MB,
+                                runs_dir, protected={in_use})
+
+    # The current log is not part of the budget and files in use are skipped
+    assert removed == [oldest, old_run]
+    assert all(os.path.exists(p) for p in (in_use, new_run, log_file_path))
+    assert enforce_retention(log_file_path, 0, runs_dir) == []
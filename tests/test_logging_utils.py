@@ -0,0 +1,68 @@
+import os
+import subprocess
+
+import pytest
+
+from rclone_bisync_manager import logging_utils
+from rclone_bisync_manager.logging_utils import FileLogger
+
+
+@pytest.fixture
+def file_logger(tmp_path, monkeypatch):
+    path = tmp_path / 'manager.log'
+    file_logger = FileLogger(str(path), flush_interval=0.05)
+    monkeypatch.setattr(logging_utils, "logger", file_logger)
+    yield file_logger, path
+    file_logger.close()
+
+
+def test_spawning_with_a_preexec_fn_leaves_the_logger_alone(file_logger):
+    file_logger, path = file_logger
+    file_logger.info("before")
+    file_logger.flush()
+    handle, writer = file_logger._file, file_logger._thread
+
+    subprocess.run(['true'], preexec_fn=lambda: None, check=True)
+
+    assert file_logger._file is handle and not handle.closed
+    assert file_logger._thread is writer
+    file_logger.info("after")
+    file_logger.flush()
+    assert path.read_text().count("INFO") == 2
+
+
+# The log writer is a thread, as it is when the daemon forks
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded")
+def test_logging_after_daemonizing(file_logger):
+    file_logger, path = file_logger
+    file_logger.info("parent")
+    logging_utils.prepare_daemonize()
+    assert file_logger._file is None
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            logging_utils.restart_after_daemonize()
+            file_logger.info("child")
+            file_logger.close()
+            status = 0
+        finally:
+            os._exit(status)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    lines = path.read_text().splitlines()
+    assert [line.split(" - ")[-1] for line in lines] == ["parent", "child"]
+
+
+def test_restart_without_a_fork_keeps_one_writer(file_logger):
+    file_logger, path = file_logger
+    writer = file_logger._thread
+
+    logging_utils.prepare_daemonize()
+    logging_utils.restart_after_daemonize()
+
+    assert file_logger._thread is writer
+    file_logger.info("still logging")
+    file_logger.flush()
+    assert "still logging" in path.read_text()
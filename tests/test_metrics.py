@@ -0,0 +1,85 @@
+import asyncio
+
+from rclone_bisync_manager import metrics, status_server
+from rclone_bisync_manager.job_stats import job_stats
+from rclone_bisync_manager.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('run_seconds', 'Run time.', labels=('job',), buckets=(5, 1))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, job="photos")
+    histogram.observe(2, job="music")
+
+    assert histogram.buckets[-1] == float('inf')
+    assert histogram.render() == [
+        '# HELP run_seconds Run time.',
+        '# TYPE run_seconds histogram',
+        'run_seconds_bucket{job="photos",le="1"} 2',
+        'run_seconds_bucket{job="photos",le="5"} 3',
+        'run_seconds_bucket{job="photos",le="+Inf"} 4',
+        'run_seconds_sum{job="photos"} 14.5',
+        'run_seconds_count{job="photos"} 4',
+        'run_seconds_bucket{job="music",le="1"} 0',
+        'run_seconds_bucket{job="music",le="5"} 1',
+        'run_seconds_bucket{job="music",le="+Inf"} 1',
+        'run_seconds_sum{job="music"} 2',
+        'run_seconds_count{job="music"} 1',
+    ]
+
+
+def test_text_rendering():
+    registry = Registry()
+    counter = registry.register(Counter('exits_total', 'Exits.', labels=('job', 'code')))
+    gauge = registry.register(Gauge('queued', 'Queued jobs.'))
+    registry.register(Gauge('rss_bytes', 'RSS.', function=lambda: 1.5e9))
+    counter.inc(job='say "hi"\\\n', code=1)
+    counter.inc(2, job='say "hi"\\\n', code=1)
+    gauge.set(0.25)
+
+    assert registry.render().decode() == (
+        '# HELP exits_total Exits.\n'
+        '# TYPE exits_total counter\n'
+        'exits_total{job="say \\"hi\\"\\\\\\n",code="1"} 3\n'
+        '# HELP queued Queued jobs.\n'
+        '# TYPE queued gauge\n'
+        'queued 0.25\n'
+        '# HELP rss_bytes RSS.\n'
+        '# TYPE rss_bytes gauge\n'
+        'rss_bytes 1500000000\n')
+
+
+def scrape(socket_path, request):
+    async def fetch():
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(request)
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def scenario():
+        server, settings = await status_server.update_metrics_server(None, None)
+        try:
+            return await fetch()
+        finally:
+            await status_server.stop_metrics_server(server, settings)
+
+    return asyncio.run(scenario()).decode()
+
+
+def test_metrics_endpoint(daemon_config, tmp_path):
+    socket_path = str(tmp_path / 'metrics.sock')
+    daemon_config(f"metrics:\n  enabled: true\n  unix_socket: {socket_path}\n")
+    job_stats.record_run("job1", {"peak_rss_bytes": 1, "cpu_seconds": 1})
+    writes = metrics.state_file_writes._values[("job_stats",)]
+
+    response = scrape(socket_path, b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    head, body = response.split("\r\n\r\n", 1)
+    assert head.startswith("HTTP/1.1 200 OK\r\n")
+    assert f"Content-Type: {metrics.CONTENT_TYPE}" in head
+    assert f'rclone_bisync_manager_state_file_writes_total{{file="job_stats"}} {writes}\n' in body
+    assert "# TYPE rclone_bisync_manager_job_run_duration_seconds histogram\n" in body
+    assert "\nrclone_bisync_manager_process_resident_memory_bytes " in body
+
+    assert scrape(socket_path, b"HEAD / HTTP/1.1\r\n\r\n").endswith("\r\n\r\n")
+    assert scrape(socket_path, b"GET /other HTTP/1.1\r\n\r\n").startswith("HTTP/1.1 404 Not Found\r\n")
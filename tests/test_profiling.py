@@ -0,0 +1,65 @@
+import os
+import time
+import threading
+import tracemalloc
+
+import pytest
+
+from rclone_bisync_manager import status_server
+from rclone_bisync_manager.profiling import get_profiles_dir
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_cpu_profile(daemon_config):
+    daemon_config()
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+    worker.start()
+    try:
+        status_server.handle_profile({"action": "start", "interval": 0.005})
+        with pytest.raises(status_server.CommandError, match="already running"):
+            status_server.handle_profile({"action": "start"})
+        assert status_server.handle_profile({})["running"]
+        time.sleep(0.3)
+        result = status_server.handle_profile({"action": "stop"})
+    finally:
+        stop.set()
+        worker.join()
+
+    assert os.path.dirname(result["file"]) == get_profiles_dir()
+    assert result["samples"] > 10
+    with open(result["file"]) as f:
+        stacks = [line.rsplit(' ', 1) for line in f.read().splitlines()]
+    busy = sum(int(count) for stack, count in stacks
+               if stack.startswith('busy-worker;') and 'busy_loop (test_profiling.py' in stack)
+    assert busy > result["samples"] // 2
+    assert any(entry["function"].startswith("busy_loop ") for entry in result["top_functions"])
+
+    with pytest.raises(status_server.CommandError, match="not running"):
+        status_server.handle_profile({"action": "stop"})
+    with pytest.raises(status_server.CommandError, match="between"):
+        status_server.handle_profile({"action": "start", "interval": 5})
+
+
+def test_memory_snapshots(daemon_config):
+    daemon_config()
+    try:
+        assert status_server.handle_memsnapshot({})["started"]
+        grown = [bytearray(1024) for _ in range(1000)]
+        result = status_server.handle_memsnapshot({"limit": 5})
+    finally:
+        if tracemalloc.is_tracing():
+            status_server.handle_memsnapshot({"action": "stop"})
+
+    assert not result["started"] and len(result["top_diffs"]) <= 5
+    assert os.path.exists(result["file"])
+    top = result["top_diffs"][0]
+    assert "test_profiling.py" in top["location"] and top["size_diff"] >= 1000 * 1024
+    assert len(grown) == 1000
+
+    with pytest.raises(status_server.CommandError, match="not running"):
+        status_server.handle_memsnapshot({"action": "stop"})
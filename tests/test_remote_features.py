@@ -0,0 +1,38 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.sync import get_rclone_options
+
+NO_HASH_LIST_R = {"backend": "fake", "hashes": [], "modtime": True, "list_r": True, "change_notify": False}
+
+
+@pytest.fixture
+def probed_remote(daemon_config):
+    # Features of "remote" as if it had just been probed
+    def load(extra=""):
+        daemon_config("rclone_options:\n  compare: size,modtime,checksum\n" + extra)
+        with open(os.path.join(config.cache_dir, 'remote_features.json'), 'w') as f:
+            json.dump({"remote": {"probed_at": datetime.now().isoformat(), **NO_HASH_LIST_R}}, f)
+    return load
+
+
+def test_options_are_left_alone_by_default(probed_remote):
+    probed_remote()
+
+    options, plan = get_rclone_options({}, 'bisync', 'job1')
+    assert options["compare"] == "size,modtime,checksum"
+    assert "fast_list" not in options
+    assert plan["adjusted"] == []
+
+
+def test_options_are_tuned_when_enabled(probed_remote):
+    probed_remote("tune_remote_options: true\n")
+
+    options, plan = get_rclone_options({}, 'bisync', 'job1')
+    assert options["compare"] == "size,modtime"
+    assert "fast_list" in options
+    assert len(plan["adjusted"]) == 2
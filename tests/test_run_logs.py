@@ -0,0 +1,39 @@
+from rclone_bisync_manager import run_logs
+from rclone_bisync_manager.run_logs import RunLogIndex
+
+
+def finish_runs(index, count, size=0):
+    for _ in range(count):
+        record = index.start_run("job1", "bisync")
+        with open(record.segment, 'a') as f:
+            f.write("x" * size)
+        index.finish_run(record, 0, "COMPLETED")
+
+
+def test_index_is_compacted(daemon_config, monkeypatch):
+    daemon_config()
+    monkeypatch.setattr(run_logs, "MAX_RUNS_PER_JOB", 5)
+    monkeypatch.setattr(run_logs, "COMPACT_AFTER_STALE_LINES", 10)
+    index = RunLogIndex()
+
+    finish_runs(index, 40)
+
+    with open(index.index_path()) as f:
+        lines = len(f.readlines())
+    assert lines < 5 + 10
+    assert len(index.runs("job1")) == 5
+    assert len(RunLogIndex().runs("job1")) == 5
+
+
+def test_retention_is_not_run_after_every_run(daemon_config, monkeypatch):
+    daemon_config("log_rotation:\n  retention_mb: 1\n")
+    checks = []
+    monkeypatch.setattr(run_logs, "enforce_retention", lambda *args, **kwargs: checks.append(args))
+    index = RunLogIndex()
+
+    finish_runs(index, 10, size=1024)
+    assert len(checks) == 1
+
+    # 5% of 1 MiB
+    finish_runs(index, 1, size=60 * 1024)
+    assert len(checks) == 2
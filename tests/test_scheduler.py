@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+from croniter import croniter
+
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.scheduler import SyncScheduler
+
+
+@pytest.fixture
+def scheduler(daemon_config):
+    daemon_config("retry:\n  max_attempts: 5\n  initial_delay_seconds: 60\n  max_delay_minutes: 3\n")
+    return SyncScheduler()
+
+
+def next_cron_run():
+    return croniter('0 * * * *', datetime.now()).get_next(datetime)
+
+
+def test_retry_backoff(scheduler):
+    scheduler.schedule_task("job1", datetime.now() + timedelta(days=1))
+
+    # The third delay is capped at max_delay_minutes
+    for attempt, (low, high) in enumerate([(30, 60), (60, 120), (90, 180)], start=1):
+        before = datetime.now()
+        retry_time = scheduler.schedule_retry("job1", attempt, 1)
+        assert before + timedelta(seconds=low) <= retry_time <= datetime.now() + timedelta(seconds=high)
+        # The retry runs and fails again
+        task = scheduler.pop_next_task()
+        assert (task.scheduled_time, task.attempt) == (retry_time, attempt + 1)
+
+
+def test_retries_end_after_max_attempts(scheduler):
+    assert scheduler.schedule_retry("job1", 5, 1) is None
+    assert scheduler.retry_status("job1") == {
+        "attempt": 5, "max_attempts": 5, "exit_code": 1, "next_retry": None}
+
+
+def test_job_max_attempts(scheduler):
+    config._config.sync_jobs["job1"].max_attempts = 1
+
+    assert scheduler.schedule_retry("job1", 1, 1) is None
+
+
+def test_no_retry_after_the_next_scheduled_run(scheduler):
+    soon = datetime.now() + timedelta(seconds=10)
+    scheduler.schedule_task("job1", soon)
+
+    assert scheduler.schedule_retry("job1", 1, 1) is None
+    assert scheduler.get_next_task().scheduled_time == soon
+
+
+def test_success_drops_the_pending_retry(scheduler):
+    scheduler.schedule_retry("job1", 1, 1)
+
+    assert scheduler.clear_retry("job1")
+    task = scheduler.get_next_task()
+    assert task.attempt == 1
+    assert task.scheduled_time == next_cron_run()
+    assert scheduler.retry_status("job1") is None
+    assert not scheduler.clear_retry("job1")
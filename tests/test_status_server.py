@@ -0,0 +1,185 @@
+import json
+import asyncio
+
+import pytest
+
+from rclone_bisync_manager import status_server
+from rclone_bisync_manager.admission import admission
+from rclone_bisync_manager.control_protocol import FRAME_HEADER
+from rclone_bisync_manager.events import event_bus, QUEUE_CHANGED, JOB_FINISHED, CONFIG_RELOADED
+
+
+def cached_status():
+    response = status_server.encode_response(
+        {"id": 1, "status": "success", "result": status_server.handle_status({})})
+    return json.loads(response[status_server.FRAME_HEADER.size:])["result"]
+
+
+def test_cached_status_has_fresh_volatile_fields(daemon_config):
+    daemon_config(jobs=("job1", "job2"))
+    status = cached_status()
+    assert status["version"] == event_bus.version
+    assert set(status["sync_jobs"]) == {"job1", "job2"}
+    assert status["admission"]["pressure"] is None
+
+    # Changed without an event: the cached report is reused, but not for it
+    admission.pressure = "CPU usage 95% above 80%"
+    try:
+        status = cached_status()
+    finally:
+        admission.pressure = None
+
+    assert status["version"] == event_bus.version
+    assert status["admission"]["pressure"] == "CPU usage 95% above 80%"
+    assert set(status) == set(status_server.build_status_report())
+
+
+def test_status_if_changed(daemon_config):
+    daemon_config()
+    version = cached_status()["version"]
+
+    admission.pressure = "on battery (40%)"
+    try:
+        reply = status_server.handle_status_if_changed({"version": version})
+    finally:
+        admission.pressure = None
+    assert reply["not_modified"]
+    assert reply["version"] == version
+    assert reply["admission"]["pressure"] == "on battery (40%)"
+    assert "logger" in reply
+
+    # Pressure set by the sampler is a state change
+    admission._set_pressure("on battery (40%)")
+    try:
+        reply = status_server.handle_status_if_changed({"version": version})
+    finally:
+        admission._set_pressure(None)
+    assert isinstance(reply, status_server.RawJSON)
+    status = json.loads(reply.data)
+    assert status["version"] > version
+    assert status["admission"]["pressure"] == "on battery (40%)"
+
+
+def test_snapshot_file_rebuilds_are_coalesced(daemon_config, monkeypatch):
+    daemon_config()
+    monkeypatch.setattr(status_server, "SNAPSHOT_PUBLISH_DELAY", 0.05)
+
+    class Recorder:
+        def __init__(self):
+            self.payloads = []
+
+        def publish(self, payload):
+            self.payloads.append(json.loads(payload))
+
+    async def scenario(status_file):
+        publisher = asyncio.create_task(
+            status_server.publish_status_file(status_file))
+        await asyncio.sleep(0.01)
+        for _ in range(50):
+            event_bus.publish(QUEUE_CHANGED)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.2)
+        publisher.cancel()
+
+    status_file = Recorder()
+    asyncio.run(scenario(status_file))
+    # The initial snapshot and one for the whole burst
+    assert len(status_file.payloads) == 2
+    assert status_file.payloads[-1]["version"] == event_bus.version
+
+
+class FrameWriter:
+    def __init__(self):
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(json.loads(data[FRAME_HEADER.size:]))
+
+    async def drain(self):
+        pass
+
+
+def subscribe(publish_events, frames):
+    # Runs SUBSCRIBE until the given number of frames has been sent
+    writer = FrameWriter()
+
+    async def scenario():
+        task = asyncio.create_task(status_server.stream_events(7, writer, asyncio.Lock()))
+        while not writer.frames:
+            await asyncio.sleep(0.01)
+        publish_events()
+        while len(writer.frames) < frames:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    return writer.frames
+
+
+def test_subscribe_sends_the_changes_of_each_event(daemon_config):
+    daemon_config(jobs=("job1", "job2"))
+
+    def publish_events():
+        event_bus.publish(JOB_FINISHED, job="job2")
+        event_bus.publish(CONFIG_RELOADED)
+
+    initial, finished, reloaded = subscribe(publish_events, 3)
+
+    assert initial["id"] == 7 and initial["status"] == "success"
+    assert set(initial["result"]["sync_jobs"]) == {"job1", "job2"}
+
+    assert finished["id"] == 7 and finished["event"] == JOB_FINISHED
+    assert not finished["full"]
+    assert set(finished["changes"]["sync_jobs"]) == {"job2"}
+    assert "current_config" not in finished["changes"]
+    # The changes are taken when the frame is sent, so they may be newer
+    assert finished["changes"]["version"] >= finished["version"]
+
+    assert reloaded["event"] == CONFIG_RELOADED and reloaded["full"]
+    assert set(reloaded["changes"]["sync_jobs"]) == {"job1", "job2"}
+    assert "current_config" in reloaded["changes"]
+
+
+def test_slow_subscriber_gets_a_snapshot(daemon_config, monkeypatch):
+    daemon_config()
+    monkeypatch.setattr(status_server, "SUBSCRIBER_QUEUE_SIZE", 2)
+
+    def publish_events():
+        for _ in range(5):
+            event_bus.publish(QUEUE_CHANGED)
+
+    frames = subscribe(publish_events, 2)
+    assert len(frames) == 2
+    assert frames[1]["event"] == "snapshot" and frames[1]["full"]
+
+
+def test_projected_status(daemon_config):
+    daemon_config(jobs=("job1", "job2", "job3"))
+
+    status = status_server.handle_status({"fields": "running,errors"})
+    assert set(status) == {"version", "running"} | set(status_server.FIELD_GROUPS["errors"])
+
+    status = status_server.handle_status({"job": "job2", "job_fields": ["sync_status", "memory"]})
+    assert set(status["sync_jobs"]) == {"job2"}
+    assert set(status["sync_jobs"]["job2"]) == {"sync_status", "memory"}
+    assert "current_config" not in status
+
+    with pytest.raises(status_server.CommandError, match="Unknown sync job"):
+        status_server.handle_status({"job": "job4"})
+    with pytest.raises(status_server.CommandError, match="Unknown status field"):
+        status_server.handle_status({"fields": ["sync_jobs", "nothing"]})
+
+
+def test_status_pagination(daemon_config):
+    daemon_config(jobs=("job1", "job2", "job3"))
+
+    pages, offset = [], 0
+    while offset is not None:
+        status = status_server.handle_status({"fields": ["sync_jobs"], "offset": offset, "limit": 2})
+        assert status["jobs_total"] == 3
+        pages.append(list(status["sync_jobs"]))
+        offset = status["next_offset"]
+    assert pages == [["job1", "job2"], ["job3"]]
+
+    with pytest.raises(status_server.CommandError, match="must not be negative"):
+        status_server.handle_status({"limit": -1})
@@ -0,0 +1,75 @@
+import os
+import json
+import subprocess
+
+from rclone_bisync_manager import status_snapshot
+from rclone_bisync_manager.status_snapshot import (
+    StatusFileWriter, read_status_file, SNAPSHOT_HEADER, MIN_CAPACITY)
+
+
+def payload(**status):
+    return json.dumps({"pid": os.getpid(), **status}).encode()
+
+
+def test_publish_and_read(tmp_path):
+    path = str(tmp_path / "status.snapshot")
+    assert read_status_file(path) is None
+
+    writer = StatusFileWriter(path)
+    writer.publish(payload(version=1))
+    assert read_status_file(path)["version"] == 1
+
+    writer.publish(payload(version=2))
+    assert read_status_file(path)["version"] == 2
+    with open(path, 'rb') as f:
+        assert SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))[1] == 4
+
+    writer.close()
+    assert not os.path.exists(path)
+    assert read_status_file(path) is None
+
+
+def test_payload_outgrowing_the_file(tmp_path):
+    path = str(tmp_path / "status.snapshot")
+    writer = StatusFileWriter(path)
+    writer.publish(payload(version=1))
+    assert os.path.getsize(path) == MIN_CAPACITY
+
+    writer.publish(payload(version=2, jobs="x" * MIN_CAPACITY))
+    status = read_status_file(path)
+    assert status["version"] == 2
+    assert len(status["jobs"]) == MIN_CAPACITY
+    assert os.path.getsize(path) == 2 * MIN_CAPACITY
+
+    # The sequence carries over, so readers never see it go backwards
+    with open(path, 'rb') as f:
+        assert SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))[1] == 4
+    writer.close()
+
+
+def test_write_in_progress(tmp_path, monkeypatch):
+    path = str(tmp_path / "status.snapshot")
+    writer = StatusFileWriter(path)
+    writer.publish(payload(version=1))
+    monkeypatch.setattr(status_snapshot, "READ_RETRIES", 3)
+
+    # An odd sequence means the writer is in the middle of the payload
+    SNAPSHOT_HEADER.pack_into(
+        writer._map, 0, status_snapshot.SNAPSHOT_MAGIC, 5, 10)
+    assert read_status_file(path) is None
+
+    writer.publish(payload(version=2))
+    assert read_status_file(path)["version"] == 2
+    writer.close()
+
+
+def test_writer_gone(tmp_path):
+    path = str(tmp_path / "status.snapshot")
+    process = subprocess.Popen(['true'])
+    process.wait()
+
+    writer = StatusFileWriter(path)
+    writer.publish(json.dumps({"pid": process.pid, "version": 1}).encode())
+    assert read_status_file(path) is None
+    assert read_status_file(path, check_alive=False)["version"] == 1
+    writer.close()
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from rclone_bisync_manager import sync
+from rclone_bisync_manager.circuit_breaker import circuit_breakers, OPEN
+from rclone_bisync_manager.config import config, sync_state
+from rclone_bisync_manager.cpu_limit import LimitedRunResult
+from rclone_bisync_manager.watchdog import CANCELLED, STALLED
+
+USAGE = {"limiter": "none", "limit_percent": 100, "wall_seconds": 1.0, "cpu_seconds": 0.1,
+         "cpu_percent": 10.0, "peak_rss_bytes": None}
+
+
+@pytest.fixture
+def fake_rclone(daemon_config, monkeypatch):
+    # rclone runs that end the way the test says; returns the operations run
+    daemon_config()
+    monkeypatch.setattr(sync, "check_local_rclone_test", lambda path: True)
+    monkeypatch.setattr(sync, "check_remote_rclone_test", lambda path: True)
+    monkeypatch.setattr(sync.remote_features, "ensure", lambda remote: None)
+    sync_state.sync_status.pop("job1", None)
+    sync_state.resync_status.pop("job1", None)
+    config.sync_errors.clear()
+    calls = []
+    outcomes = {}
+
+    def run_rclone_command(key, rclone_args, output_file, max_cpu_usage_percent=100):
+        operation = "resync" if "--resync" in rclone_args else "bisync"
+        calls.append(operation)
+        returncode, cancelled = outcomes.get(operation, (0, None))
+        return LimitedRunResult(rclone_args, returncode, dict(USAGE), cancelled)
+
+    monkeypatch.setattr(sync, "run_rclone_command", run_rclone_command)
+    return calls, outcomes
+
+
+def test_cancelled_resync_stops_before_bisync(fake_rclone):
+    calls, outcomes = fake_rclone
+    outcomes["resync"] = (0, CANCELLED)
+
+    assert sync.perform_sync_operations("job1") == "CANCELLED"
+    assert calls == ["resync"]
+    # Resynced again on the next run
+    assert sync_state.resync_status["job1"] == "IN_PROGRESS"
+    assert not config.sync_errors
+
+
+def test_cancelled_bisync_is_not_a_failure(fake_rclone):
+    calls, outcomes = fake_rclone
+    sync_state.resync_status["job1"] = "COMPLETED"
+    sync_state.sync_status["job1"] = "COMPLETED"
+    outcomes["bisync"] = (-2, CANCELLED)
+
+    assert sync.perform_sync_operations("job1") == "CANCELLED"
+    assert sync_state.sync_status["job1"] == "COMPLETED"
+    assert not config.sync_errors
+
+
+def test_stalled_bisync_fails(fake_rclone):
+    calls, outcomes = fake_rclone
+    sync_state.resync_status["job1"] = "COMPLETED"
+    outcomes["bisync"] = (-2, STALLED)
+
+    assert sync.perform_sync_operations("job1") == "FAILED"
+    (error,) = config.sync_errors.values()
+    assert "made no progress" in error["message"]
+
+
+def test_failed_local_check_ends_a_probe(fake_rclone, monkeypatch):
+    for _ in range(3):
+        circuit_breakers.record_failure("remote", "no route to host")
+    circuit_breakers._breakers["remote"].probe_after = datetime.now() - timedelta(seconds=1)
+    monkeypatch.setattr(sync, "check_local_rclone_test", lambda path: False)
+
+    assert sync.perform_sync_operations("job1") == "SKIPPED"
+    assert circuit_breakers.status()["remote"]["state"] == OPEN
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from rclone_bisync_manager.scheduler import QueuedSync
+from rclone_bisync_manager.sync_queue import SyncQueue
+
+NOW = datetime(2024, 5, 1, 12, 0)
+AGING = 600
+
+
+def queued(key, minutes_ago=0, priority=0, manual=False):
+    return QueuedSync(key, priority=priority, manual=manual,
+                      requested_at=NOW - timedelta(minutes=minutes_ago))
+
+
+def drain(queue):
+    keys = []
+    while (item := queue.pop()) is not None:
+        keys.append(item.job_key)
+    return keys
+
+
+def test_interactive_lane_goes_first():
+    queue = SyncQueue()
+    queue.put(queued("scheduled", minutes_ago=60, priority=10), AGING)
+    queue.put(queued("manual", manual=True), AGING)
+
+    assert drain(queue) == ["manual", "scheduled"]
+
+
+def test_aging():
+    queue = SyncQueue()
+    # Priority 1 counts as queued 10 minutes earlier
+    queue.put(queued("old", minutes_ago=15), AGING)
+    queue.put(queued("urgent", minutes_ago=0, priority=1), AGING)
+    queue.put(queued("older", minutes_ago=6, priority=1), AGING)
+
+    assert [item.job_key for item in queue.ordered()] == ["older", "old", "urgent"]
+    assert drain(queue) == ["older", "old", "urgent"]
+
+
+def test_a_job_is_queued_once():
+    queue = SyncQueue()
+    assert queue.put(queued("job1"), AGING)
+    assert not queue.put(queued("job1", priority=5), AGING)
+    assert len(queue) == 1
+
+
+def test_remove_and_reprioritize():
+    queue = SyncQueue()
+    for key in ("a", "b", "c"):
+        queue.put(queued(key, minutes_ago=3 - ord(key) + ord("a")), AGING)
+
+    assert queue.remove("b").job_key == "b"
+    assert queue.remove("b") is None
+    assert "b" not in queue
+    # Keeps the time it was queued at, so its wait still counts
+    assert queue.reprioritize("c", priority=1, aging_seconds=AGING)
+    assert not queue.reprioritize("b", priority=1)
+
+    assert drain(queue) == ["c", "a"]
+    assert queue.empty()
+
+
+def test_reprioritize_to_the_interactive_lane():
+    queue = SyncQueue()
+    queue.put(queued("a", minutes_ago=5), AGING)
+    queue.put(queued("b"), AGING)
+
+    queue.reprioritize("b", manual=True, aging_seconds=AGING)
+
+    assert [entry["lane"] for entry in queue.describe()] == ["interactive", "scheduled"]
+    assert drain(queue) == ["b", "a"]
@@ -0,0 +1,40 @@
+from rclone_bisync_manager import tracing
+from rclone_bisync_manager.tracing import Tracer
+
+
+def run_traced(tracer, job, count):
+    for _ in range(count):
+        with tracer.trace(job) as trace:
+            with tracer.span("bisync"):
+                pass
+            trace.result = "COMPLETED"
+
+
+def test_phases(daemon_config):
+    daemon_config()
+    tracer = Tracer()
+
+    run_traced(tracer, "job1", 1)
+
+    assert set(tracer.last_phases("job1")) == {"bisync", "total"}
+    assert tracer.traces("job1")[0]["result"] == "COMPLETED"
+
+
+def test_traces_file_is_compacted(daemon_config, monkeypatch):
+    daemon_config(jobs=("job1", "job2"))
+    monkeypatch.setattr(tracing, "MAX_TRACES_PER_JOB", 3)
+    monkeypatch.setattr(tracing, "COMPACT_AFTER_STALE_LINES", 5)
+    tracer = Tracer()
+
+    run_traced(tracer, "job1", 30)
+    run_traced(tracer, "job2", 2)
+
+    with open(tracer.traces_path()) as f:
+        lines = len(f.readlines())
+    assert lines < 3 + 2 + 5
+    assert len(tracer.traces("job1")) == 3
+    # What a restarted daemon reads back
+    reloaded = Tracer()
+    assert [trace["trace_id"] for trace in reloaded.traces("job1")] == \
+        [trace["trace_id"] for trace in tracer.traces("job1")]
+    assert len(reloaded.traces("job2")) == 2
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from rclone_bisync_manager.circuit_breaker import circuit_breakers
+from rclone_bisync_manager.utils import check_local_rclone_test, check_remote_rclone_test
+
+
+@pytest.fixture
+def hanging_rclone(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'rclone'
+    script.write_text("#!/bin/sh\nexec sleep 30\n")
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_preflight_checks_time_out(daemon_config, hanging_rclone):
+    daemon_config("watchdog:\n  preflight_timeout_seconds: 1\n")
+
+    assert not check_local_rclone_test('/nonexistent')
+    assert not check_remote_rclone_test('remote:path')
+    assert "timed out" in circuit_breakers.status()["remote"]["last_error"]
@@ -0,0 +1,102 @@
+import time
+import threading
+
+import pytest
+
+from rclone_bisync_manager import logging_utils
+from rclone_bisync_manager.config import config
+from rclone_bisync_manager.logging_utils import FileLogger
+from rclone_bisync_manager.sync import run_rclone_command
+from rclone_bisync_manager.watchdog import run_watchdog, CANCELLED, STALLED
+
+
+@pytest.fixture
+def watched_run(daemon_config, tmp_path, monkeypatch):
+    # Starts a command as job1's rclone run, with the manager log in a file;
+    # returns the run, its result holder and the manager log reader
+    daemon_config("watchdog:\n  stall_minutes: 1\n  grace_seconds: 1\n")
+    manager_log = tmp_path / 'manager.log'
+    file_logger = FileLogger(str(manager_log), flush_interval=0.05)
+    monkeypatch.setattr(logging_utils, "logger", file_logger)
+    config.currently_syncing = "job1"
+    threads = []
+
+    def start(script):
+        result = {}
+        output_file = str(tmp_path / 'job1.log')
+        thread = threading.Thread(target=lambda: result.update(
+            result=run_rclone_command("job1", ['sh', '-c', script], output_file)))
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 5
+        while "job1" not in run_watchdog._runs:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        return run_watchdog._runs["job1"], thread, result
+
+    def read_log():
+        file_logger.flush()
+        return manager_log.read_text()
+
+    yield start, read_log
+    run_watchdog.cancel("job1")
+    for thread in threads:
+        thread.join(5)
+    run_watchdog.end_job("job1")
+    file_logger.close()
+
+
+def wait_for_output(path, text):
+    deadline = time.monotonic() + 5
+    while text not in open(path).read():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_output_counts_as_progress(watched_run):
+    start, read_log = watched_run
+    run, thread, result = start('while true; do echo transferring; sleep 0.05; done')
+    wait_for_output(run.output_file, "transferring")
+
+    run.last_progress -= 120
+    time.sleep(0.1)
+    run_watchdog.check()
+
+    assert run_watchdog.status() == {}
+    assert time.monotonic() - run.last_progress < 60
+    assert thread.is_alive()
+
+
+def test_stalled_run_is_interrupted(watched_run):
+    start, read_log = watched_run
+    run, thread, result = start('echo listing; exec sleep 30')
+    wait_for_output(run.output_file, "listing")
+    run_watchdog.check()
+
+    run.last_progress -= 120
+    run_watchdog.check()
+    thread.join(5)
+
+    assert result["result"].cancelled == STALLED
+    assert result["result"].returncode == -2
+    assert "Sync job job1 made no progress for 1 minutes" in read_log()
+    assert "Cancelling sync job job1 (stalled)" in read_log()
+
+
+def test_run_ignoring_sigint_is_killed_after_the_grace_period(watched_run):
+    start, read_log = watched_run
+    run, thread, result = start('trap "" INT; echo started; exec sleep 30')
+    wait_for_output(run.output_file, "started")
+
+    assert run_watchdog.cancel("job1")
+    time.sleep(0.1)
+    run_watchdog.check()
+    assert thread.is_alive()
+
+    run.signalled_at -= 1
+    run_watchdog.check()
+    thread.join(5)
+
+    assert result["result"].cancelled == CANCELLED
+    assert result["result"].returncode == -9
+    assert "rclone for job1 did not stop within 1s of SIGINT, killing it" in read_log()